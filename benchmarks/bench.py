@@ -0,0 +1,293 @@
+"""
+Benchmark harness for the extraction and decompilation pipeline.
+
+Every scenario generates a synthetic executable (see synth_archive.py), runs it
+through main.process_archive() with the stub decompiler in a fresh process and
+reads the stage timings from its run report. The median of all repetitions is
+reported per stage as wall time, throughput and peak RSS, plus the time to the
+first decompiled module and the latency of the decompiled modules. Results can be saved as a baseline and later runs
+compared against it; a regression makes the harness exit with status 1.
+
+The startup scenario measures the cold start of main.py instead: the bare
+interpreter, importing main, the requirements check and a complete `--list` call,
+each in a fresh process.
+
+Usage:
+    python benchmarks/bench.py                          # run all scenarios
+    python benchmarks/bench.py --scenario small --repeat 5
+    python benchmarks/bench.py --save baseline          # store benchmarks/baselines/baseline.json
+    python benchmarks/bench.py --compare baseline       # fail on regressions against it
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from synth_archive import generate
+
+BASELINE_DIR = os.path.join(BENCH_DIR, "baselines")
+STUB_DECOMPILER = os.path.join(BENCH_DIR, "stub_decompiler.py")
+WORK_DIR = os.path.join(tempfile.gettempdir(), "pyautodump-bench")
+DEFAULT_THRESHOLD = 0.25  # Relative slowdown that counts as a regression
+MIN_DELTA = 0.05  # Seconds, differences below this are noise
+
+# Parameters passed to synth_archive.generate()
+SCENARIOS = {
+    "small": dict(members=100, member_size=2048),
+    "many-modules": dict(members=2000, member_size=1024, packages=50),
+    "large-modules": dict(members=200, member_size=64 * 1024),
+    "large-binaries": dict(members=100, binaries=4, binary_size=32 * 1024 * 1024),
+    "headered": dict(members=500, layout="headered", cookie=20),
+}
+STARTUP = "startup"
+
+
+def archive_path(name, params):
+    """Generates the archive of a scenario once and returns its path."""
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    path = os.path.join(WORK_DIR, f"{name}-{digest}.exe")
+    if not os.path.exists(path):
+        os.makedirs(WORK_DIR, exist_ok=True)
+        # In a separate process: children inherit the peak RSS of the process that forks them
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--generate", name, path + ".tmp"], check=True)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def run_once(exe_path, jobs, report_path):
+    """Runs one archive through the pipeline in this process and copies its run report to report_path."""
+    import main
+
+    main.CUSTOM_DECOMPILER = STUB_DECOMPILER
+    work_dir = tempfile.mkdtemp(dir=WORK_DIR)
+    try:
+        summary = main.process_archive(exe_path, os.path.join(work_dir, "output"), jobs, cache=None,
+                                       work_dir=work_dir, resume=False)
+        if summary["status"] != "ok":
+            raise SystemExit(f"benchmark run failed: {summary['error']}")
+        shutil.copyfile(summary["report"], report_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def measure(name, jobs, repeat):
+    """Runs a scenario repeat times, each in a fresh process, and returns its aggregated metrics."""
+    exe_path = archive_path(name, SCENARIOS[name])
+    reports = []
+    for _ in range(repeat):
+        report_path = os.path.join(WORK_DIR, f"{name}.report.json")
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-once", exe_path,
+                                 "--jobs", str(jobs), "--report", report_path],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            raise SystemExit(f"[ERROR] Scenario {name} failed:\n{result.stderr}")
+        with open(report_path, encoding="utf-8") as f:
+            reports.append(json.load(f))
+        os.remove(report_path)
+    return aggregate(reports, os.path.getsize(exe_path))
+
+
+def run_timed(args):
+    """Runs a command in a fresh process and returns its wall time and peak RSS (0 where unknown)."""
+    started = time.perf_counter()
+    process = subprocess.Popen(args, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        peak = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    else:
+        process.wait()
+        peak = 0
+    seconds = time.perf_counter() - started
+    if process.returncode != 0:
+        raise SystemExit(f"[ERROR] Startup step failed: {' '.join(args)}")
+    return seconds, peak
+
+
+def measure_startup(repeat):
+    """Times the cold start of main.py step by step, repeat times each, and returns the median per step."""
+    exe_path = archive_path("small", SCENARIOS["small"])
+    # pip is there wherever the benchmark runs, the check itself is measured, not an installation
+    requirements = os.path.join(WORK_DIR, "requirements.txt")
+    with open(requirements, "w", encoding="utf-8") as f:
+        f.write("pip\n")
+    check = (f"import main; main.REQUIREMENTS_FILE = {requirements!r}; "
+             f"main.REQUIREMENTS_STAMP = {requirements + '.stamp'!r}; main.check_requirements()")
+    steps = {
+        "interpreter": [sys.executable, "-c", "pass"],
+        "import": [sys.executable, "-c", "import main"],
+        "requirements": [sys.executable, "-c", check],
+        "list": [sys.executable, os.path.join(ROOT_DIR, "main.py"), "--list", exe_path],
+    }
+
+    result = {"size": os.path.getsize(exe_path), "runs": repeat, "stages": {}}
+    for step, args in steps.items():
+        run_timed(args)  # Writes the bytecode cache and the requirements stamp, like any earlier run would
+        runs = [run_timed(args) for _ in range(repeat)]
+        result["stages"][step] = {"seconds": round(statistics.median(seconds for seconds, _ in runs), 4),
+                                  "mb_per_s": None, "entries_per_s": None,
+                                  "peak_rss_growth": max(peak for _, peak in runs)}  # A new process per step
+    result["seconds"] = result["stages"]["list"]["seconds"]
+    result["peak_rss"] = result["stages"]["list"]["peak_rss_growth"]
+    return result
+
+
+def aggregate(reports, size):
+    """Combines the run reports of one scenario: median times, maximum peak RSS and its growth per stage."""
+    stages = {}
+    for report in reports:
+        per_run = {}
+        for record in report["stages"]:
+            totals = per_run.setdefault(record["stage"], {"seconds": 0, "bytes_in": 0, "entries": 0,
+                                                          "peak_rss_growth": 0})
+            totals["seconds"] += record["seconds"]
+            totals["bytes_in"] += record.get("bytes_in") or 0
+            totals["entries"] += record.get("entries") or 0
+            totals["peak_rss_growth"] += record.get("peak_rss_growth") or 0
+        for stage, totals in per_run.items():
+            stages.setdefault(stage, []).append(totals)
+
+    result = {"size": size, "runs": len(reports), "seconds": statistics.median(r["seconds"] for r in reports),
+              "peak_rss": max(r["peak_rss"] or 0 for r in reports), "stages": {}}
+    for stage, runs in stages.items():
+        seconds = statistics.median(run["seconds"] for run in runs)
+        bytes_in, entries = runs[0]["bytes_in"], runs[0]["entries"]
+        result["stages"][stage] = {
+            "seconds": round(seconds, 4),
+            "mb_per_s": round(bytes_in / seconds / 1024 / 1024, 2) if bytes_in and seconds else None,
+            "entries_per_s": round(entries / seconds, 1) if entries and seconds else None,
+            "peak_rss_growth": max(run["peak_rss_growth"] for run in runs),
+        }
+
+    first_results = [record["first_result"] for report in reports for record in report["stages"]
+                     if record["stage"] == "decompile" and record.get("first_result") is not None]
+    if first_results:
+        result["first_result"] = round(statistics.median(first_results), 4)
+
+    latencies = sorted(module["seconds"] for report in reports for module in report["modules"].values()
+                       if module.get("source") == "decompiler")
+    if latencies:
+        result["latency"] = {
+            "p50": round(latencies[len(latencies) // 2], 4),
+            "p95": round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)], 4),
+            "max": round(latencies[-1], 4),
+        }
+    return result
+
+
+def print_results(results):
+    for name, result in results.items():
+        print(f"\n[+] {name}: {result['size'] / 1024 / 1024:.1f} MB, {result['seconds']:.3f}s total, "
+              f"peak RSS {result['peak_rss'] / 1024 / 1024:.1f} MB")
+        print(f"    {'stage':<18}{'seconds':>10}{'MB/s':>10}{'entries/s':>12}{'peak RSS +MB':>14}")
+        for stage, metrics in result["stages"].items():
+            mb_per_s = f"{metrics['mb_per_s']:.1f}" if metrics["mb_per_s"] else "-"
+            entries_per_s = f"{metrics['entries_per_s']:.0f}" if metrics["entries_per_s"] else "-"
+            print(f"    {stage:<18}{metrics['seconds']:>10.4f}{mb_per_s:>10}{entries_per_s:>12}"
+                  f"{(metrics.get('peak_rss_growth') or 0) / 1024 / 1024:>14.1f}")
+        if "first_result" in result:
+            print(f"    time to first result: {result['first_result'] * 1000:.1f}ms")
+        if "latency" in result:
+            latency = result["latency"]
+            print(f"    module latency: p50 {latency['p50'] * 1000:.1f}ms, p95 {latency['p95'] * 1000:.1f}ms, "
+                  f"max {latency['max'] * 1000:.1f}ms")
+
+
+def compare(results, baseline, threshold):
+    """Prints the differences to a baseline and returns the list of regressions."""
+    regressions = []
+    print(f"\n[+] Comparison with baseline from {baseline['created']} ({baseline['machine']['platform']})")
+    for name, result in results.items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            print(f"    {name}: not in baseline")
+            continue
+        checks = [("total", old["seconds"], result["seconds"])]
+        checks += [(stage, old["stages"][stage]["seconds"], metrics["seconds"])
+                   for stage, metrics in result["stages"].items() if stage in old["stages"]]
+        for stage, before, after in checks:
+            change = (after - before) / before if before else 0
+            regressed = change > threshold and after - before > MIN_DELTA
+            if regressed:
+                regressions.append(f"{name}/{stage}")
+            print(f"    {name + '/' + stage:<32}{before:>9.4f}s -> {after:>9.4f}s {change:>+8.1%}"
+                  f"{'  REGRESSION' if regressed else ''}")
+        rss_change = (result["peak_rss"] - old["peak_rss"]) / old["peak_rss"] if old["peak_rss"] else 0
+        if rss_change > threshold:
+            regressions.append(f"{name}/peak_rss")
+            print(f"    {name + '/peak_rss':<32}{rss_change:>+30.1%}  REGRESSION")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks the pipeline on synthetic PyInstaller executables.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS) + [STARTUP],
+                        help="scenario to run, can be repeated (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario, the median is reported")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--save", metavar="NAME", help=f"save the results as baseline NAME in {BASELINE_DIR}")
+    parser.add_argument("--compare", metavar="NAME", help="compare the results with baseline NAME")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown reported as regression (default: %(default)s)")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH")
+    parser.add_argument("--generate", nargs=2, metavar=("SCENARIO", "PATH"), help=argparse.SUPPRESS)
+    parser.add_argument("--run-once", metavar="EXE", help=argparse.SUPPRESS)
+    parser.add_argument("--report", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.generate:
+        name, path = args.generate
+        generate(path, **SCENARIOS[name])
+        return
+    if args.run_once:
+        run_once(args.run_once, args.jobs, args.report)
+        return
+
+    results = {}
+    for name in args.scenario or list(SCENARIOS) + [STARTUP]:
+        print(f"[INFO] Running {name} ({args.repeat}x, {args.jobs} jobs)...")
+        results[name] = measure_startup(args.repeat) if name == STARTUP else measure(name, args.jobs, args.repeat)
+    print_results(results)
+
+    data = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpus": os.cpu_count(), "jobs": args.jobs},
+        "scenarios": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, args.save + ".json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        print(f"\n[+] Baseline saved to: {path}")
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, args.compare + ".json"), encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n[ERROR] {len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n[+] No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Stand-in decompiler for benchmarks, called like pycdc: `stub_decompiler.py module.pyc`.
+
+Unmarshals the code object and prints a skeleton of its functions and classes
+to stdout, so the pipeline can be measured without decompyle3 or pycdc. Set
+STUB_DECOMPILER_DELAY (seconds) to simulate the cost of a real decompiler.
+"""
+
+import os
+import sys
+import time
+import marshal
+import types
+
+HEADER_SIZES = (16, 12, 8)
+
+
+def load_code(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    for header_size in HEADER_SIZES:
+        try:
+            code = marshal.loads(data[header_size:])
+        except (ValueError, EOFError, TypeError):
+            continue
+        if isinstance(code, types.CodeType):
+            return code
+    raise ValueError(f"no code object found in {path}")
+
+
+def write_skeleton(code, indent=""):
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType) and not const.co_name.startswith("<"):
+            args = ", ".join(const.co_varnames[:const.co_argcount])
+            print(f"{indent}def {const.co_name}({args}):")
+            write_skeleton(const, indent + "    ")
+            print(f"{indent}    pass\n")
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("usage: stub_decompiler.py module.pyc", file=sys.stderr)
+        sys.exit(2)
+    time.sleep(float(os.environ.get("STUB_DECOMPILER_DELAY", 0)))
+    try:
+        code = load_code(sys.argv[1])
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"# Source skeleton of {code.co_filename}")
+    print(f"# Names: {', '.join(code.co_names)}\n")
+    write_skeleton(code)
+
+
+if __name__ == "__main__":
+    main()
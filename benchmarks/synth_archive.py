@@ -0,0 +1,267 @@
+"""
+Generator for synthetic PyInstaller executables.
+
+Builds a fake executable (a stub followed by a CArchive overlay) with a correct
+cookie and TOC, a mix of compressed and stored entries, a PYZ archive with a
+configurable number and size of members, and either the pre-5.3 (pyc header
+stored with every module) or the 5.3+ (bare code object) layout. The code
+objects are compiled by the running interpreter, so the PYZ can be read back
+without a matching Python installation.
+
+Usage: python benchmarks/synth_archive.py out.exe --members 500 --member-size 4096
+"""
+
+import os
+import sys
+import struct
+import io
+import zlib
+import marshal
+import zipfile
+import random
+import argparse
+import importlib.util
+
+COOKIE_MAGIC = b"MEI\014\013\012\013\016"
+PYINST20_COOKIE_SIZE = 24
+PYINST21_COOKIE_SIZE = 24 + 64
+TOC_ENTRY_HEADER = "!iIIIBc"
+
+# Magic numbers of the pyc files written by each Python version
+PYC_MAGICS = {
+    (3, 6): 3379, (3, 7): 3394, (3, 8): 3413, (3, 9): 3425,
+    (3, 10): 3439, (3, 11): 3495, (3, 12): 3531, (3, 13): 3571,
+}
+
+CURRENT_VERSION = sys.version_info[:2]
+
+
+def pyc_magic(python_version):
+    """Returns the 4 byte pyc magic for a (major, minor) version."""
+    if python_version == CURRENT_VERSION:
+        return importlib.util.MAGIC_NUMBER
+    return struct.pack("<H", PYC_MAGICS[python_version]) + b"\r\n"
+
+
+def pyc_header(python_version):
+    """Returns a complete (zeroed) pyc header, like PyInstaller < 5.3 stored it."""
+    magic = pyc_magic(python_version)
+    if python_version >= (3, 7):
+        return magic + b"\0" * 12
+    if python_version >= (3, 3):
+        return magic + b"\0" * 8
+    return magic + b"\0" * 4
+
+
+def make_code(name, size, rng):
+    """Returns marshalled code of roughly size bytes, defining a few functions and string constants."""
+    lines = [f'"""Synthetic module {name}."""', "import os", ""]
+    index = 0
+    while sum(len(line) for line in lines) < size:
+        text = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz ") for _ in range(48))
+        lines.append(f"def func_{index}(value):\n    return value + {index} if value else {text!r}\n")
+        index += 1
+    return marshal.dumps(compile("\n".join(lines), name, "exec"))
+
+
+def build_pyz(members, magic):
+    """members is a list of (name, ispkg, code bytes). Returns the PYZ archive bytes."""
+    out = bytearray(b"PYZ\0" + magic + b"\0\0\0\0")
+    toc = []
+    for name, ispkg, data in members:
+        compressed = zlib.compress(data)
+        toc.append((name, (ispkg, len(out), len(compressed))))
+        out += compressed
+    toc_pos = len(out)
+    out += marshal.dumps(toc)
+    out[8:12] = struct.pack("!i", toc_pos)
+    return bytes(out)
+
+
+def build_carchive(entries, python_version, cookie=21):
+    """entries is a list of (name, typecode, data, compress). Returns the CArchive bytes, cookie included."""
+    body, toc = bytearray(), bytearray()
+    header_size = struct.calcsize(TOC_ENTRY_HEADER)
+    for name, typecode, data, compress in entries:
+        payload = zlib.compress(data) if compress else data
+        position = len(body)
+        body += payload
+        name_bytes = name.encode("utf-8") + b"\0"
+        name_bytes += b"\0" * (-(header_size + len(name_bytes)) % 16)  # Entries are 16 byte aligned
+        toc += struct.pack(TOC_ENTRY_HEADER, header_size + len(name_bytes), position, len(payload), len(data),
+                           1 if compress else 0, typecode) + name_bytes
+
+    toc_pos = len(body)
+    body += toc
+    pyver = python_version[0] * 100 + python_version[1]
+    if cookie == 20:
+        total = len(body) + PYINST20_COOKIE_SIZE
+        body += struct.pack("!8siiii", COOKIE_MAGIC, total, toc_pos, len(toc), pyver)
+    else:
+        total = len(body) + PYINST21_COOKIE_SIZE
+        pylib = f"python{python_version[0]}{python_version[1]}.dll".encode()
+        body += struct.pack("!8sIIii64s", COOKIE_MAGIC, total, toc_pos, len(toc), pyver, pylib)
+    return bytes(body)
+
+
+def build_pe(body, archive, signature_size, rng):
+    """Returns a minimal PE32+ with body as its only section, archive as overlay and an optional certificate."""
+    headers_size, section_pos = 0x200, 0x200
+    certificate = b""
+    cert_offset = section_pos + len(body) + len(archive)
+    padding = b"\0" * (-cert_offset % 8)  # The certificate table is 8 byte aligned
+    if signature_size:
+        cert_offset += len(padding)
+        certificate = struct.pack("<IHH", signature_size + 8, 0x200, 2) + rng.randbytes(signature_size)
+
+    optional = bytearray(240)
+    struct.pack_into("<H", optional, 0, 0x20b)  # PE32+
+    struct.pack_into("<I", optional, 108, 16)   # NumberOfRvaAndSizes
+    if certificate:
+        struct.pack_into("<II", optional, 112 + 4 * 8, cert_offset, len(certificate))  # Security directory
+    section = struct.pack("<8sIIIIIIHHI", b".text", len(body), 0x1000, len(body), section_pos, 0, 0, 0, 0, 0x60000020)
+    header = bytearray(b"MZ" + b"\0" * 58 + struct.pack("<I", 0x40))
+    header += b"PE\0\0" + struct.pack("<HHIIIHH", 0x8664, 1, 0, 0, 0, len(optional), 0x22) + optional + section
+    header += b"\0" * (headers_size - len(header))
+    return bytes(header) + body + archive + (padding + certificate if certificate else b"")
+
+
+def build_elf(body, archive):
+    """Returns a minimal 64 bit ELF that holds archive in a section named pydata, like PyInstaller 6 on Linux."""
+    names = b"\0pydata\0.shstrtab\0"
+    archive_pos = 64 + len(body)
+    names_pos = archive_pos + len(archive)
+    shoff = names_pos + len(names) + (-(names_pos + len(names)) % 8)
+    header = b"\x7fELF" + bytes([2, 1, 1]) + b"\0" * 9
+    header += struct.pack("<HHIQQQIHHHHHH", 2, 0x3e, 1, 0, 0, shoff, 0, 64, 0, 0, 64, 3, 2)
+    sections = b"\0" * 64
+    sections += struct.pack("<IIQQQQIIQQ", 1, 1, 0, 0, archive_pos, len(archive), 0, 0, 1, 0)
+    sections += struct.pack("<IIQQQQIIQQ", 8, 3, 0, 0, names_pos, len(names), 0, 0, 1, 0)
+    data = header + body + archive + names
+    return data + b"\0" * (shoff - len(data)) + sections
+
+
+def build_base_library(members, member_size, python_version, rng):
+    """Returns a base_library.zip like the one of onedir builds: stdlib modules as complete pyc files."""
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        for index in range(members):
+            name = f"lib{index % 5}/mod{index}.pyc" if index % 2 else f"mod{index}.pyc"
+            zf.writestr(name, pyc_header(python_version) + make_code(name, member_size, rng))
+    return out.getvalue()
+
+
+def build_archive(rng, members, member_size, packages, binaries, binary_size, data_files, data_size, layout,
+                  cookie, python_version, nested=0, base_library=0):
+    """Returns the CArchive bytes and the number of CArchive entries and PYZ members, nested archives included."""
+    magic = pyc_magic(python_version)
+
+    pyz_members = []
+    for index in range(members):
+        package = f"pkg{index % packages}" if packages else None
+        if package and index < packages:
+            pyz_members.append((package, 1, make_code(package, member_size, rng)))
+        else:
+            name = f"{package}.mod{index}" if package else f"mod{index}"
+            pyz_members.append((name, 0, make_code(name, member_size, rng)))
+
+    module_prefix = pyc_header(python_version) if layout == "headered" else b""
+    entries = [
+        ("struct", b"m", module_prefix + make_code("struct", 512, rng), True),
+        ("pyimod01_archive", b"m", module_prefix + make_code("pyimod01_archive", 1024, rng), True),
+        ("pyiboot01_bootstrap", b"s", make_code("pyiboot01_bootstrap", 512, rng), True),
+        ("main", b"s", make_code("main", member_size, rng), True),
+    ]
+    for index in range(binaries):
+        entries.append((f"lib{index}.dll", b"b", rng.randbytes(binary_size), index % 2 == 0))
+    for index in range(data_files):
+        text = "".join(rng.choice("abc def\n") for _ in range(256)).encode()
+        entries.append((f"data/file{index}.txt", b"x", (text * (data_size // 256 + 1))[:data_size], True))
+    if base_library:
+        entries.append(("base_library.zip", b"x", build_base_library(base_library, member_size, python_version, rng),
+                        False))
+    pyz_count, entry_count = len(pyz_members), len(entries) + 2
+    for index in range(nested):
+        # Like multipackage builds: a PKG with its own modules, PYZ and binaries
+        child, child_entries, child_members = build_archive(
+            rng, max(members // 4, 1), member_size, max(packages // 4, 1), 1, binary_size // 4, 2, data_size,
+            layout, cookie, python_version)
+        entries.append((f"nested{index}.pkg", b"a", child, index % 2 == 0))
+        entry_count, pyz_count = entry_count + child_entries + 1, pyz_count + child_members
+    entries.append(("PYZ-00.pyz", b"z", build_pyz(pyz_members, magic), False))
+    entries.append(("pyi-contents-directory _internal", b"o", b"", False))
+    return build_carchive(entries, python_version, cookie), entry_count, pyz_count
+
+
+def generate(path, members=200, member_size=2048, packages=10, binaries=3, binary_size=256 * 1024,
+             data_files=10, data_size=16 * 1024, layout="bare", cookie=21, python_version=CURRENT_VERSION,
+             stub_size=64 * 1024, trailer_size=0, seed=0, stub="mz", signature_size=0, nested=0, base_library=0):
+    """
+    Writes a synthetic PyInstaller executable to path and returns a description of its contents.
+
+    layout is "bare" (PyInstaller 5.3+, modules without pyc header) or "headered" (older versions).
+    Binaries hold random bytes and alternate between compressed and stored entries, data files
+    are compressible text. stub is "mz" (just random bytes in front of the archive), "pe" (a PE
+    with the archive as overlay, signed if signature_size is set) or "elf" (the archive in a
+    pydata section). trailer_size appends junk after everything. nested adds that many PKG
+    entries (nested CArchives with a quarter of the members), base_library a base_library.zip
+    with that many modules.
+    """
+    rng = random.Random(seed)
+    archive, entry_count, pyz_count = build_archive(rng, members, member_size, packages, binaries, binary_size,
+                                                    data_files, data_size, layout, cookie, python_version, nested,
+                                                    base_library)
+    if stub == "pe":
+        data = build_pe(rng.randbytes(stub_size), archive, signature_size, rng)
+    elif stub == "elf":
+        data = build_elf(rng.randbytes(stub_size), archive)
+    else:
+        data = b"MZ" + rng.randbytes(max(stub_size - 2, 0)) + archive
+    with open(path, "wb") as f:
+        f.write(data)
+        f.write(rng.randbytes(trailer_size))
+
+    return {
+        "path": os.path.abspath(path),
+        "size": os.path.getsize(path),
+        "carchive_entries": entry_count,
+        "pyz_members": pyz_count,
+        "modules": pyz_count + 4 * (nested + 1) + base_library,
+        "layout": layout,
+        "python_version": "%d.%d" % python_version,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates a synthetic PyInstaller executable.")
+    parser.add_argument("path")
+    parser.add_argument("--members", type=int, default=200, help="number of PYZ members")
+    parser.add_argument("--member-size", type=int, default=2048, help="approximate source size per member")
+    parser.add_argument("--packages", type=int, default=10)
+    parser.add_argument("--binaries", type=int, default=3)
+    parser.add_argument("--binary-size", type=int, default=256 * 1024)
+    parser.add_argument("--data-files", type=int, default=10)
+    parser.add_argument("--data-size", type=int, default=16 * 1024)
+    parser.add_argument("--layout", choices=("bare", "headered"), default="bare",
+                        help="bare: PyInstaller 5.3+ pyc layout, headered: older versions")
+    parser.add_argument("--cookie", type=int, choices=(20, 21), default=21, help="PyInstaller 2.0 or 2.1+ cookie")
+    parser.add_argument("--python", default="%d.%d" % CURRENT_VERSION, help="Python version recorded in the cookie")
+    parser.add_argument("--stub", choices=("mz", "pe", "elf"), default="mz",
+                        help="executable in front of the archive: random bytes, a PE (overlay) or an ELF (pydata section)")
+    parser.add_argument("--signature-size", type=int, default=0, help="size of the certificate appended to a PE")
+    parser.add_argument("--nested", type=int, default=0, help="number of nested CArchives (PKG entries)")
+    parser.add_argument("--base-library", type=int, default=0, help="modules in a base_library.zip entry")
+    parser.add_argument("--trailer-size", type=int, default=0, help="junk bytes appended after everything")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    python_version = tuple(int(part) for part in args.python.split("."))
+    info = generate(args.path, args.members, args.member_size, args.packages, args.binaries, args.binary_size,
+                    args.data_files, args.data_size, args.layout, args.cookie, python_version,
+                    trailer_size=args.trailer_size, seed=args.seed, stub=args.stub,
+                    signature_size=args.signature_size, nested=args.nested, base_library=args.base_library)
+    print(f"[+] Wrote {info['path']} ({info['size']} bytes, {info['modules']} modules)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Persistent, content-addressed cache of decompiled sources.
+
+Entries are keyed by the hash of the code object bytes of a .pyc (its header
+is skipped, it only holds timestamps and sizes), the pyc magic and the identity
+of the decompiler, so the same module bundled in different executables is only
+decompiled once. The cache is bounded in size and evicts the least recently
+used entries first.
+"""
+
+import os
+import hashlib
+import threading
+import uuid
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024  # 1 GB
+
+
+def pyc_header_size(python_version):
+    """Returns the size of the pyc header for a Python version string like '3.11'."""
+    try:
+        major, minor = (int(part) for part in python_version.split(".")[:2])
+    except (AttributeError, ValueError):
+        return 16
+    if (major, minor) >= (3, 7):
+        return 16  # PEP 552: magic, bitfield, timestamp + size or hash
+    if (major, minor) >= (3, 3):
+        return 12  # magic, timestamp, size
+    return 8       # magic, timestamp
+
+
+def input_hash(pyc_path, header_size):
+    """Hashes the magic and code object bytes of a .pyc."""
+    with open(pyc_path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256()
+    digest.update(data[:4])
+    digest.update(data[header_size:])
+    return digest.hexdigest()
+
+
+def content_key(module_hash, decompiler_id):
+    """Combines the input_hash of a module with the decompiler identity into a cache key."""
+    return hashlib.sha256(f"{decompiler_id}\0{module_hash}".encode("utf-8")).hexdigest()
+
+
+class DecompileCache:
+    """On-disk cache mapping content keys to decompiled source files."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()  # Worker threads share one cache
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".py")
+
+    def get(self, key):
+        """Returns the cached source for key as bytes, or None on a cache miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            with self._stats_lock:
+                self.misses += 1
+            return None
+        with self._stats_lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Stores the decompiled source (bytes) under key."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a unique temporary name first, concurrent workers may store the same key
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits into max_size."""
+        entries, total_size = [], 0
+        for root, _, files in os.walk(self.cache_dir):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+            removed += 1
+        return removed
@@ -0,0 +1,219 @@
+"""
+Warm decompyle3 workers.
+
+Running the decompyle3 command costs an interpreter start and the import of
+decompyle3 for every single module. A WorkerPool keeps processes running that
+have imported decompyle3 once and decompile one .pyc after the other, talking
+to the pool over their stdin/stdout (one JSON object per line each way).
+
+The budgets of one-shot decompiler processes apply to every module here too:
+a worker that exceeds the time budget is killed and replaced, and every worker
+caps its own address space at the memory limit (Linux). Workers are also
+replaced after MAX_MODULES_PER_WORKER modules so decompyle3's caches do not
+grow without bound.
+"""
+
+import io
+import os
+import sys
+import json
+import queue
+import threading
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MAX_MODULES_PER_WORKER = 1000
+START_TIMEOUT = 60  # seconds a new worker may take to import decompyle3
+
+# Same parser settings as the decompyle3 command without debug options
+GRAMMAR_OPTIONS = {"rules": False, "transition": False, "reduce": False, "errorstack": "full", "context": True,
+                   "dups": False}
+
+
+class Worker:
+    """One decompyle3 process of the pool."""
+
+    def __init__(self, memory_limit_mb=0):
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), str(memory_limit_mb or 0)],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        encoding="utf-8", errors="surrogateescape")
+        self.answers = queue.Queue()
+        self.modules = 0
+        self.retired = False
+        threading.Thread(target=self._read, name=f"decompile-worker-{self.process.pid}", daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            try:
+                self.answers.put(json.loads(line))
+            except ValueError:
+                continue
+        self.answers.put(None)
+
+    def ask(self, message, timeout=None):
+        """Sends message and returns the answer, None if the worker died or did not answer within timeout."""
+        try:
+            self.process.stdin.write(json.dumps(message) + "\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError):
+            return None
+        return self.answer(timeout)
+
+    def answer(self, timeout=None):
+        try:
+            return self.answers.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    @property
+    def usable(self):
+        return not self.retired and self.process.poll() is None and self.modules < MAX_MODULES_PER_WORKER
+
+    def kill(self):
+        self.retired = True
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class WorkerPool:
+    """
+    A fixed number of warm decompyle3 processes. decompile() blocks until a worker is free,
+    callers should not run more than `size` modules at once anyway.
+    """
+
+    def __init__(self, size, memory_limit_mb=0):
+        self.size = size
+        self.memory_limit_mb = memory_limit_mb
+        self.version = None
+        # None stands for a worker that has to be (re)started by the next caller
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.stats = {"decompiled": 0, "failed": 0, "timeouts": 0, "restarts": 0}
+
+    def _spawn(self):
+        """Starts a worker and waits until decompyle3 is imported. Returns (worker, error)."""
+        try:
+            worker = Worker(self.memory_limit_mb)
+        except OSError as e:
+            return None, str(e)
+        ready = worker.answer(START_TIMEOUT)
+        if not ready or "error" in ready:
+            worker.kill()
+            return None, ready["error"] if ready else "the worker did not start"
+        self.version = ready.get("version")
+        return worker, None
+
+    def start(self):
+        """Starts all workers. Returns None, or the error if decompyle3 cannot be run this way."""
+        workers = []
+        for _ in range(self.size):
+            worker, error = self._spawn()
+            if worker is None:
+                for started in workers:
+                    started.kill()
+                return error
+            workers.append(worker)
+        for worker in workers:
+            self.idle.put(worker)
+        return None
+
+    def decompile(self, src_path, timeout=None):
+        """Decompiles one .pyc. Returns (source bytes, None) on success, otherwise (None, error message)."""
+        worker = self.idle.get()
+        if worker is None or worker.process.poll() is not None:
+            # Also replaces a worker that died while it was idle
+            with self.lock:
+                self.stats["restarts"] += 1
+            worker, error = self._spawn()
+            if worker is None:
+                self.idle.put(None)
+                return None, f"the decompiler worker could not be started: {error}"
+
+        try:
+            answer = worker.ask({"path": os.path.abspath(src_path)}, timeout)
+            worker.modules += 1
+            if answer is None:
+                timed_out = worker.process.poll() is None
+                worker.kill()
+                with self.lock:
+                    self.stats["timeouts" if timed_out else "failed"] += 1
+                return None, f"timed out after {timeout}s" if timed_out else "the decompiler worker died"
+            if answer.get("retire"):
+                worker.retired = True
+            with self.lock:
+                self.stats["decompiled" if "source" in answer else "failed"] += 1
+            if "source" in answer:
+                return answer["source"].encode("utf-8", "surrogateescape"), None
+            return None, answer.get("error") or "unknown error"
+        finally:
+            if worker.usable:
+                self.idle.put(worker)
+            else:
+                worker.kill()
+                self.idle.put(None)
+
+    def close(self):
+        """Stops all idle workers (call it once nothing is decompiled any more)."""
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.kill()
+
+
+def serve(memory_limit_mb):
+    """Worker side: answers decompile requests from stdin until it is closed."""
+    channel = sys.stdout
+    sys.stdout = sys.stderr  # decompyle3 prints warnings and parser errors, only answers go to the pool
+
+    def answer(message):
+        channel.write(json.dumps(message) + "\n")
+        channel.flush()
+
+    try:
+        from decompyle3.main import decompile_file
+        from decompyle3.version import __version__
+    except ImportError as e:
+        answer({"error": f"decompyle3 cannot be imported: {e}"})
+        return 1
+
+    if memory_limit_mb and resource is not None:
+        limit = memory_limit_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (OSError, ValueError):
+            pass
+    answer({"ready": True, "version": __version__})
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        source = io.StringIO()
+        try:
+            decompile_file(request["path"], source, showgrammar=dict(GRAMMAR_OPTIONS))
+        except MemoryError:
+            # The heap may be in a bad state now, the pool replaces this worker
+            answer({"error": "out of memory", "retire": True})
+            return 0
+        except Exception as e:
+            answer({"error": f"{type(e).__name__}: {e}"})
+            continue
+        answer({"source": source.getvalue()})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.stdin.reconfigure(encoding="utf-8", errors="surrogateescape")
+    sys.stdout.reconfigure(encoding="utf-8", errors="surrogateescape")
+    sys.exit(serve(int(sys.argv[1]) if len(sys.argv) > 1 else 0))
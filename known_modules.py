@@ -0,0 +1,242 @@
+"""
+Index of known module bytecode (standard library and PyPI packages).
+
+Most modules in a PyInstaller bundle are unmodified standard library or
+third-party code whose source is available anyway. The index maps a
+fingerprint of their code objects, per Python version, to the module name and
+the package (with version) it comes from, so those modules can be stubbed
+instead of decompiled.
+
+The fingerprint covers the bytecode, constants and names of every code object
+but not the file name or line numbers, which PyInstaller rewrites and which
+do not change the behaviour of the code. Code of other Python versions is read
+with pyinstxtractor's marshal reader, so one interpreter can match all versions
+an index was built for.
+
+Build or update the index from the running interpreter's standard library and
+installed distributions:
+
+    python known_modules.py build
+    python known_modules.py build --path some/site-packages --label somepkg==1.2
+    python known_modules.py info
+"""
+
+import os
+import sys
+import json
+import types
+import struct
+import hashlib
+import marshal
+import argparse
+import warnings
+import sysconfig
+import importlib.util
+
+from pyinstxtractor import CodeObject, loadMarshal
+
+KNOWN_MODULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "known_modules.json")
+INDEX_VERSION = 1
+
+# Code object attributes that make up the fingerprint (missing ones are skipped)
+CODE_ATTRS = ("co_argcount", "co_posonlyargcount", "co_kwonlyargcount", "co_nlocals", "co_flags", "co_code",
+              "co_consts", "co_names", "co_varnames", "co_freevars", "co_cellvars", "co_name", "co_qualname",
+              "co_exceptiontable")
+
+
+def _canonical(obj, out):
+    if isinstance(obj, types.CodeType) or hasattr(obj, "co_code"):
+        out.append(b"<code")
+        for attr in CODE_ATTRS:
+            _canonical(getattr(obj, attr, None), out)
+        out.append(b">")
+    elif isinstance(obj, (tuple, list)):
+        out.append(b"(")
+        for item in obj:
+            _canonical(item, out)
+        out.append(b")")
+    elif isinstance(obj, frozenset):
+        out.append(b"{" + repr(sorted(repr(item) for item in obj)).encode("utf-8") + b"}")
+    else:
+        out.append(type(obj).__name__.encode() + b":" + repr(obj).encode("utf-8", "surrogatepass") + b";")
+
+
+def code_fingerprint(code):
+    """Returns the fingerprint of a code object, see the module docstring."""
+    out = []
+    _canonical(code, out)
+    return hashlib.sha256(b"".join(out)).hexdigest()
+
+
+def load_code(pyc_path, header_size, python_version=None):
+    """
+    Returns the code object of a .pyc written by python_version ('3.8', default: the running version),
+    None if it holds no readable code object.
+    """
+    with open(pyc_path, "rb") as f:
+        data = f.read()
+    try:
+        if data[:4] == importlib.util.MAGIC_NUMBER:
+            code = marshal.loads(data[header_size:])
+        else:
+            version = tuple(int(part) for part in python_version.split(".")[:2]) if python_version else None
+            code = loadMarshal(data[header_size:], version)
+    except (ValueError, EOFError, TypeError, IndexError, KeyError, struct.error, RecursionError):
+        return None
+    return code if isinstance(code, (types.CodeType, CodeObject)) else None
+
+
+def pyc_fingerprint(pyc_path, header_size, python_version=None):
+    """Fingerprints a .pyc (see load_code). Returns None if it holds no readable code object."""
+    code = load_code(pyc_path, header_size, python_version)
+    return code_fingerprint(code) if code is not None else None
+
+
+class KnownModuleIndex:
+    """Known module fingerprints per Python version ('3.11'), each mapped to {"module", "package"}."""
+
+    def __init__(self, path=KNOWN_MODULES_FILE):
+        self.path = path
+        self.versions = {}
+        self.top_level = {}  # Python version -> top-level names of its known modules, see top_level_names()
+
+    def load(self):
+        """Reads the index file; a missing or outdated file yields an empty index."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.versions = data.get("python", {})
+        except (OSError, ValueError):
+            self.versions = {}
+        self.top_level = {}
+        return self
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.versions.values())
+
+    def lookup(self, python_version, fingerprint):
+        """Returns the {"module", "package"} record of a fingerprint, or None for application code."""
+        if fingerprint is None:
+            return None
+        return self.versions.get(python_version, {}).get(fingerprint)
+
+    def top_level_names(self, python_version):
+        """Returns the top-level packages and modules ('json', 'requests') the index knows for a Python version."""
+        names = self.top_level.get(python_version)
+        if names is None:
+            names = {record["module"].split(".")[0] for record in self.versions.get(python_version, {}).values()}
+            self.top_level[python_version] = names
+        return names
+
+    def add(self, python_version, fingerprint, module, package):
+        """Adds a module unless its fingerprint is already known. Returns True if it was added."""
+        entries = self.versions.setdefault(python_version, {})
+        if fingerprint in entries:
+            return False
+        entries[fingerprint] = {"module": module, "package": package}
+        self.top_level.pop(python_version, None)
+        return True
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "python": self.versions}, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def stub_source(record):
+    """Returns the placeholder written instead of the decompiled source of a known module."""
+    return (f"# Known module: {record['module']} ({record['package']})\n"
+            f"# Not decompiled, its bytecode matches the known module index.\n"
+            f"# Get the source from the package itself or use --all-modules.\n")
+
+
+def module_name(relative_path):
+    """Turns a path like 'json/decoder.py' or 'json/__init__.py' into a module name."""
+    parts = relative_path.replace(os.path.sep, "/")[:-len(".py")].split("/")
+    if parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
+
+def source_files(root, skip=()):
+    """Yields (module name, path) of the .py files below root, except the directories in skip."""
+    skip = {os.path.normcase(os.path.abspath(path)) for path in skip}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames
+                             if os.path.normcase(os.path.abspath(os.path.join(dirpath, name))) not in skip)
+        for filename in sorted(filenames):
+            if filename.endswith(".py"):
+                path = os.path.join(dirpath, filename)
+                yield module_name(os.path.relpath(path, root)), path
+
+
+def add_sources(index, python_version, files, package):
+    """Compiles the given (module, path) sources and adds them to the index. Returns the number added."""
+    added = 0
+    for module, path in files:
+        try:
+            with open(path, "rb") as f, warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # SyntaxWarnings of library code are not our business
+                code = compile(f.read(), path, "exec", dont_inherit=True)
+        except (SyntaxError, ValueError, OSError, UnicodeDecodeError):
+            continue
+        if index.add(python_version, code_fingerprint(code), module, package):
+            added += 1
+    return added
+
+
+def distribution_files(dist):
+    """Yields (module name, path) of the Python sources installed by a distribution."""
+    for file in dist.files or ():
+        if file.suffix == ".py" and ".." not in file.parts:
+            yield module_name(str(file)), str(dist.locate_file(file))
+
+
+def build(index, stdlib=True, distributions=True, paths=(), label=None):
+    """Adds the modules of the running interpreter (and of extra paths) to the index."""
+    from importlib import metadata  # Slow to import, main.py only needs the index itself
+
+    python_version = "%d.%d" % sys.version_info[:2]
+    if stdlib:
+        paths_info = sysconfig.get_paths()
+        stdlib_dir = paths_info["stdlib"]
+        skip = {paths_info["purelib"], paths_info["platlib"], os.path.join(stdlib_dir, "site-packages")}
+        package = f"stdlib=={sys.version.split()[0]}"
+        added = add_sources(index, python_version, source_files(stdlib_dir, skip), package)
+        print(f"[+] {package}: {added} modules")
+    if distributions:
+        for dist in sorted(metadata.distributions(), key=lambda dist: dist.metadata["Name"] or ""):
+            package = f"{dist.metadata['Name']}=={dist.version}"
+            added = add_sources(index, python_version, distribution_files(dist), package)
+            if added:
+                print(f"[+] {package}: {added} modules")
+    for path in paths:
+        package = label or os.path.basename(os.path.normpath(path))
+        added = add_sources(index, python_version, source_files(path), package)
+        print(f"[+] {package}: {added} modules")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds and inspects the known module index.")
+    parser.add_argument("command", choices=("build", "info"))
+    parser.add_argument("--index", default=KNOWN_MODULES_FILE, help="index file (default: %(default)s)")
+    parser.add_argument("--no-stdlib", action="store_true", help="do not add the standard library")
+    parser.add_argument("--no-distributions", action="store_true", help="do not add the installed distributions")
+    parser.add_argument("--path", action="append", default=[], help="also add the sources below this directory")
+    parser.add_argument("--label", help="package name (and version) recorded for --path sources")
+    args = parser.parse_args()
+
+    index = KnownModuleIndex(args.index).load()
+    if args.command == "build":
+        print(f"[INFO] Adding modules for Python {sys.version_info[0]}.{sys.version_info[1]} to {args.index}")
+        build(index, not args.no_stdlib, not args.no_distributions, args.path, args.label)
+        index.save()
+    for python_version, entries in sorted(index.versions.items()):
+        packages = {record["package"] for record in entries.values()}
+        print(f"[INFO] Python {python_version}: {len(entries)} modules from {len(packages)} packages")
+
+
+if __name__ == "__main__":
+    main()
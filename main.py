@@ -55,37 +55,173 @@
 import subprocess
 import sys
 import os
-import tkinter as tk
-from tkinter import filedialog
-import re
 import shutil
+import argparse
+import re
+import hashlib
+import glob
+import json
+import tempfile
+import threading
+import queue
+import time
+import heapq
+import dis
+import io
+import marshal
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pyinstxtractor
+from decompile_cache import DecompileCache, CACHE_DIR, DEFAULT_MAX_SIZE, content_key, input_hash, pyc_header_size
+from manifest import Manifest, MANIFEST_FILE
+from known_modules import KnownModuleIndex, KNOWN_MODULES_FILE, pyc_fingerprint, stub_source
+from report import RunReport, REPORT_FILE
+from output_sink import open_sink, OUTPUT_FORMATS
+from release_diff import compare_releases, write_source_diff
+
+try:
+    import resource
+except ImportError:
+    # Windows: no resource limits, the memory budget of decompiler processes is not enforced
+    resource = None
 
 # --- Configuration ---
 DELETE_TEMP_FOLDER = True 
+PRINT_FAILURES = False  # Print the decompiler error of every failed module (--verbose)
 REQUIREMENTS_FILE = "requirements.txt"
+# Remembers that requirements.txt was satisfied, so pip only runs when it changed or a package went missing
+REQUIREMENTS_STAMP = ".requirements_stamp.json"
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "output")
-PYINST_PATH = os.path.join(os.path.dirname(__file__), "pyinstxtractor.py")
+BATCH_SUMMARY_FILE = "batch_summary.json"
+# Where archives are extracted before decompiling (--work-dir), None = the system temp folder
+# (the script folder in interactive mode); a tmpfs keeps the extracted files in memory
+WORK_DIR = None
 
 # NEU: Pfad zum speziellen Dekompilierer für Python 3.13
 PYCDC_PATH = os.path.join(os.path.dirname(__file__), "Tools", "pycdc.exe")
+# Decompiler used instead of the automatic choice (--decompiler). It is called like pycdc:
+# `<decompiler> module.pyc`, printing the source to stdout
+CUSTOM_DECOMPILER = None
+# Tiers tried in order when the decompiler fails or exceeds its budget (--fallback):
+# "decompyle3", "pycdc" or "disasm" (a bytecode listing made in-process, never fails on valid bytecode)
+FALLBACK_CHAIN = ["pycdc", "disasm"]
+# Budget of every decompiler process, it is killed when exceeding it (--timeout, --memory-limit; 0 = none)
+DECOMPILE_TIMEOUT = 120  # seconds
+DECOMPILE_MEMORY_LIMIT = 2048  # MB of address space, only enforced on Linux
+# Where the sources go (--output-format): "dir" (a folder, resumable), "zip" or "tar" (.tar.zst, .tar.gz without zstandard)
+OUTPUT_FORMAT = "dir"
+# Levels of nested archives (PKG entries, bundled executables, base_library.zip) extracted into the same tree (--nested-depth)
+NESTED_DEPTH = pyinstxtractor.PyInstArchive.MAX_NESTED_DEPTH
+# MB of decompression buffers an extraction holds at the same time (--max-memory), large entries are streamed
+EXTRACT_MAX_MEMORY = pyinstxtractor.PyInstArchive.DEFAULT_MAX_MEMORY // (1024 * 1024)
+# Profile every run (--profile): cProfile, stack samples and tracemalloc, written to <output>.profile (see profiler.py)
+PROFILE = False
+# SQLite database the symbols and sources of every run are added to (--symbol-index, see symbol_index.py), None = off
+SYMBOL_INDEX = None
+SYMBOL_INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output", "symbols.db")
+# Where --serve listens without an address ("HOST:PORT", "PORT" or "unix:PATH")
+SERVICE_ADDRESS = "127.0.0.1:8765"
+# Folder whose executables the service may read itself (--serve-inputs, POST /jobs?path=), None = only uploads
+SERVICE_INPUT_DIR = None
+# The API has no authentication: other than loopback addresses only with --allow-remote
+SERVICE_ALLOW_REMOTE = False
+# Warm decompyle3 processes (decompile_worker.WorkerPool) used instead of one process per module, set by --serve
+WARM_WORKERS = None
+
+# Number of parallel decompiler processes (overridable with --jobs)
+DEFAULT_JOBS = os.cpu_count() or 1
+# Upper bound of queued decompile tasks per worker, keeps memory bounded on huge bundles
+MAX_PENDING_PER_JOB = 2
+# Seconds between two cache evictions in service mode
+CACHE_EVICT_INTERVAL = 600
+
+
+def installed_requirements(requirements):
+    """
+    Returns {name: installed version} for the lines of a requirements file, or None if a package
+    is missing or (when the `packaging` module is available) its version does not match.
+    """
+    from importlib import metadata
+    try:
+        from packaging.requirements import Requirement, InvalidRequirement
+    except ImportError:
+        Requirement = None
+
+    versions = {}
+    for line in requirements.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line or line.startswith("-"):
+            continue  # pip options like -r or --index-url
+        if Requirement is not None:
+            try:
+                requirement = Requirement(line)
+            except InvalidRequirement:
+                return None
+            if requirement.marker is not None and not requirement.marker.evaluate():
+                continue
+            name, specifier = requirement.name, requirement.specifier
+        else:
+            # Ohne packaging nur prüfen, ob das Paket installiert ist
+            name, specifier = re.match(r"[A-Za-z0-9._-]+", line).group(0), None
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            return None
+        if specifier is not None and not specifier.contains(versions[name], prereleases=True):
+            return None
+    return versions
 
+def requirements_stamp_is_current(digest):
+    """True if the stamp was written for this requirements.txt and interpreter and the packages are still installed."""
+    from importlib import metadata
+    try:
+        with open(REQUIREMENTS_STAMP, encoding="utf-8") as f:
+            stamp = json.load(f)
+        if stamp.get("requirements") != digest or stamp.get("python") != sys.executable:
+            return False
+        return all(metadata.version(name) == version for name, version in stamp.get("versions", {}).items())
+    except (OSError, ValueError, AttributeError, metadata.PackageNotFoundError):
+        return False
 
 def check_requirements():
-    """Checks for requirements.txt and installs dependencies."""
+    """Checks for requirements.txt and installs dependencies, pip only runs if a package is missing or outdated."""
     if not os.path.exists(REQUIREMENTS_FILE):
         print(f"[ERROR] '{REQUIREMENTS_FILE}' not found. Please create it and add 'decompyle3'.")
         sys.exit(1)
-    
-    print("[+] Installing requirements...")
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", REQUIREMENTS_FILE], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    with open(REQUIREMENTS_FILE, "rb") as f:
+        requirements = f.read()
+    digest = hashlib.sha256(requirements).hexdigest()
+    if requirements_stamp_is_current(digest):
         print("[+] Requirements are up to date.")
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] Failed to install requirements: {e}")
-        sys.exit(1)
+        return
+
+    # Erst ohne pip nachsehen, ob alles installiert ist, pip startet mehrere Sekunden lang
+    versions = installed_requirements(requirements.decode("utf-8", errors="replace"))
+    if versions is None:
+        print("[+] Installing requirements...")
+        try:
+            subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", REQUIREMENTS_FILE], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except subprocess.CalledProcessError as e:
+            print(f"[ERROR] Failed to install requirements: {e}")
+            sys.exit(1)
+        versions = installed_requirements(requirements.decode("utf-8", errors="replace"))
+    print("[+] Requirements are up to date.")
+
+    if versions is not None:
+        try:
+            with open(REQUIREMENTS_STAMP, "w", encoding="utf-8") as f:
+                json.dump({"requirements": digest, "python": sys.executable, "versions": versions}, f)
+        except OSError:
+            pass  # Read-only installation, pip is just asked again next time
 
 def select_exe():
     """Opens a file dialog to select the EXE file."""
+    # tkinter wird nur hier gebraucht, headless Server haben es oft nicht installiert
+    import tkinter as tk
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.withdraw()
     return filedialog.askopenfilename(
@@ -93,120 +229,692 @@ def select_exe():
         filetypes=[("Executable files", "*.exe")]
     )
 
-def run_pyinstxtractor(exe_path):
+class ExtractionStream:
+    """
+    Files of an archive that is still being extracted. The extractor announces the extraction
+    directory and Python version, then puts every finished file; iterating yields their paths
+    (relative to the extraction directory) until the extraction is over. If the extraction failed
+    (error) or skipped entries (failed), the files are only part of the archive.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.started = threading.Event()
+        self.extracted_dir = None
+        self.python_version = None
+        self.error = None
+        self.failed = []  # Entries the extractor had to skip (see pyinstxtractor.ExtractionResult)
+
+    def start(self, extracted_dir, python_version):
+        self.extracted_dir, self.python_version = extracted_dir, python_version
+        self.started.set()
+
+    def put(self, name):
+        self.queue.put(name)
+
+    def close(self, error=None):
+        """Ends the stream, error is the exception that stopped the extraction, if any."""
+        self.error = error
+        self.queue.put(None)
+        self.started.set()  # Also wakes up a consumer if the extraction failed before it started
+
+    @property
+    def complete(self):
+        """True if the extraction finished and wrote every entry of the archive."""
+        return self.error is None and not self.failed
+
+    def wait(self):
+        """Blocks until the extraction started or failed. Returns True if it started."""
+        self.started.wait()
+        return self.extracted_dir is not None
+
+    def __iter__(self):
+        while True:
+            name = self.queue.get()
+            if name is None:
+                return
+            yield name
+
+def run_pyinstxtractor(exe_path, jobs=DEFAULT_JOBS, work_dir=None, slots=None, report=None, stream=None, select=None):
     """
-    Runs pyinstxtractor, detects Python version, and returns the extracted folder path and version.
+    Runs pyinstxtractor in-process, detects Python version, and returns the extracted folder path and version.
+    The archive is extracted below work_dir (default: the current directory). Every finished file is
+    also put into stream (an ExtractionStream), if given, so it can be decompiled right away.
+    select limits the extraction to some members (see pyinstxtractor.extract).
     """
     print(f"[+] Extracting {os.path.basename(exe_path)}...")
-    if not os.path.exists(PYINST_PATH):
-        print(f"[ERROR] pyinstxtractor.py not found in the project folder.")
+    result = pyinstxtractor.extract(exe_path, work_dir or os.getcwd(), jobs=jobs, workerSlots=slots, tracer=report,
+                                    maxMemory=EXTRACT_MAX_MEMORY * 1024 * 1024, nestedDepth=NESTED_DEPTH, fileCallback=stream.put if stream else None,
+                                    startCallback=stream.start if stream else None, select=select)
+    if result is None:
+        print("[ERROR] pyinstxtractor failed to extract the archive.")
         return None, None
+    if result.failedEntries:
+        print(f"[WARNING] {len(result.failedEntries)} entries could not be extracted, "
+              f"earlier results of their modules are kept.")
+        if stream is not None:
+            stream.failed = result.failedEntries
+    nested = [name for name, kind in result.nestedArchives if kind != "duplicate"]
+    if nested:
+        print(f"[INFO] Extracted {len(nested)} nested archives into the same tree: {', '.join(nested)}")
+    others = [f"{name} ({major}.{minor})" for name, (major, minor) in sorted(result.nestedVersions.items())
+              if (major, minor) != result.pyVersion]
+    if others:
+        # Header, Dekompilierer und Bibliotheksindex richten sich nach der Version des äußeren Archivs
+        print(f"[WARNING] Nested archives built with another Python version: {', '.join(others)}. "
+              f"Their modules are decompiled as Python {result.pythonVersion}, check their sources.")
+
+    python_version = result.pythonVersion
+    current_version = f"{sys.version_info.major}.{sys.version_info.minor}"
+    print(f"[INFO] EXE was built with Python {python_version}. You are using Python {current_version}.")
+
+    return result.extractionDir, python_version
 
+def list_files(extracted_dir):
+    """Returns all files below extracted_dir, relative to it, in a stable, sorted order."""
+    paths = []
+    for root, dirs, files in os.walk(extracted_dir):
+        dirs.sort()
+        for file in sorted(files):
+            paths.append(os.path.relpath(os.path.join(root, file), extracted_dir))
+    return paths
+
+def module_tier(name, libraries):
+    """
+    Decompile order of an extracted file (relative path): 0 files that are not compiled modules,
+    1 entry point scripts, 2 application modules, 3 library modules (top-level name in libraries,
+    the standard library of base_library.zip, PyInstaller's own bootstrap and runtime hooks).
+    """
+    if not name.endswith(".pyc"):
+        return 0
+    parts = name.replace(os.path.sep, "/").split("/")
+    # Pfad innerhalb des innersten entpackten Containers (PYZ, Zip, verschachteltes Archiv)
+    containers = [index for index, part in enumerate(parts[:-1]) if part.endswith("_extracted")]
+    container = parts[containers[-1]] if containers else ""
+    inner = parts[containers[-1] + 1:] if containers else parts
+    top_level = inner[0][:-len(".pyc")] if len(inner) == 1 else inner[0]
+    if container.startswith("base_library.zip") or top_level.startswith(("pyimod", "pyiboot", "pyi_rth_")) or top_level in libraries:
+        return 3
+    if not container.endswith((".pyz_extracted", ".zip_extracted")):
+        return 1  # Direkt im CArchive liegen sonst nur die Skripte
+    return 2
+
+def run_bounded(func, items, jobs, slots=None, name=""):
+    """
+    Calls func for every item on a pool of `jobs` threads and returns the results in input order.
+    items may be any iterable, also one that is still being filled (an ExtractionStream).
+    At most jobs * MAX_PENDING_PER_JOB items are in flight at any time. If slots (a semaphore
+    shared with other work) is given, every call holds one of its slots while it runs.
+    The threads are named after name (e.g. the stage they work for).
+    """
+    if slots is not None:
+        task = func
+        def func(item):
+            with slots:
+                return task(item)
+
+    if jobs <= 1:
+        return [func(item) for item in items]
+
+    results = []
+    max_pending = jobs * MAX_PENDING_PER_JOB
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix=name) as pool:
+        pending = {}
+        for index, item in enumerate(items):
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+            pending[pool.submit(func, item)] = index
+            results.append(None)
+        for future in pending:
+            results[pending[future]] = future.result()
+    return results
+
+def run_prioritized(func, items, jobs, priority, slots=None, name=""):
+    """
+    Like run_bounded, but a free thread always takes the item with the lowest priority(item) among
+    those that arrived so far. items (e.g. an ExtractionStream) are collected as they come in, only
+    the items themselves are held, not tasks for them.
+    """
+    heap, results = [], []
+    changed = threading.Condition()
+    state = {"done": False, "error": None}
+
+    def work():
+        while True:
+            with changed:
+                while not heap and not state["done"] and state["error"] is None:
+                    changed.wait()
+                if state["error"] is not None or not heap:
+                    return
+                (_, index, item) = heapq.heappop(heap)
+            try:
+                if slots is not None:
+                    with slots:
+                        results[index] = func(item)
+                else:
+                    results[index] = func(item)
+            except BaseException as e:
+                with changed:
+                    state["error"] = state["error"] or e
+                    changed.notify_all()
+                return
+
+    workers = [threading.Thread(target=work, name=f"{name}_{number}", daemon=True) for number in range(max(jobs, 1))]
+    for worker in workers:
+        worker.start()
     try:
-        result = subprocess.run(
-            [sys.executable, PYINST_PATH, exe_path],
-            capture_output=True, text=True, check=True, encoding='utf-8', errors='ignore'
-        )
-        print(result.stdout)
-
-        # Suchen nach der Python-Version (z.B. 3.13)
-        match = re.search(r"Python version: (\d+\.\d+)", result.stdout)
-        python_version = None
-        if match:
-            python_version = match.group(1)
-            current_version = f"{sys.version_info.major}.{sys.version_info.minor}"
-            print(f"[INFO] EXE was built with Python {python_version}. You are using Python {current_version}.")
-            if python_version != current_version:
-                print(f"[WARNING] For best results, your local Python version should match the EXE's version!")
-        else:
-            print("[WARNING] Could not determine Python version from extraction log.")
-        
-        extracted_folder = os.path.basename(exe_path) + "_extracted"
-        return extracted_folder, python_version
+        for index, item in enumerate(items):
+            key = priority(item)
+            with changed:
+                if state["error"] is not None:
+                    break
+                results.append(None)
+                heapq.heappush(heap, (key, index, item))
+                changed.notify()
+    except BaseException as e:
+        # Z.B. Strg+C: die Threads sollen nicht erst alle wartenden Dateien abarbeiten
+        with changed:
+            state["error"] = state["error"] or e
+        raise
+    finally:
+        with changed:
+            state["done"] = True
+            changed.notify_all()
+        for worker in workers:
+            worker.join()
+    if state["error"] is not None:
+        raise state["error"]
+    return results
 
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] pyinstxtractor.py failed:\n{e.stderr}")
-        return None, None
+def memory_limiter(limit_mb):
+    """
+    Returns a preexec_fn for Popen that caps the address space of the new process at limit_mb
+    before the decompiler is executed (POSIX), or None without a limit or on Windows.
+    """
+    if not limit_mb or resource is None:
+        return None
+    limit = limit_mb * 1024 * 1024
+
+    def apply():
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (OSError, ValueError):
+            pass  # Systems without RLIMIT_AS (macOS refuses to lower it) run without a cap
+    return apply
 
-def decompile_and_move(extracted_dir, final_out_dir, python_version):
+def run_decompiler(args):
     """
-    Decompiles all .pyc files using the appropriate decompiler based on Python version.
+    Runs a decompiler process within the time and memory budget and returns (stdout, error).
+    error is None on success, otherwise the error message.
+    """
+    try:
+        with subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              preexec_fn=memory_limiter(DECOMPILE_MEMORY_LIMIT)) as process:
+            try:
+                stdout, stderr = process.communicate(timeout=DECOMPILE_TIMEOUT or None)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                return None, f"timed out after {DECOMPILE_TIMEOUT}s"
+    except OSError as e:
+        return None, str(e)
+    if process.returncode != 0:
+        return None, stderr.decode("utf-8", errors="ignore") or f"exit code {process.returncode}"
+    return stdout, None
+
+def code_outline(code, indent=""):
+    """Lists names, constants and nested functions of a code object of any Python version."""
+    lines = [f"{indent}code object {code.co_name} (line {code.co_firstlineno})",
+             f"{indent}  names: {', '.join(map(str, code.co_names))}",
+             f"{indent}  variables: {', '.join(map(str, code.co_varnames))}"]
+    for const in code.co_consts:
+        if isinstance(const, pyinstxtractor.CodeObject):
+            lines += code_outline(const, indent + "  ")
+        else:
+            lines.append(f"{indent}  constant: {const!r}"[:200])
+    return lines
+
+def disassemble_file(src_path, python_version):
     """
-    print(f"\n[+] Decompiling source files for Python {python_version or 'unknown'}...")
-    if os.path.exists(final_out_dir):
-        shutil.rmtree(final_out_dir)
-    os.makedirs(final_out_dir)
+    Last tier of the fallback chain: returns (a bytecode listing as comments, error). Bytecode of
+    other Python versions than the running one only gets an outline of its code objects.
+    """
+    try:
+        with open(src_path, "rb") as f:
+            data = f.read()
+        header_size = pyc_header_size(python_version)
+        if data[:4] == importlib.util.MAGIC_NUMBER:
+            listing = io.StringIO()
+            dis.dis(marshal.loads(data[header_size:]), file=listing)
+            lines = listing.getvalue().splitlines()
+        else:
+            version = tuple(int(part) for part in python_version.split(".")[:2]) if python_version else None
+            lines = code_outline(pyinstxtractor.loadMarshal(data[header_size:], version))
+    except Exception as e:
+        return None, f"disassembly failed: {e}"
 
-    decompiler_path = ""
-    is_pycdc = False
+    out = [f"# Decompilation failed, bytecode listing of {os.path.basename(src_path)} (Python {python_version})\n"]
+    out.extend(f"# {line}\n" if line else "#\n" for line in lines)
+    return "".join(out).encode("utf-8"), None
+
+class DecompilerTier:
+    """One strategy of the fallback chain: an external decompiler or the in-process disassembler ("disasm")."""
+
+    def __init__(self, name, path=None, is_pycdc=False):
+        self.name = name
+        self.path = path
+        self.is_pycdc = is_pycdc
+
+    @property
+    def identity(self):
+        if self.path is None:
+            return f"{self.name}:{sys.version_info.major}.{sys.version_info.minor}"
+        return decompiler_identity(self.path, self.is_pycdc)
+
+def decompile_file(tier, src_path, python_version=None):
+    """Decompiles a single .pyc file. Returns (source bytes, None) on success, otherwise (None, error message)."""
+    if tier.path is None:
+        return disassemble_file(src_path, python_version)
+
+    if tier.name == "decompyle3" and WARM_WORKERS is not None:
+        # Im Dienst: ein warmer decompyle3-Prozess statt eines neuen Interpreters pro Modul
+        data, error = WARM_WORKERS.decompile(src_path, DECOMPILE_TIMEOUT or None)
+    else:
+        # pycdc und decompyle3 (ohne -o) geben den Code auf stdout aus, er geht direkt an die Ausgabe
+        data, error = run_decompiler([tier.path, src_path])
+    if error is None and not data:
+        error = "the decompiler wrote no output"
+    return (data, None) if error is None else (None, error)
+
+def pycdc_candidates():
+    """Tools/pycdc.exe is a Windows build, elsewhere only a pycdc on the PATH can run."""
+    return [PYCDC_PATH] if os.name == "nt" else []
+
+def find_executable(candidates, name):
+    """Returns the first existing path of candidates, otherwise looks for name on PATH."""
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return shutil.which(name)
+
+def select_decompiler(python_version):
+    """Returns the decompiler path and whether it is pycdc, or (None, False) if it is missing."""
+    if CUSTOM_DECOMPILER:
+        print(f"[INFO] Using custom decompiler: {CUSTOM_DECOMPILER}")
+        decompiler_path = find_executable([CUSTOM_DECOMPILER], CUSTOM_DECOMPILER)
+        if decompiler_path is None:
+            print(f"[ERROR] Decompiler not found: {CUSTOM_DECOMPILER}")
+            return None, False
+        return decompiler_path, True
 
     # NEU: Logik zur Auswahl des Dekompilierers
     if python_version == "3.13":
         print("[INFO] Python 3.13 detected. Switching to pycdc decompiler.")
-        decompiler_path = PYCDC_PATH
-        is_pycdc = True
-        if not os.path.exists(decompiler_path):
-            print(f"[ERROR] Python 3.13 decompiler not found at: {decompiler_path}")
-            print("[INFO] Please place 'pycdc.exe' in the 'Tools' subfolder.")
-            return False
-    else:
-        print("[INFO] Using default 'decompyle3' decompiler.")
-        scripts_dir = os.path.join(os.path.dirname(sys.executable), "Scripts")
-        decompiler_path = os.path.join(scripts_dir, "decompyle3.exe")
+        decompiler_path = find_executable(pycdc_candidates(), "pycdc")
+        if decompiler_path is None:
+            if os.name == "nt":
+                print(f"[ERROR] Python 3.13 decompiler not found at: {PYCDC_PATH}")
+                print("[INFO] Please place 'pycdc.exe' in the 'Tools' subfolder.")
+            else:
+                print("[ERROR] Python 3.13 decompiler 'pycdc' not found on the PATH.")
+            return None, False
+        return decompiler_path, True
 
-    if not is_pycdc and not os.path.exists(decompiler_path):
-        print(f"[ERROR] Default decompiler not found at: {decompiler_path}")
-        return False
+    print("[INFO] Using default 'decompyle3' decompiler.")
+    decompiler_path = find_decompyle3()
+    if decompiler_path is None:
+        print(f"[ERROR] Default decompiler not found at: {os.path.join(os.path.dirname(sys.executable), 'Scripts', 'decompyle3.exe')}")
+        return None, False
+    return decompiler_path, False
+
+def find_decompyle3():
+    """Returns the path of decompyle3 or None."""
+    # Windows: <python>\Scripts\decompyle3.exe, Linux/macOS: <venv>/bin/decompyle3
+    python_dir = os.path.dirname(sys.executable)
+    return find_executable([os.path.join(python_dir, "Scripts", "decompyle3.exe"), os.path.join(python_dir, "decompyle3")],
+                           "decompyle3")
+
+def decompiler_chain(python_version):
+    """Returns the DecompilerTier list to try for every module: the selected decompiler, then FALLBACK_CHAIN."""
+    chain = []
+    decompiler_path, is_pycdc = select_decompiler(python_version)
+    if decompiler_path is not None:
+        name = "custom" if CUSTOM_DECOMPILER else "pycdc" if is_pycdc else "decompyle3"
+        chain.append(DecompilerTier(name, decompiler_path, is_pycdc))
+
+    for name in FALLBACK_CHAIN:
+        if any(tier.name == name for tier in chain):
+            continue
+        if name == "disasm":
+            chain.append(DecompilerTier(name))
+            continue
+        path = find_executable(pycdc_candidates(), "pycdc") if name == "pycdc" else find_decompyle3()
+        if path is None:
+            print(f"[WARNING] Fallback decompiler '{name}' not found, skipping it.")
+        else:
+            chain.append(DecompilerTier(name, path, name == "pycdc"))
 
-    original_cwd = os.getcwd()
-    success_count, fail_count = 0, 0
-
-    for root, _, files in os.walk(extracted_dir):
-        for file in files:
-            if file.endswith(".pyc"):
-                src_path = os.path.join(root, file)
-                # Zielpfad für die .py-Datei
-                target_py_path = src_path.replace(".pyc", ".py")
-                
-                try:
-                    # NEU: Angepasste Befehle für beide Dekompilierer
-                    if is_pycdc:
-                        # pycdc gibt den Code auf stdout aus, wir leiten ihn in eine Datei um
-                        with open(target_py_path, 'w', encoding='utf-8') as f_out:
-                            subprocess.run(
-                                [decompiler_path, src_path],
-                                check=True, stdout=f_out, stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='ignore'
-                            )
-                    else:
-                        # decompyle3 erstellt die Datei selbst, wir müssen nur das Verzeichnis wechseln
-                        os.chdir(root)
-                        subprocess.run(
-                            [decompiler_path, file],
-                            check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore'
-                        )
-                        os.chdir(original_cwd)
-                    
-                    success_count += 1
-                except (subprocess.CalledProcessError, FileNotFoundError) as e:
-                    # print(f"Failed on {file}: {e.stderr if hasattr(e, 'stderr') else e}") # Uncomment for debug
-                    fail_count += 1
-                finally:
-                    if not is_pycdc:
-                        os.chdir(original_cwd) # Nur für decompyle3 zurückwechseln
+    if chain and decompiler_path is None:
+        print(f"[WARNING] Continuing with the fallback chain: {', '.join(tier.name for tier in chain)}")
+    return chain
+
+def decompiler_identity(decompiler_path, is_pycdc):
+    """Returns a string that changes whenever the decompiler (and thus its output) changes."""
+    if is_pycdc:
+        with open(decompiler_path, "rb") as f:
+            return "pycdc:" + hashlib.sha256(f.read()).hexdigest()[:16]
+    from importlib import metadata
+    try:
+        return "decompyle3:" + metadata.version("decompyle3")
+    except metadata.PackageNotFoundError:
+        return "decompyle3:unknown"
+
+class DecompileResult:
+    """
+    Outcome of decompile_and_move(), true if at least one module was decompiled or recognized.
+    Modules that only got a bytecode listing (listing_count) do not count as decompiled.
+    """
+
+    def __init__(self, success_count=0, fail_count=0, error=None, known_count=0, listing_count=0):
+        self.success_count = success_count
+        self.fail_count = fail_count
+        self.known_count = known_count
+        self.listing_count = listing_count
+        self.error = error
+
+    def __bool__(self):
+        return self.success_count + self.known_count > 0
+
+def decompile_and_move(extracted_dir, sink, python_version, jobs=DEFAULT_JOBS, cache=None, slots=None, resume=True,
+                       report=None, known=None, files=None, indexer=None, unchanged=None):
+    """
+    Decompiles all .pyc files using the appropriate decompiler based on Python version.
+    Up to `jobs` decompiler processes run in parallel. Identical modules are decompiled
+    only once, and with a DecompileCache only if no earlier run has seen them.
+    Sources go to sink (see output_sink), bundled .py files are moved there as well.
+    With resume, modules the manifest of a directory sink lists as done and unchanged are skipped,
+    without it everything is decompiled again and the manifest starts over.
+    Modules of an earlier run that are no longer in the archive are removed, unless files come from an
+    extraction that failed or skipped entries.
+    Modules found in the KnownModuleIndex known (library code) get a stub instead of a decompiled source.
+    files are the paths of the extracted files relative to extracted_dir; an ExtractionStream is
+    decompiled while the extraction is still running. Default: all files below extracted_dir.
+    Entry point scripts are decompiled first, then application modules, then library code (see
+    module_tier), the largest modules of each first.
+    Stage and module timings go to report (a RunReport). With an indexer (symbol_index.ArchiveIndexer)
+    the symbols and sources of all modules except known ones are added to the symbol index.
+    unchanged are modules and bundled sources (paths with /) that files leave out because sink
+    already has them from the previous release (see run_diff); they are kept, not removed.
+    Returns a DecompileResult.
+    """
+    report = report or RunReport()
+    print(f"\n[+] Decompiling source files for Python {python_version or 'unknown'} ({jobs} jobs)...")
+
+    chain = decompiler_chain(python_version)
+    if not chain:
+        return DecompileResult(error="decompiler not found")
+
+    # Ergebnisse hängen nur von der Stufe ab, die sie erzeugt hat: eine andere Reihenfolge oder neue
+    # Fallback-Stufen machen Cache und Manifest nicht ungültig
+    identities = {tier.name: tier.identity for tier in chain}
+    primary_id = identities[chain[0].name]
+    # Ein Bytecode-Listing ist kein Quelltext: es zählt extra und wird im nächsten Lauf erneut versucht
+    listing_tiers = {tier.name for tier in chain if tier.path is None}
+    header_size = pyc_header_size(python_version)
+    use_index = known is not None and len(known) > 0
+    # Nur ein Ordner kann fortgesetzt werden, Archive werden jedes Mal neu geschrieben. Ohne resume
+    # beginnt das Manifest leer und wird für den nächsten Lauf neu geschrieben
+    manifest = Manifest(sink.path) if sink.resumable else None
+    if manifest is not None and resume:
+        manifest.load()
+
+    # Gleiche Module (gleicher Bytecode) nur einmal dekompilieren: das erste Modul eines Schlüssels
+    # dekompiliert, spätere bekommen eine Kopie, sobald das Ergebnis da ist
+    lock = threading.Lock()
+    groups, modules, sources, notes = {}, [], [], []
+    totals = {"skipped": 0, "known": 0, "bytes_in": 0, "first_result": None, "first_entry_point": None}
+
+    # Bibliotheken: was der Index kennt und die Standardbibliothek des laufenden Interpreters (ab 3.10)
+    libraries = set(getattr(sys, "stdlib_module_names", ()))
+    if known is not None:
+        libraries |= known.top_level_names(python_version)
+
+    def priority(name):
+        tier = module_tier(name, libraries)
+        if tier == 0:
+            return (0, 0)
+        try:
+            size = os.path.getsize(os.path.join(extracted_dir, name))
+        except OSError:
+            size = 0
+        return (tier, -size)
+
+    def index_key(module_hash, tier_name):
+        # Gleicher Bytecode, Dekompilierer und Stufe ergeben denselben Quelltext
+        return f"{content_key(module_hash, identities.get(tier_name, primary_id))}:{tier_name or 'failed'}"
+
+    def finished():
+        with lock:
+            if totals["first_result"] is None:
+                totals["first_result"] = round(time.perf_counter() - report.started, 4)
+
+    def decompile_group(key, src_path):
+        # Cache-Treffer und neue Ergebnisse gehen direkt an ihren endgültigen Platz
+        error, source, tier_name, attempts = None, "cache", chain[0].name, []
+        data = cache.get(key) if cache is not None else None
+        if data is None:
+            source = "decompiler"
+            # Fehlgeschlagene oder abgebrochene Module wandern durch die Fallback-Kette
+            for tier in chain:
+                tier_started = time.perf_counter()
+                data, error = decompile_file(tier, src_path, python_version)
+                attempts.append({"tier": tier.name, "seconds": round(time.perf_counter() - tier_started, 3),
+                                 "error": error[-200:] if error else None})
+                if error is None:
+                    tier_name = tier.name
+                    break
+            # Nur vollständige Ergebnisse der ersten Stufe cachen
+            if error is None and cache is not None and tier_name == chain[0].name:
+                cache.put(key, data)
+        return data, error, source, tier_name if error is None else None, attempts
+
+    def record_member(member, outcome, leader):
+        (src_path, module, module_hash, output) = member
+        (error, source, tier_name, attempts, seconds, bytes_in, bytes_out, leader_output) = outcome
+        if not leader and error is None:
+            sink.copy(leader_output, output)
+        if not leader and indexer is not None:
+            indexer.add(module, index_key(module_hash, tier_name), output)
+        status = "failed" if error is not None else "listing" if tier_name in listing_tiers else "ok"
+        if manifest is not None:
+            manifest.record(module, input_hash=module_hash, decompiler=identities.get(tier_name, primary_id),
+                            tier=tier_name, status=status, output=output, seconds=seconds if leader else 0,
+                            error=error[-500:] if error else None)
+        report.module(module, status=status, source=source if leader else "duplicate", tier=tier_name,
+                      seconds=seconds if leader else 0, bytes_in=bytes_in, bytes_out=bytes_out,
+                      error=error[-500:] if error else None,
+                      attempts=attempts if leader and (len(attempts) > 1 or error is not None) else None)
+
+    def process_file(name):
+        if name.endswith(".py"):
+            with lock:
+                sources.append(name)  # Mitgelieferte Quelltexte werden am Ende verschoben
+            return
+        if os.path.basename(name) == pyinstxtractor.PyInstArchive.DUPLICATE_NOTE:
+            with lock:
+                notes.append(name)  # Hinweis an der Stelle eines übersprungenen, doppelten Archivs
+            return
+        if not name.endswith(".pyc"):
+            return
+        started = time.perf_counter()
+        src_path = os.path.join(extracted_dir, name)
+        module = name.replace(os.path.sep, "/")
+        output = module[:-len(".pyc")] + ".py"
+        module_hash = input_hash(src_path, header_size)
+        bytes_in = os.path.getsize(src_path)
+        with lock:
+            modules.append(module)
+            totals["bytes_in"] += bytes_in
+
+        if manifest is not None and manifest.is_current(module, module_hash, identities.values()):
+            with lock:
+                totals["skipped"] += 1
+            report.module(module, status="skipped", source="manifest", seconds=0)
+            if indexer is not None:
+                # Nur lesen, wenn der Index diesen Quelltext noch nicht hat (z.B. beim ersten Lauf mit Index)
+                record = manifest.modules[module]
+                key = index_key(module_hash, record.get("tier"))
+                data = None
+                if indexer.needs_source(key):
+                    with open(os.path.join(sink.path, record["output"]), "rb") as f:
+                        data = f.read()
+                indexer.add(module, key, record["output"], src_path, data)
+            return
+        # Bekannte Bibliotheksmodule bekommen nur einen Platzhalter
+        fingerprint = pyc_fingerprint(src_path, header_size, python_version) if use_index else None
+        library = known.lookup(python_version, fingerprint) if use_index else None
+        if library is not None:
+            sink.write(output, stub_source(library).encode("utf-8"))
+            if manifest is not None:
+                manifest.record(module, input_hash=module_hash, decompiler="known", status="known", output=output,
+                                package=library["package"], seconds=0, error=None)
+            report.module(module, status="known", source="index", package=library["package"], seconds=0)
+            with lock:
+                totals["known"] += 1
+            finished()
+            return
+
+        key = content_key(module_hash, primary_id)
+        member = (src_path, module, module_hash, output)
+        with lock:
+            group = groups.get(key)
+            leader = group is None
+            if leader:
+                group = groups[key] = {"members": [member], "outcome": None}
+            else:
+                group["members"].append(member)
+                outcome = group["outcome"]
+        if not leader:
+            # Ist der Erste noch nicht fertig, kopiert er das Ergebnis selbst hierher
+            if outcome is not None:
+                record_member(member, outcome, False)
+            return
+
+        data, error, source, tier_name, attempts = decompile_group(key, src_path)
+        if error is None:
+            sink.write(output, data)
+            if module_tier(name, libraries) == 1:
+                with lock:
+                    if totals["first_entry_point"] is None:
+                        totals["first_entry_point"] = round(time.perf_counter() - report.started, 4)
+                print(f"[+] Entry point decompiled: {os.path.join(sink.path, output) if sink.resumable else output}")
+        outcome = (error, source, tier_name, attempts, round(time.perf_counter() - started, 3), bytes_in,
+                   len(data) if error is None else 0, output)
+        if indexer is not None:
+            indexer.add(module, index_key(module_hash, tier_name), output, src_path, data)
+        with lock:
+            group["outcome"] = outcome
+            waiting = group["members"][1:]
+        record_member(member, outcome, True)
+        for other in waiting:
+            record_member(other, outcome, False)
+        finished()
+
+    with report.stage("decompile", decompiler="+".join(identities.values())) as stage:
+        run_prioritized(process_file, list_files(extracted_dir) if files is None else files, jobs, priority, slots,
+                        "decompile")
+        stage["entries"] = len(modules)
+        stage["bytes_in"] = totals["bytes_in"]
+        stage["first_result"] = totals["first_result"]
+        stage["first_entry_point"] = totals["first_entry_point"]
+
+    # Module aus einem früheren Lauf entfernen, die es im Archiv nicht mehr gibt. Nach einer
+    # abgebrochenen Extraktion fehlen Module nur, deren Ergebnisse bleiben erhalten
+    complete = getattr(files, "complete", True)
+    for module in set(manifest.modules) - set(modules) - set(unchanged or ()) if manifest is not None and complete else ():
+        record = manifest.forget(module)
+        stale_path = os.path.join(sink.path, record.get("output", ""))
+        if os.path.isfile(stale_path):
+            os.remove(stale_path)
+
+    # Unveränderte Module der vorigen Version zählen mit und kommen in den Symbolindex
+    carried = {"ok": 0, "listing": 0, "known": 0, "failed": 0}
+    for module in sorted(unchanged or ()):
+        record = manifest.modules.get(module) if manifest is not None else None
+        if record is None:
+            if indexer is not None and module.endswith(".py") and os.path.isfile(os.path.join(sink.path, module)):
+                with open(os.path.join(sink.path, module), "rb") as f:
+                    data = f.read()
+                indexer.add(module, "py:" + hashlib.sha256(data).hexdigest(), module, source=data)
+            continue
+        status = record.get("status")
+        carried[status if status in carried else "failed"] += 1
+        report.module(module, status="unchanged", source="previous release", seconds=0)
+        if indexer is not None and status in ("ok", "listing"):
+            key = index_key(record.get("input_hash"), record.get("tier"))
+            data = None
+            if indexer.needs_source(key):
+                with open(os.path.join(sink.path, record["output"]), "rb") as f:
+                    data = f.read()
+            indexer.add(module, key, record["output"], source=data)
+
+    skipped_count, known_count = totals["skipped"], totals["known"] + carried["known"]
+    success_count, fail_count, tier_counts = skipped_count + carried["ok"], carried["failed"], {}
+    listing_count = carried["listing"]
+    for group in groups.values():
+        (error, _, tier_name, _, _, _, _, _) = group["outcome"]
+        if error is None:
+            if tier_name in listing_tiers:
+                listing_count += len(group["members"])
+            else:
+                success_count += len(group["members"])
+            tier_counts[tier_name] = tier_counts.get(tier_name, 0) + len(group["members"])
+        else:
+            if PRINT_FAILURES:
+                print(f"[FAILED] {group['members'][0][1]}: {error.strip()}")
+            fail_count += len(group["members"])
 
     print(f"[INFO] Decompilation finished: {success_count} succeeded, {fail_count} failed.")
-    
-    # Verschiebe alle erstellten .py Dateien
-    for root, _, files in os.walk(extracted_dir):
-        for file in files:
-            if file.endswith(".py"):
-                src_path = os.path.join(root, file)
-                relative_path = os.path.relpath(src_path, extracted_dir)
-                target_path = os.path.join(final_out_dir, relative_path)
-                os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                shutil.move(src_path, target_path)
-
-    return success_count > 0
+    if listing_count:
+        print(f"[INFO] {listing_count} modules only got a bytecode listing, the next run tries to decompile them again.")
+    fallbacks = {name: count for name, count in tier_counts.items() if name != chain[0].name}
+    if fallbacks:
+        print(f"[INFO] Produced by fallback tiers: {', '.join(f'{name} {count}' for name, count in fallbacks.items())}.")
+    if skipped_count:
+        print(f"[INFO] {skipped_count} modules were already done and unchanged, skipped.")
+    if sum(carried.values()):
+        print(f"[INFO] {sum(carried.values())} modules are unchanged since the previous release, kept from it.")
+    if known_count:
+        print(f"[INFO] {known_count} known library modules were stubbed, not decompiled (--all-modules).")
+    if cache is not None:
+        print(f"[INFO] Cache: {cache.hits} hits, {cache.misses} misses, "
+              f"{len(modules) - skipped_count - known_count - len(groups)} duplicates.")
+
+    # Verschiebe alle übrigen .py Dateien (z.B. mitgelieferte Quelltexte)
+    with report.stage("move") as stage:
+        for name in sources:
+            if indexer is not None:
+                with open(os.path.join(extracted_dir, name), "rb") as f:
+                    data = f.read()
+                indexer.add(name.replace(os.path.sep, "/"), "py:" + hashlib.sha256(data).hexdigest(), name,
+                            source=data)
+            sink.move(name, os.path.join(extracted_dir, name))
+        for name in notes:
+            sink.move(name, os.path.join(extracted_dir, name))
+        stage["entries"] = len(sources) + len(notes)
+
+    if indexer is not None:
+        with report.stage("index") as stage:
+            stats = indexer.finish(prune=complete)
+            stage.update(entries=stats["modules"], new_sources=stats["new_sources"], removed=stats["removed"])
+        print(f"[INFO] Symbol index: {stats['modules']} modules, {stats['unchanged']} unchanged, "
+              f"{stats['new_sources']} new sources, {stats['removed']} removed.")
+
+    if manifest is not None:
+        manifest.save()
+    return DecompileResult(success_count, fail_count, known_count=known_count, listing_count=listing_count)
 
 def cleanup(folder_path):
     """Deletes the temporary extracted folder."""
@@ -217,28 +925,494 @@ def cleanup(folder_path):
     elif not DELETE_TEMP_FOLDER:
         print(f"\n[INFO] DEBUG MODE: Temporary folder was NOT deleted at: {os.path.abspath(folder_path)}")
 
-if __name__ == "__main__":
-    os.chdir(os.path.dirname(os.path.abspath(__file__)))
-    check_requirements()
+def process_archive(exe_path, output_subfolder, jobs=DEFAULT_JOBS, cache=None, slots=None, work_dir=None, resume=True,
+                    known=None, progress=None, select=None, unchanged=None):
+    """
+    Extracts and decompiles one executable into output_subfolder (or an archive named after it,
+    see OUTPUT_FORMAT) and writes its run report next to the sources.
+    progress, if given, is called with every stage and module record as soon as it is done (see RunReport).
+    select and unchanged limit the run to the members that changed since the previous release (see run_diff).
+    Returns a summary dict for the batch report.
+    """
+    started = time.perf_counter()
+    report = RunReport(progress, file=os.path.abspath(exe_path), jobs=jobs, output_format=OUTPUT_FORMAT)
+    if PROFILE:
+        from profiler import RunProfiler
+        report.profiler = RunProfiler()
+        report.profiler.start()
+    sink = open_sink(OUTPUT_FORMAT, output_subfolder, fresh=not resume)
+    summary = {
+        "file": os.path.abspath(exe_path),
+        "output": os.path.abspath(sink.path),
+        "size": os.path.getsize(exe_path),
+        "status": "failed",
+        "python_version": None,
+        "succeeded": 0,
+        "failed": 0,
+        "known": 0,
+        "listings": 0,
+        "error": None,
+        "report": os.path.abspath(sink.report_path),
+    }
 
-    exe_file = select_exe()
-    if not exe_file:
-        print("[INFO] No file selected. Exiting.")
-        sys.exit(0)
+    # Extraktion und Dekompilierung laufen überlappend: jede fertige .pyc geht sofort an die Dekompilierer
+    stream, extraction = ExtractionStream(), {}
 
-    # NEU: Empfange die Python-Version vom Extraktor
-    extracted_folder, py_version = run_pyinstxtractor(exe_file)
+    def extract():
+        try:
+            with report.stage("extract", bytes_in=summary["size"]):
+                extraction["result"] = run_pyinstxtractor(exe_path, jobs, work_dir, slots, report, stream, select)
+        except BaseException as e:
+            extraction["error"] = e
+        finally:
+            stream.close(extraction.get("error"))
 
-    if extracted_folder and os.path.exists(extracted_folder):
-        output_subfolder = os.path.join(OUTPUT_DIR, os.path.basename(exe_file).replace(".exe", "_source"))
-        
-        # NEU: Übergebe die Version an die Dekompilierungsfunktion
-        if decompile_and_move(extracted_folder, output_subfolder, py_version):
-            print(f"\n[+] SUCCESS! The source code is located in: {os.path.abspath(output_subfolder)}")
+    extractor = threading.Thread(target=extract, name=f"extract-{os.path.basename(exe_path)}", daemon=True)
+    extractor.start()
+    result, indexer = None, None
+    try:
+        if stream.wait():
+            if SYMBOL_INDEX:
+                from symbol_index import ArchiveIndexer
+                indexer = ArchiveIndexer(SYMBOL_INDEX, os.path.abspath(sink.path), summary["file"],
+                                         stream.python_version, pyc_header_size(stream.python_version))
+            # NEU: Übergebe die Version an die Dekompilierungsfunktion
+            result = decompile_and_move(stream.extracted_dir, sink, stream.python_version, jobs, cache,
+                                        slots, resume, report, known, stream, indexer, unchanged)
+    finally:
+        if indexer is not None:
+            indexer.close()  # Nach einem Fehler: was noch nicht geschrieben wurde, kommt beim nächsten Lauf
+        extractor.join()
+        with report.stage("close"):
+            sink.close()
+        if report.profiler is not None:
+            report.profiler.stop()
+            summary["profile"] = os.path.abspath(output_subfolder + ".profile")
+            report.profiler.write(summary["profile"])
+            print(f"[INFO] Profile written to: {summary['profile']}")
+    if "error" in extraction:
+        raise extraction["error"]
+    extracted_folder = extraction["result"][0]
+    summary["python_version"] = report.info["python_version"] = stream.python_version
+
+    if result is not None and extracted_folder and os.path.exists(extracted_folder):
+        summary["succeeded"], summary["failed"], summary["known"] = result.success_count, result.fail_count, result.known_count
+        summary["listings"] = result.listing_count
+        if result:
+            summary["status"] = "ok"
+            print(f"\n[+] SUCCESS! The source code is located in: {os.path.abspath(sink.path)}")
         else:
+            summary["error"] = result.error or ("no module could be decompiled, only bytecode listings were written"
+                                                if result.listing_count else "no module could be decompiled")
             print("\n[ERROR] Decompilation failed. Check logs for details.")
         
-        cleanup(extracted_folder)
+        with report.stage("cleanup"):
+            cleanup(extracted_folder)
     else:
+        summary["error"] = "extraction failed"
         print("[ERROR] Extraction failed.")
 
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    report.info.update(status=summary["status"], error=summary["error"])
+    report.write(summary["report"])
+    return summary
+
+def collect_inputs(patterns):
+    """Expands files, directories (their files, not recursive) and glob patterns into a sorted file list."""
+    exe_files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        elif os.path.isfile(pattern):
+            matches = [pattern]
+        else:
+            matches = glob.glob(pattern, recursive=True)
+            if not matches:
+                print(f"[WARNING] No files match: {pattern}")
+        exe_files.update(os.path.abspath(path) for path in matches if os.path.isfile(path))
+    return sorted(exe_files)
+
+def output_folder_names(exe_files):
+    """Maps every executable to its own folder under OUTPUT_DIR, numbering duplicate names."""
+    folders, used = {}, set()
+    for exe_file in exe_files:
+        base = os.path.basename(exe_file).replace(".exe", "_source")
+        if not base.endswith("_source"):
+            base += "_source"
+        name, counter = base, 2
+        while name in used:
+            name, counter = f"{base}_{counter}", counter + 1
+        used.add(name)
+        folders[exe_file] = os.path.join(OUTPUT_DIR, name)
+    return folders
+
+def run_batch(patterns, jobs, cache, archive_jobs, summary_path, resume=True, known=None):
+    """
+    Processes many executables without user interaction. Up to archive_jobs archives run at once,
+    while all of them share one budget of `jobs` extraction and decompilation workers.
+    """
+    exe_files = collect_inputs(patterns)
+    if not exe_files:
+        print("[ERROR] No input files found.")
+        return False
+
+    print(f"[+] Batch mode: {len(exe_files)} files, {jobs} workers, {archive_jobs} archives at once.")
+    folders = output_folder_names(exe_files)
+    slots = threading.BoundedSemaphore(jobs)
+    started = time.perf_counter()
+
+    def process(exe_file):
+        work_dir = tempfile.mkdtemp(prefix="pyautodump_", dir=WORK_DIR)
+        try:
+            return process_archive(exe_file, folders[exe_file], jobs, cache, slots, work_dir, resume, known)
+        except Exception as e:
+            print(f"[ERROR] {os.path.basename(exe_file)}: {e}")
+            return {"file": exe_file, "output": folders[exe_file], "status": "failed", "error": str(e)}
+        finally:
+            if DELETE_TEMP_FOLDER:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = run_bounded(process, exe_files, archive_jobs, name="archive")
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r["status"] == "ok"]
+    modules = sum(r.get("succeeded", 0) + r.get("failed", 0) + r.get("known", 0) + r.get("listings", 0) for r in results)
+    total_bytes = sum(r.get("size", 0) for r in results)
+    summary = {
+        "archives": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "modules": modules,
+        "seconds": round(elapsed, 3),
+        "archives_per_minute": round(len(results) / elapsed * 60, 2) if elapsed else None,
+        "modules_per_second": round(modules / elapsed, 2) if elapsed else None,
+        "mb_per_second": round(total_bytes / elapsed / (1024 * 1024), 2) if elapsed else None,
+        "results": results,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(summary_path)), exist_ok=True)
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n[+] Batch finished: {summary['succeeded']}/{summary['archives']} archives, "
+          f"{modules} modules in {elapsed:.1f}s ({summary['modules_per_second']} modules/s).")
+    for r in results:
+        if r["status"] != "ok":
+            print(f"[ERROR] {r['file']}: {r['error']}")
+    print(f"[+] Summary written to: {os.path.abspath(summary_path)}")
+    return len(ok) == len(results)
+
+def release_output_folder(exe_path):
+    """
+    Output folder of exe_path in release-diff mode: the folder of an earlier run on this file (its run
+    report names it), otherwise the first free one of <name>_source, <name>_source_2, ... as releases
+    usually keep their file name.
+    """
+    base = output_folder_names([exe_path])[exe_path]
+    folder, counter = base, 2
+    while os.path.exists(folder):
+        try:
+            with open(os.path.join(folder, REPORT_FILE), encoding="utf-8") as f:
+                if json.load(f)["info"]["file"] == os.path.abspath(exe_path):
+                    return folder
+        except (OSError, ValueError, KeyError):
+            pass
+        folder, counter = f"{base}_{counter}", counter + 1
+    return folder
+
+def run_diff(old_exe, new_exe, jobs, cache, known=None):
+    """
+    Release-diff mode (see release_diff.py): processes new_exe, a later build of old_exe, by extracting
+    and decompiling only the members that differ between both archives into a copy of the output of
+    old_exe, then writes a source diff of both outputs next to it. Without an output of old_exe,
+    old_exe is processed completely first. Returns the summary dict of new_exe.
+    """
+    def process(exe_path, output_subfolder, select=None, unchanged=None):
+        work_dir = tempfile.mkdtemp(prefix="pyautodump_", dir=WORK_DIR)
+        try:
+            return process_archive(exe_path, output_subfolder, jobs, cache, None, work_dir, True, known,
+                                   select=select, unchanged=unchanged)
+        finally:
+            if DELETE_TEMP_FOLDER:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    old_folder = release_output_folder(old_exe)
+    if not os.path.exists(os.path.join(old_folder, MANIFEST_FILE)):
+        print(f"[INFO] No earlier output of {os.path.basename(old_exe)}, processing it completely first.")
+        summary = process(old_exe, old_folder)
+        if summary["status"] != "ok":
+            return summary
+    new_folder = release_output_folder(new_exe)
+
+    started = time.perf_counter()
+    diff = compare_releases(old_exe, new_exe)
+    if diff is None:
+        return {"file": os.path.abspath(new_exe), "status": "failed", "error": "not a PyInstaller archive"}
+    print(f"[+] {os.path.basename(new_exe)} against {os.path.basename(old_exe)}: {len(diff.added)} added, "
+          f"{len(diff.changed)} changed, {len(diff.removed)} removed, {diff.unchanged} unchanged "
+          f"({(time.perf_counter() - started) * 1000:.1f}ms)")
+
+    # Die neue Ausgabe beginnt als Kopie der vorigen, ein früherer Diff-Lauf wird fortgesetzt
+    if not os.path.exists(os.path.join(new_folder, MANIFEST_FILE)):
+        shutil.copytree(old_folder, new_folder, ignore=shutil.ignore_patterns(REPORT_FILE), dirs_exist_ok=True)
+    select, unchanged = diff.plan(Manifest(new_folder).load().modules)
+    for name in diff.removed:
+        if name.endswith(".py") and os.path.isfile(os.path.join(new_folder, name)):
+            os.remove(os.path.join(new_folder, name))
+
+    summary = process(new_exe, new_folder, select, unchanged)
+    summary["previous"] = os.path.abspath(old_folder)
+    summary["changes"] = diff.summary()
+    summary["diff"] = os.path.abspath(new_folder + ".diff")
+    files = write_source_diff(diff, old_folder, new_folder, summary["diff"])
+    print(f"[+] Source diff of {files} files written to: {summary['diff']}")
+    print(f"[INFO] Release processed in {time.perf_counter() - started:.1f}s.")
+    return summary
+
+def run_service(address, jobs, cache, archive_jobs, known=None):
+    """
+    Runs the decompilation service (see service.py) until it is interrupted. The known module index,
+    the cache and a pool of warm decompyle3 processes are loaded once and shared by all jobs.
+    """
+    global WARM_WORKERS
+    import service
+    from decompile_worker import WorkerPool
+
+    if not CUSTOM_DECOMPILER or "decompyle3" in FALLBACK_CHAIN:
+        print(f"[+] Starting {jobs} decompyle3 workers...")
+        pool = WorkerPool(jobs, DECOMPILE_MEMORY_LIMIT)
+        error = pool.start()
+        if error is None:
+            WARM_WORKERS = pool
+        else:
+            print(f"[WARNING] No warm decompyle3 workers, starting one process per module: {error}")
+
+    slots = threading.BoundedSemaphore(jobs)
+    lock = threading.Lock()
+    last_eviction = {"time": time.monotonic()}
+
+    def process(exe_path, output_subfolder, progress):
+        work_dir = tempfile.mkdtemp(prefix="pyautodump_", dir=WORK_DIR)
+        try:
+            return process_archive(exe_path, output_subfolder, jobs, cache, slots, work_dir, False, known, progress)
+        finally:
+            if DELETE_TEMP_FOLDER:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            # Den Cache nicht nach jedem Auftrag durchsuchen, das kostet bei vielen Einträgen Zeit
+            with lock:
+                evict = cache is not None and time.monotonic() - last_eviction["time"] > CACHE_EVICT_INTERVAL
+                if evict:
+                    last_eviction["time"] = time.monotonic()
+            if evict:
+                cache.evict()
+
+    def status():
+        return {
+            "jobs": jobs,
+            "workers": dict(WARM_WORKERS.stats, size=WARM_WORKERS.size, version=WARM_WORKERS.version)
+                       if WARM_WORKERS is not None else None,
+            "cache": {"hits": cache.hits, "misses": cache.misses} if cache is not None else None,
+            "known_modules": len(known) if known is not None else None,
+        }
+
+    print(f"[+] Service mode: {jobs} workers, {archive_jobs} archives at once, output in {os.path.abspath(OUTPUT_DIR)}")
+    try:
+        service.serve(address, service.DecompileService(process, OUTPUT_DIR, archive_jobs, status, SERVICE_INPUT_DIR),
+                      SERVICE_ALLOW_REMOTE)
+    finally:
+        if WARM_WORKERS is not None:
+            WARM_WORKERS.close()
+        if cache is not None:
+            cache.evict()
+
+def list_archives(patterns, pattern=None):
+    """Prints the CArchive and PYZ contents of every input without extracting it. Returns False if nothing was listed."""
+    exe_files = collect_inputs(patterns)
+    listed = 0
+    for exe_file in exe_files:
+        started = time.perf_counter()
+        rows = pyinstxtractor.listArchive(exe_file, pattern)
+        if rows is None:
+            print(f"[ERROR] Not a PyInstaller archive: {exe_file}")
+            continue
+        pyinstxtractor.printListing(rows)
+        print(f"[INFO] {len(rows)} entries in {(time.perf_counter() - started) * 1000:.1f}ms\n")
+        listed += 1
+    return listed > 0
+
+def parse_args():
+    """Parses the command line options."""
+    parser = argparse.ArgumentParser(description="Extracts and decompiles PyInstaller executables.")
+    parser.add_argument("inputs", nargs="*",
+                        help="executables, directories or glob patterns to process without user interaction "
+                             "(opens a file dialog if omitted)")
+    parser.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"),
+                        help="release-diff mode: process NEW, a later build of OLD, by extracting and decompiling only "
+                             "the modules that changed into a copy of OLD's output, and write a source diff next to it")
+    parser.add_argument("--serve", nargs="?", const=SERVICE_ADDRESS, metavar="ADDRESS",
+                        help="run as a service that accepts executables over a local HTTP API (see service.py), "
+                             f"on HOST:PORT, PORT or unix:PATH (default: {SERVICE_ADDRESS})")
+    parser.add_argument("--serve-inputs", default=None, metavar="DIR",
+                        help="let the service read executables below DIR itself (POST /jobs?path=), "
+                             "otherwise it only accepts uploads")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="let the service listen on other than loopback addresses; the API has no "
+                             "authentication, anyone who can reach it can submit files and download results")
+    parser.add_argument("--list", action="store_true",
+                        help="only list the CArchive entries and PYZ members of the inputs, without extracting them")
+    parser.add_argument("--grep", metavar="REGEX",
+                        help="like --list, but only show entries whose name matches REGEX")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_JOBS,
+                        help=f"number of parallel extraction threads and decompiler processes (default: {DEFAULT_JOBS})")
+    parser.add_argument("--archives", type=int, default=None,
+                        help="number of archives processed at once in batch mode (default: same as --jobs)")
+    parser.add_argument("--summary", default=None,
+                        help=f"where batch mode writes its JSON summary (default: {os.path.join('output', BATCH_SUMMARY_FILE)})")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="print the decompiler error of every module that failed")
+    parser.add_argument("--decompiler", default=None,
+                        help="use this decompiler instead of the automatic choice; it is called like pycdc "
+                             "(`<decompiler> module.pyc`) and must print the source to stdout")
+    parser.add_argument("--fallback", default=",".join(FALLBACK_CHAIN),
+                        help="comma separated tiers tried when the decompiler fails or times out: decompyle3, pycdc, "
+                             "disasm (bytecode listing) or 'none' (default: %(default)s)")
+    parser.add_argument("--timeout", type=int, default=DECOMPILE_TIMEOUT,
+                        help="seconds a decompiler may spend on one module before it is killed, 0 = no limit (default: %(default)s)")
+    parser.add_argument("--memory-limit", type=int, default=DECOMPILE_MEMORY_LIMIT,
+                        help="MB of memory a decompiler process may use, 0 = no limit, Linux only (default: %(default)s)")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+                        help="write the sources into a folder, a zip file or a tar stream (.tar.zst with the zstandard "
+                             "package, .tar.gz without); only folders can be resumed (default: %(default)s)")
+    parser.add_argument("--nested-depth", type=int, default=NESTED_DEPTH,
+                        help="levels of nested archives (PKG entries, bundled executables, zip files) that are "
+                             "extracted and decompiled too, 0 = none (default: %(default)s)")
+    parser.add_argument("--max-memory", type=int, default=EXTRACT_MAX_MEMORY, metavar="MB",
+                        help="MB of decompression buffers held at the same time while extracting an archive, larger "
+                             "entries are streamed (default: %(default)s)")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile every run (cProfile, stack samples for flame graphs, tracemalloc and decompiler "
+                             "process usage per stage) into <output>.profile; archives are processed one at a time")
+    parser.add_argument("--symbol-index", nargs="?", const=SYMBOL_INDEX_FILE, metavar="DB",
+                        help="add the symbols (imports, functions, classes, strings) and sources of every module to an "
+                             "SQLite full-text index, searched with symbol_index.py (default: %(const)s)")
+    parser.add_argument("--all-modules", action="store_true",
+                        help="also decompile modules found in the known module index (standard library, packages)")
+    parser.add_argument("--known-index", default=KNOWN_MODULES_FILE,
+                        help=f"known module index, built with known_modules.py (default: {KNOWN_MODULES_FILE})")
+    parser.add_argument("--work-dir", default=None, metavar="DIR",
+                        help="folder the archives are extracted into before decompiling; 'tmpfs' uses /dev/shm so the "
+                             "extracted files never reach the disk (default: the system temp folder)")
+    parser.add_argument("--fresh", action="store_true",
+                        help="ignore the manifest of earlier runs and decompile everything again")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not use the persistent decompilation cache")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help=f"location of the decompilation cache (default: {CACHE_DIR})")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_SIZE // (1024 * 1024),
+                        help="maximum size of the decompilation cache in MB (default: %(default)s)")
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if (args.list or args.grep) and not args.inputs:
+        parser.error("--list and --grep need input files")
+    if args.serve and (args.inputs or args.list or args.grep):
+        parser.error("--serve takes no input files")
+    if args.serve:
+        import service
+        try:
+            service.check_address(args.serve, args.allow_remote)
+        except ValueError as e:
+            parser.error(f"--serve: {e}")
+    if args.serve_inputs and not os.path.isdir(args.serve_inputs):
+        parser.error(f"--serve-inputs: no such folder: {args.serve_inputs}")
+    if args.diff and (args.inputs or args.list or args.grep or args.serve):
+        parser.error("--diff takes no other input files")
+    for path in args.diff or ():
+        if not os.path.isfile(path):
+            parser.error(f"--diff: no such file: {path}")
+    if args.diff and os.path.abspath(args.diff[0]) == os.path.abspath(args.diff[1]):
+        parser.error("--diff needs two different files")
+    if args.diff and args.output_format != "dir":
+        parser.error("--diff needs --output-format dir, it continues from the folder of the previous release")
+    if args.nested_depth < 0:
+        parser.error("--nested-depth must not be negative")
+    if args.max_memory < 1:
+        parser.error("--max-memory must be at least 1")
+    if args.archives is not None and args.archives < 1:
+        parser.error("--archives must be at least 1")
+    args.fallback = [] if args.fallback == "none" else [name.strip() for name in args.fallback.split(",") if name.strip()]
+    for name in args.fallback:
+        if name not in ("decompyle3", "pycdc", "disasm"):
+            parser.error(f"--fallback: unknown tier '{name}'")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    PRINT_FAILURES = args.verbose
+    FALLBACK_CHAIN = args.fallback
+    DECOMPILE_TIMEOUT = args.timeout
+    DECOMPILE_MEMORY_LIMIT = args.memory_limit
+    NESTED_DEPTH = args.nested_depth
+    EXTRACT_MAX_MEMORY = args.max_memory
+    OUTPUT_FORMAT = args.output_format
+    PROFILE = args.profile
+    SYMBOL_INDEX = os.path.abspath(args.symbol_index) if args.symbol_index else None
+    SERVICE_INPUT_DIR = os.path.abspath(args.serve_inputs) if args.serve_inputs else None
+    SERVICE_ALLOW_REMOTE = args.allow_remote
+    if args.work_dir == "tmpfs":
+        # /dev/shm ist unter Linux ein tmpfs, sonst bleibt es beim normalen Temp-Ordner
+        WORK_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    elif args.work_dir:
+        WORK_DIR = os.path.abspath(args.work_dir)
+        os.makedirs(WORK_DIR, exist_ok=True)
+    if PROFILE:
+        # Der Profiler gilt für den ganzen Prozess, gleichzeitige Archive würden sich vermischen
+        args.archives = 1
+    # Relative Pfade vor dem Wechsel des Arbeitsverzeichnisses auflösen, Namen auf dem PATH bleiben
+    CUSTOM_DECOMPILER = os.path.abspath(args.decompiler) if args.decompiler and os.path.exists(args.decompiler) else args.decompiler
+    # Eingabepfade relativ zum Aufrufort auflösen, bevor das Arbeitsverzeichnis wechselt
+    inputs = [os.path.abspath(path) if os.path.exists(path) else os.path.join(os.getcwd(), path) for path in args.inputs]
+    releases = [os.path.abspath(path) for path in args.diff or ()]
+    summary_path = os.path.abspath(args.summary) if args.summary else os.path.join(OUTPUT_DIR, BATCH_SUMMARY_FILE)
+    cache = None if args.no_cache else DecompileCache(os.path.abspath(args.cache_dir), args.cache_size * 1024 * 1024)
+    known = None if args.all_modules else KnownModuleIndex(os.path.abspath(args.known_index)).load()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.list or args.grep:
+        sys.exit(0 if list_archives(inputs, args.grep) else 1)
+
+    if args.serve:
+        # Dienstmodus: kein pip, kein Dateidialog, Index, Cache und Dekompilierer bleiben geladen
+        run_service(args.serve, args.jobs, cache, args.archives or args.jobs, known)
+        sys.exit(0)
+
+    if releases:
+        # Nur was sich seit der vorigen Version geändert hat, wird entpackt und dekompiliert
+        summary = run_diff(*releases, args.jobs, cache, known)
+        if cache is not None:
+            cache.evict()
+        sys.exit(0 if summary["status"] == "ok" else 1)
+
+    if inputs:
+        # Headless: kein pip, kein Dateidialog
+        ok = run_batch(inputs, args.jobs, cache, args.archives or args.jobs, summary_path, not args.fresh, known)
+        if cache is not None:
+            cache.evict()
+        sys.exit(0 if ok else 1)
+
+    check_requirements()
+
+    exe_file = select_exe()
+    if not exe_file:
+        print("[INFO] No file selected. Exiting.")
+        sys.exit(0)
+
+    output_subfolder = os.path.join(OUTPUT_DIR, os.path.basename(exe_file).replace(".exe", "_source"))
+    work_dir = tempfile.mkdtemp(prefix="pyautodump_", dir=WORK_DIR) if WORK_DIR else None
+    try:
+        process_archive(exe_file, output_subfolder, args.jobs, cache, work_dir=work_dir, resume=not args.fresh, known=known)
+    finally:
+        if work_dir and DELETE_TEMP_FOLDER:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if cache is not None:
+        cache.evict()
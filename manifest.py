@@ -0,0 +1,99 @@
+"""
+Per-output-folder manifest of decompiled modules.
+
+The manifest records for every module its input hash, the decompiler that
+produced it, the status and the time it took. A later run over the same
+output folder only redoes modules that are new, changed, failed or were
+produced by a decompiler that is no longer in its fallback chain.
+
+Results are appended to a journal as soon as a module finishes, so a run that
+dies halfway can be resumed. save() folds the journal into manifest.json.
+"""
+
+import os
+import json
+import threading
+
+MANIFEST_FILE = "manifest.json"
+JOURNAL_FILE = "manifest.journal"
+MANIFEST_VERSION = 1
+
+
+class Manifest:
+    """Module records of one output folder, keyed by the .pyc path relative to the extracted tree."""
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.modules = {}
+        self.lock = threading.Lock()
+        self._journal = None
+
+    @property
+    def path(self):
+        return os.path.join(self.out_dir, MANIFEST_FILE)
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.out_dir, JOURNAL_FILE)
+
+    def load(self):
+        """Reads manifest.json and replays the journal of an interrupted run, if any."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.modules = data.get("modules", {})
+        except (OSError, ValueError):
+            self.modules = {}
+
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # Last line of a run that was killed while writing
+                    self.modules[record.pop("module")] = record
+        except OSError:
+            pass
+        return self
+
+    def is_current(self, module, module_hash, decompiler_ids):
+        """
+        True if module was decompiled successfully from the same input by one of decompiler_ids,
+        the identities of the tiers of the current fallback chain.
+        """
+        record = self.modules.get(module)
+        return (record is not None and record.get("status") == "ok"
+                and record.get("input_hash") == module_hash
+                and record.get("decompiler") in decompiler_ids
+                and os.path.exists(os.path.join(self.out_dir, record.get("output", ""))))
+
+    def record(self, module, **fields):
+        """Stores the result of a module and appends it to the journal."""
+        with self.lock:
+            self.modules[module] = fields
+            if self._journal is None:
+                os.makedirs(self.out_dir, exist_ok=True)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._journal.write(json.dumps(dict(fields, module=module)) + "\n")
+            self._journal.flush()
+
+    def forget(self, module):
+        """Drops a module from the manifest and returns its record."""
+        with self.lock:
+            return self.modules.pop(module, None)
+
+    def save(self):
+        """Writes manifest.json and removes the journal."""
+        with self.lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            os.makedirs(self.out_dir, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "modules": self.modules}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
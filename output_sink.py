@@ -0,0 +1,179 @@
+"""
+Destinations for the recovered sources of one executable.
+
+A sink receives every file of the output by its path relative to the output
+root as soon as it is ready, so sources go straight to their final place
+instead of through a temporary tree:
+
+    dir  a plain directory, the only format that keeps a manifest and can be resumed
+    zip  a zip file
+    tar  a tar stream, zstandard compressed (.tar.zst) if the `zstandard` package
+         is installed, gzip compressed (.tar.gz) otherwise
+
+Archives are written to a temporary name and renamed when the sink is closed.
+Sinks may be written from several threads.
+"""
+
+import os
+import io
+import time
+import shutil
+import struct
+import tarfile
+import zipfile
+import zlib
+import threading
+
+from report import REPORT_FILE
+
+OUTPUT_FORMATS = ("dir", "zip", "tar")
+
+
+class DirectorySink:
+    """Writes the output into a directory. With fresh, an existing directory is emptied first."""
+
+    resumable = True
+
+    def __init__(self, path, fresh=False):
+        self.path = path
+        self.report_path = os.path.join(path, REPORT_FILE)
+        if fresh and os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+
+    def _target(self, name):
+        target = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        return target
+
+    def write(self, name, data):
+        with open(self._target(name), "wb") as f:
+            f.write(data)
+
+    def move(self, name, src_path):
+        """Takes over a file that already exists on disk (a source bundled with the executable)."""
+        shutil.move(src_path, self._target(name))
+
+    def copy(self, src_name, name):
+        """Writes the file src_name, which was written before, once more as name."""
+        shutil.copyfile(os.path.join(self.path, src_name), self._target(name))
+
+    def close(self):
+        pass
+
+
+class ArchiveSink:
+    """Common part of the archive sinks: a temporary file that gets its final name on close()."""
+
+    resumable = False
+    extension = None
+
+    def __init__(self, path):
+        self.path = path + self.extension
+        self.report_path = f"{path}.{REPORT_FILE}"
+        self.tmp_path = self.path + ".tmp"
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def _close(self):
+        raise NotImplementedError
+
+    def close(self):
+        with self.lock:
+            self._close()
+        os.replace(self.tmp_path, self.path)
+
+
+class ZipSink(ArchiveSink):
+    """Writes the output into a deflate compressed zip file."""
+
+    extension = ".zip"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.zip = zipfile.ZipFile(self.tmp_path, "w", zipfile.ZIP_DEFLATED)
+
+    def write(self, name, data):
+        with self.lock:
+            self.zip.writestr(_archive_name(name), data)
+
+    def move(self, name, src_path):
+        with self.lock:
+            self.zip.write(src_path, _archive_name(name))
+
+    def copy(self, src_name, name):
+        with self.lock:
+            data = self._read(_archive_name(src_name))
+            self.zip.writestr(_archive_name(name), data)
+
+    def _read(self, name):
+        # Reads a member back while the zip is still being written: its local header and data are complete
+        info = self.zip.getinfo(name)
+        self.zip.fp.flush()
+        with open(self.tmp_path, "rb") as f:
+            f.seek(info.header_offset)
+            header = f.read(30)
+            (name_length, extra_length) = struct.unpack("<HH", header[26:30])
+            f.seek(name_length + extra_length, os.SEEK_CUR)
+            data = f.read(info.compress_size)
+        return zlib.decompress(data, -15) if info.compress_type == zipfile.ZIP_DEFLATED else data
+
+    def _close(self):
+        self.zip.close()
+
+
+class TarSink(ArchiveSink):
+    """Writes the output as a tar stream, compressed with zstandard if available, gzip otherwise."""
+
+    def __init__(self, path):
+        try:
+            import zstandard
+        except ImportError:
+            zstandard = None
+
+        self.extension = ".tar.zst" if zstandard is not None else ".tar.gz"
+        super().__init__(path)
+        self.compressor = None
+        if zstandard is not None:
+            self.compressor = zstandard.ZstdCompressor().stream_writer(open(self.tmp_path, "wb"))
+            self.tar = tarfile.open(fileobj=self.compressor, mode="w|")
+        else:
+            self.tar = tarfile.open(self.tmp_path, mode="w|gz")
+
+    def write(self, name, data):
+        info = tarfile.TarInfo(_archive_name(name))
+        info.size, info.mtime, info.mode = len(data), time.time(), 0o644
+        with self.lock:
+            self.tar.addfile(info, io.BytesIO(data))
+
+    def move(self, name, src_path):
+        with self.lock:
+            self.tar.add(src_path, _archive_name(name), recursive=False)
+
+    def copy(self, src_name, name):
+        # Duplicates are stored as hard links to the first copy, they cost no space
+        info = tarfile.TarInfo(_archive_name(name))
+        info.type, info.linkname, info.mtime, info.mode = tarfile.LNKTYPE, _archive_name(src_name), time.time(), 0o644
+        with self.lock:
+            self.tar.addfile(info)
+
+    def _close(self):
+        self.tar.close()
+        if self.compressor is not None:
+            self.compressor.close()
+
+
+def _archive_name(name):
+    return name.replace(os.path.sep, "/")
+
+
+def open_sink(output_format, path, fresh=False):
+    """
+    Returns the sink for an output format (see OUTPUT_FORMATS). path is the output directory,
+    archives get the format's extension appended to it.
+    """
+    if output_format == "zip":
+        return ZipSink(path)
+    if output_format == "tar":
+        return TarSink(path)
+    return DirectorySink(path, fresh)
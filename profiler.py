@@ -0,0 +1,207 @@
+"""
+Profiling of a run (--profile).
+
+A RunProfiler is attached to the RunReport of a run. While it runs it records:
+
+    run.prof        cProfile statistics of all threads (pstats format)
+    run.collapsed   stacks of all threads sampled every SAMPLE_INTERVAL seconds, rooted at the
+                    stage the thread is in (worker threads are named after the stage they work
+                    for), in the collapsed format of flamegraph.pl,
+                    speedscope or inferno. The samples are wall time: waiting for a decompiler
+                    process or a lock shows up as well.
+    memory.txt      the largest Python allocation sites at the end of every outermost stage of a
+                    thread (tracemalloc)
+
+and adds to every stage record of the report the Python memory allocated during the stage, the
+peak traced so far and the CPU time and peak RSS of the child processes (decompilers) that
+finished during it. Stages overlap, so these are attributed to every stage open at the time.
+
+Profiles of several runs can be merged:
+
+    python profiler.py merge total.prof output/*.profile/run.prof
+    python profiler.py merge total.collapsed output/*.profile/run.collapsed
+"""
+
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import argparse
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Windows: no usage of child processes
+    resource = None
+
+SAMPLE_INTERVAL = 0.01  # seconds
+TOP_ALLOCATIONS = 15
+PROFILE_FILE = "run.prof"
+COLLAPSED_FILE = "run.collapsed"
+MEMORY_FILE = "memory.txt"
+# From Python 3.12 on a single profiler sees all threads, before every thread needs its own
+GLOBAL_PROFILER = sys.version_info >= (3, 12)
+
+
+def _children_usage():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    peak = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return usage.ru_utime, usage.ru_stime, peak
+
+
+class RunProfiler:
+    """cProfile, a stack sampler, tracemalloc and child process usage for one run, see the module docstring."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = False
+        self.profiles = []
+        self.stages = {}        # thread id -> (stage, traced memory, children usage) of the stages it is in
+        self.samples = {}
+        self.labels = {}        # code object -> its name in the collapsed stacks
+        self.memory = []
+        self.sampler = None
+
+    def start(self):
+        tracemalloc.start()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            self.profiles.append(profile)
+        except ValueError as e:
+            print(f"[WARNING] cProfile is not available, another profiler is active: {e}")
+        else:
+            if not GLOBAL_PROFILER:
+                threading.setprofile(self._thread_started)
+        self.running = True
+        self.sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self.sampler.start()
+
+    def _thread_started(self, frame, event, arg):
+        # Runs as the profile function of every new thread until the thread's own profiler takes over
+        profile = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.sampler.join()
+        threading.setprofile(None)
+        for profile in self.profiles:
+            profile.disable()
+        tracemalloc.stop()
+
+    def enter(self, name):
+        """Called by RunReport when the current thread enters a stage."""
+        if not self.running:
+            return
+        ident = threading.get_ident()
+        traced = tracemalloc.get_traced_memory()[0]
+        with self.lock:
+            self.stages.setdefault(ident, []).append((name, traced, _children_usage()))
+
+    def exit(self, name):
+        """Called by RunReport when the current thread leaves a stage. Returns the fields for its record."""
+        if not self.running:
+            return {}
+        ident = threading.get_ident()
+        traced, peak = tracemalloc.get_traced_memory()
+        children = _children_usage()
+        with self.lock:
+            (_, traced_before, children_before) = self.stages[ident].pop()
+            outermost = not self.stages[ident]
+
+        fields = {"py_allocated": traced - traced_before, "py_traced_peak": peak}
+        if children is not None:
+            fields["children_user"] = round(children[0] - children_before[0], 4)
+            fields["children_system"] = round(children[1] - children_before[1], 4)
+            fields["children_peak_rss"] = children[2]
+
+        if outermost:
+            # Snapshots take long with many live objects, inner stages do without
+            top = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+            with self.lock:
+                self.memory.append((name, traced, top))
+        return fields
+
+    def _sample(self):
+        own = threading.get_ident()
+        while self.running:
+            frames = sys._current_frames()
+            # Pool threads are named "<stage>_<n>"
+            names = {thread.ident: re.sub(r"_\d+$", "", thread.name) for thread in threading.enumerate()}
+            with self.lock:
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        label = self.labels.get(frame.f_code)
+                        if label is None:
+                            code = frame.f_code
+                            label = self.labels[code] = (f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                                                         f"{code.co_firstlineno})")
+                        stack.append(label)
+                        frame = frame.f_back
+                    stages = self.stages.get(ident)
+                    stack.append(stages[-1][0] if stages else names.get(ident, "other"))
+                    key = ";".join(reversed(stack))
+                    self.samples[key] = self.samples.get(key, 0) + 1
+            del frames
+            time.sleep(SAMPLE_INTERVAL)
+
+    def write(self, folder):
+        """Writes the profile files into folder (see the module docstring)."""
+        os.makedirs(folder, exist_ok=True)
+        profiles = [profile for profile in self.profiles if profile.getstats()]
+        if profiles:
+            pstats.Stats(*profiles).dump_stats(os.path.join(folder, PROFILE_FILE))
+        with open(os.path.join(folder, COLLAPSED_FILE), "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+        with open(os.path.join(folder, MEMORY_FILE), "w", encoding="utf-8") as f:
+            for name, traced, top in self.memory:
+                f.write(f"== {name}: {traced / 1024 / 1024:.1f} MB traced at its end\n")
+                for statistic in top:
+                    f.write(f"  {statistic}\n")
+                f.write("\n")
+
+
+def merge(output, inputs):
+    """Merges pstats files or collapsed stack files (by the extension of output) into output."""
+    if output.endswith(".collapsed"):
+        counts = {}
+        for path in inputs:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    if stack:
+                        counts[stack] = counts.get(stack, 0) + int(count)
+        with open(output, "w", encoding="utf-8") as f:
+            for stack, count in sorted(counts.items()):
+                f.write(f"{stack} {count}\n")
+    else:
+        pstats.Stats(*inputs).dump_stats(output)
+    print(f"[+] Merged {len(inputs)} profiles into {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merges the profiles written by main.py --profile.")
+    parser.add_argument("command", choices=("merge",))
+    parser.add_argument("output", help="merged file, .prof (pstats) or .collapsed (stack samples)")
+    parser.add_argument("inputs", nargs="+")
+    args = parser.parse_args()
+    merge(args.output, args.inputs)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,10 +12,9 @@ https://forum.tuts4you.com/topic/34455-pyinstaller-extractor/
 This script extracts a pyinstaller generated executable file.
 Pyinstaller installation is not needed. The script has it all.
 
-For best results, it is recommended to run this script in the
-same version of python as was used to create the executable.
-This is just to prevent unmarshalling errors(if any) while
-extracting the PYZ archive.
+The script can run in any python version, the PYZ archive of an
+executable built with another version is read with the builtin
+pure python marshal reader.
 
 Usage : Just copy this script to the directory where your exe resides
         and run the script with the exe file name as a parameter
@@ -85,14 +84,30 @@ Version 2.0 (March 26, 2020)
 
 from __future__ import print_function
 import os
+import io
+import re
+import mmap
 import struct
+import hashlib
+import zipfile
 import marshal
 import zlib
 import sys
+import threading
+from collections import deque
+from contextlib import contextmanager
 from uuid import uuid4 as uniquename
 
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2 has no concurrent.futures, extraction then always runs sequentially
+    ThreadPoolExecutor = None
+
 
 class CTOCEntry:
+    __slots__ = ('position', 'cmprsdDataSize', 'uncmprsdDataSize', 'cmprsFlag', 'typeCmprsData', 'name')
+
     def __init__(self, position, cmprsdDataSize, uncmprsdDataSize, cmprsFlag, typeCmprsData, name):
         self.position = position
         self.cmprsdDataSize = cmprsdDataSize
@@ -102,15 +117,327 @@ class CTOCEntry:
         self.name = name
 
 
+class PYZTOCEntry:
+    __slots__ = ('name', 'ispkg', 'position', 'cmprsdDataSize', 'path')
+
+    def __init__(self, name, ispkg, position, cmprsdDataSize, path):
+        self.name = name
+        self.ispkg = ispkg
+        self.position = position
+        self.cmprsdDataSize = cmprsdDataSize
+        self.path = path    # Output file, relative to the extraction directory
+
+
+class ExtractionResult:
+    """What extract() found in an archive and where it was written to."""
+
+    def __init__(self, arch):
+        self.filePath = arch.filePath
+        self.pyinstVer = arch.pyinstVer             # 20 (pyinstaller 2.0) or 21 (pyinstaller 2.1+)
+        self.pyVersion = (arch.pymaj, arch.pymin)
+        self.tocList = arch.tocList                 # CTOCEntry objects of the CArchive
+        self.pyzMembers = arch.pyzMembers           # PYZ name -> PYZTOCEntry objects
+        self.entryPoints = arch.entryPoints         # pyc files of the entry point scripts
+        self.extractionDir = arch.extractionDir
+        self.outputFiles = sorted(arch.outputFiles) # Written files, relative to extractionDir
+        self.failedEntries = sorted(arch.failedEntries) # Entries and members that could not be extracted
+        self.nestedArchives = sorted(arch.nestedArchives) # (container, 'carchive' / 'zip' / 'duplicate') pairs
+        self.nestedVersions = dict(arch.nestedVersions)   # Nested CArchive -> (major, minor) of its Python
+
+    @property
+    def pythonVersion(self):
+        return '{0}.{1}'.format(*self.pyVersion)
+
+
+class NullTracer:
+    """Default tracer of PyInstArchive, it does not record anything."""
+
+    @contextmanager
+    def stage(self, name, **fields):
+        # A tracer yields a dict the stage can put its byte counts etc. into
+        yield dict(fields)
+
+
+class MemoryBudget:
+    """Limits the number of bytes held in extraction buffers at the same time."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self.cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, size):
+        # Requests larger than the limit are clamped and wait until they run alone
+        size = min(size, self.limit)
+        with self.cond:
+            while self.used > 0 and self.used + size > self.limit:
+                self.cond.wait()
+            self.used += size
+            self.peak = max(self.peak, self.used)
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.used -= size
+                self.cond.notify_all()
+
+
+class DataStream:
+    """
+    Payload of an archive member delivered as a sequence of chunks. The first chunk
+    is produced eagerly so that corrupt data is noticed before an output file is created.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.head = next(chunks, b'')
+
+    def __iter__(self):
+        yield self.head
+        for chunk in self.chunks:
+            yield chunk
+
+
+def _toBytes(data):
+    # Slices of the mapped file are memoryviews. Use this instead of bytes(), which makes
+    # '<memory at 0x...>' of one in Python 2
+    return data.tobytes() if isinstance(data, memoryview) else data
+
+
+def _inflateEnded(decompressor):
+    # Decompressors of Python 2 have no eof. Once the stream ended, everything that is still
+    # fed to one only goes to unused_data, which is tried on a copy
+    if hasattr(decompressor, 'eof'):
+        return decompressor.eof
+    if decompressor.unused_data:
+        return True
+    probe = decompressor.copy()
+    try:
+        probe.decompress(b'\x00')
+    except zlib.error:
+        return False
+    return probe.unused_data == b'\x00'
+
+
+class CodeObject:
+    """
+    A code object of any Python version, as read by MarshalReader. It has the co_* attributes of
+    the running interpreter's code objects; those the target version does not know are None.
+    """
+
+    FIELDS = ('co_argcount', 'co_posonlyargcount', 'co_kwonlyargcount', 'co_nlocals', 'co_stacksize',
+              'co_flags', 'co_code', 'co_consts', 'co_names', 'co_varnames', 'co_freevars', 'co_cellvars',
+              'co_filename', 'co_name', 'co_qualname', 'co_firstlineno', 'co_linetable', 'co_exceptiontable')
+
+    def __init__(self, **fields):
+        for field in self.FIELDS:
+            setattr(self, field, fields.get(field))
+
+    def __repr__(self):
+        return '<code object {0} from {1}>'.format(self.co_name, self.co_filename)
+
+
+class MarshalReader:
+    """
+    Pure python reader for the marshal format of Python 2.7 to 3.13+, so the PYZ of an executable
+    can be read by any interpreter. Code objects become CodeObject instances, everything else the
+    closest builtin type (byte strings of Python 2 stay bytes).
+    """
+
+    FLAG_REF = 0x80
+    CO_FAST_LOCAL, CO_FAST_CELL, CO_FAST_FREE = 0x20, 0x40, 0x80  # Python 3.11+ localspluskinds
+    NULL = object()
+
+    def __init__(self, data, pyVersion):
+        self.data = _toBytes(data)
+        self.pos = 0
+        self.pyVersion = tuple(pyVersion)
+        self.refs = []      # Objects flagged with FLAG_REF (Python 3.4+)
+        self.interned = []  # Interned strings (Python 2)
+        self.readers = {
+            '0': lambda: self.NULL, 'N': lambda: None, 'F': lambda: False, 'T': lambda: True,
+            'S': lambda: StopIteration, '.': lambda: Ellipsis,
+            'i': lambda: self._int32(), 'I': lambda: self._unpack('<q', 8), 'l': self._readLong,
+            'f': lambda: float(self._read(self._uint8())), 'g': lambda: self._unpack('<d', 8),
+            'x': lambda: complex(float(self._read(self._uint8())), float(self._read(self._uint8()))),
+            'y': lambda: complex(self._unpack('<d', 8), self._unpack('<d', 8)),
+            's': lambda: self._read(self._int32()), 't': self._readInterned,
+            'R': lambda: self.interned[self._int32()], 'u': lambda: self._decode(self._read(self._int32())),
+            'a': lambda: self._ascii(self._int32()), 'A': lambda: self._ascii(self._int32()),
+            'z': lambda: self._ascii(self._uint8()), 'Z': lambda: self._ascii(self._uint8()),
+            '(': lambda: self._readTuple(self._int32()), ')': lambda: self._readTuple(self._uint8()),
+            '<': lambda: set(self._readItems(self._int32())),
+            '>': lambda: frozenset(self._readItems(self._int32())),
+            ':': lambda: slice(self.load(), self.load(), self.load()),
+            'c': self._readCode, 'r': lambda: self.refs[self._int32()],
+        }
+
+    def _read(self, size):
+        if size < 0 or self.pos + size > len(self.data):
+            raise EOFError('marshal data too short')
+        data = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return data
+
+    def _unpack(self, fmt, size):
+        return struct.unpack(fmt, self._read(size))[0]
+
+    def _uint8(self):
+        return self._unpack('B', 1)
+
+    def _int32(self):
+        return self._unpack('<i', 4)
+
+    def _decode(self, data):
+        return data.decode('utf-8', 'surrogatepass' if sys.version_info[0] >= 3 else 'strict')
+
+    def _ascii(self, size):
+        return self._read(size).decode('latin-1')
+
+    def _readLong(self):
+        size = self._int32()
+        value = 0
+        for i in range(abs(size)):
+            value |= self._unpack('<H', 2) << (15 * i)  # 15 bit digits
+        return -value if size < 0 else value
+
+    def _readInterned(self):
+        data = self._read(self._int32())
+        if self.pyVersion[0] < 3:
+            self.interned.append(data)
+            return data
+        return self._decode(data)
+
+    def _readItems(self, count):
+        return [self.load() for i in range(count)]
+
+    def _readTuple(self, count):
+        return tuple(self._readItems(count))
+
+    def _readCode(self):
+        fields = {}
+        version = self.pyVersion
+        fields['co_argcount'] = self._int32()
+        if version >= (3, 8):
+            fields['co_posonlyargcount'] = self._int32()
+        if version >= (3, 0):
+            fields['co_kwonlyargcount'] = self._int32()
+        if version < (3, 11):
+            fields['co_nlocals'] = self._int32()
+        fields['co_stacksize'] = self._int32()
+        fields['co_flags'] = self._int32()
+        fields['co_code'] = self.load()
+        fields['co_consts'] = self.load()
+        fields['co_names'] = self.load()
+
+        if version >= (3, 11):
+            # Locals, cells and free variables share one tuple, told apart by a kind byte per name
+            names, kinds = self.load(), bytearray(self.load())
+            fields['co_varnames'] = tuple(n for n, k in zip(names, kinds) if k & self.CO_FAST_LOCAL)
+            fields['co_cellvars'] = tuple(n for n, k in zip(names, kinds) if k & self.CO_FAST_CELL)
+            fields['co_freevars'] = tuple(n for n, k in zip(names, kinds) if k & self.CO_FAST_FREE)
+            fields['co_nlocals'] = len(fields['co_varnames'])
+        else:
+            fields['co_varnames'] = self.load()
+            fields['co_freevars'] = self.load()
+            fields['co_cellvars'] = self.load()
+
+        fields['co_filename'] = self.load()
+        fields['co_name'] = self.load()
+        if version >= (3, 11):
+            fields['co_qualname'] = self.load()
+        fields['co_firstlineno'] = self._int32()
+        fields['co_linetable'] = self.load()  # lnotab before Python 3.10
+        if version >= (3, 11):
+            fields['co_exceptiontable'] = self.load()
+        return CodeObject(**fields)
+
+    def load(self):
+        """Reads the next object."""
+        code = self._uint8()
+        typeCode = chr(code & 0x7f)
+        index = None
+        if code & self.FLAG_REF:
+            # References are numbered in the order their objects start
+            index = len(self.refs)
+            self.refs.append(None)
+
+        if typeCode == '[':
+            # Containers are registered before their items, which may refer back to them
+            obj = self._register(index, [])
+            obj.extend(self._readItems(self._int32()))
+        elif typeCode == '{':
+            obj = self._readDict(self._register(index, {}))
+        else:
+            reader = self.readers.get(typeCode)
+            if reader is None:
+                raise ValueError('bad marshal data (unknown type code {0!r})'.format(typeCode))
+            obj = self._register(index, reader())
+        return obj
+
+    def _register(self, index, obj):
+        if index is not None:
+            self.refs[index] = obj
+        return obj
+
+    def _readDict(self, obj):
+        while True:
+            key = self.load()
+            if key is self.NULL:
+                return obj
+            obj[key] = self.load()
+
+
+def loadMarshal(data, pyVersion=None):
+    """Unmarshals data written by Python pyVersion, a (major, minor) tuple (default: the running one)."""
+    return MarshalReader(data, pyVersion or sys.version_info[:2]).load()
+
+
 class PyInstArchive:
     PYINST20_COOKIE_SIZE = 24           # For pyinstaller 2.0
     PYINST21_COOKIE_SIZE = 24 + 64      # For pyinstaller 2.1+
     MAGIC = b'MEI\014\013\012\013\016'  # Magic number which identifies pyinstaller
-
-    def __init__(self, path):
+    STREAM_CHUNK_SIZE = 1024 * 1024     # Output chunk size when streaming large entries
+    STREAM_THRESHOLD = 8 * 1024 * 1024  # Entries needing more buffer memory than this are streamed
+    DEFAULT_MAX_MEMORY = 256 * 1024 * 1024
+    MAX_PENDING_PER_JOB = 4             # Queued extraction tasks per worker thread
+    COOKIE_WINDOW = 4096                # Bytes before a possible archive end searched for the cookie
+    MAX_NESTED_DEPTH = 3                # Levels of nested archives extracted by default
+    DUPLICATE_NOTE = 'DUPLICATE.txt'    # Written instead of the files of a container identical to an earlier one
+
+    def __init__(self, path, useMmap=True, maxMemory=DEFAULT_MAX_MEMORY, jobs=1, workerSlots=None, tracer=None,
+                 nestedDepth=MAX_NESTED_DEPTH, fileCallback=None, select=None):
         self.filePath = path
         self.pycMagic = b'\0' * 4
-        self.barePycList = [] # List of pyc's whose headers have to be fixed
+        self.useMmap = useMmap
+        self.memBudget = MemoryBudget(maxMemory) # Shared by all buffers of this extraction
+        self.jobs = jobs if ThreadPoolExecutor is not None else 1
+        self.workerSlots = workerSlots   # Optional semaphore shared with other work running in this process
+        self.tracer = tracer or NullTracer() # Receives the timing of every extraction stage
+        self.bytesWritten = 0
+        self.statsLock = threading.Lock()
+        self.readLock = threading.Lock() # Serializes seek + read on the shared file pointer
+        self.madeDirs = set()              # Directories (relative to extractionDir) known to exist
+        self.dirsLock = threading.Lock()
+        self.extractionDir = None
+        self.entryPoints = []
+        self.pyzMembers = {}
+        self.outputFiles = []
+        self.failedEntries = []
+        self.fileMap = None   # mmap of the whole file, None when using the file pointer
+        self.fileView = None  # memoryview over fileMap, sliced without copying
+        self.nestedDepth = nestedDepth # Levels of nested archives (PKG, embedded executables, zips) still extracted
+        self.nestedArchives = []
+        self.nestedVersions = {} # Nested CArchive -> (major, minor) of the Python it was built with
+        self.nestedSeen = {}  # Content hash -> first container, shared with the nested archives
+        self.nestedLock = threading.Lock()
+        self.fileCallback = fileCallback # Called with every output file once it is complete (pyc header included)
+        self.select = select  # Output names of the members to extract (see memberDigests), None = everything
+        # PYZ archives are extracted when one of their members is selected
+        self.selectContainers = set(name.split('_extracted' + os.path.sep)[0] for name in select or ()
+                                    if '_extracted' + os.path.sep in name)
 
 
     def open(self):
@@ -120,16 +447,122 @@ class PyInstArchive:
         except:
             print('[!] Error: Could not open {0}'.format(self.filePath))
             return False
+
+        if self.useMmap:
+            try:
+                self.fileMap = mmap.mmap(self.fPtr.fileno(), 0, access=mmap.ACCESS_READ)
+                self.fileView = memoryview(self.fileMap)
+            except (ValueError, OSError, TypeError):
+                # Empty or special files can't be mapped, fall back to seek + read.
+                # Python 2 has no memoryview of an mmap (TypeError), it always reads this way.
+                if self.fileMap is not None:
+                    self.fileMap.close()
+                self.fileMap = None
+                self.fileView = None
         return True
 
 
     def close(self):
+        try:
+            if self.fileMap is not None:
+                self.fileView.release()
+                self.fileMap.close()
+        except:
+            pass
+        self.fileMap = None
+        self.fileView = None
+
         try:
             self.fPtr.close()
         except:
             pass
 
 
+    def _readData(self, position, size):
+        # Zero-copy slice of the mapped file, or a fresh copy from the file pointer
+        if self.fileView is not None:
+            return self.fileView[position:position + size]
+
+        with self.readLock:
+            self.fPtr.seek(position, os.SEEK_SET)
+            return self.fPtr.read(size)
+
+
+    def _iterData(self, position, size, chunkSize):
+        # Same as _readData, but in pieces of at most chunkSize bytes
+        endPos = position + size
+        while position < endPos:
+            data = self._readData(position, min(chunkSize, endPos - position))
+            if len(data) == 0:
+                break
+            yield data
+            position += len(data)
+
+
+    def _decompressChunks(self, chunks, expectedSize=None):
+        # Inflates a zlib stream without ever producing more than STREAM_CHUNK_SIZE bytes at once
+        decompressor = zlib.decompressobj()
+        outSize = 0
+
+        def account(out):
+            if expectedSize is not None:
+                # Malware may tamper with the uncompressed size
+                # Comment out the assertion in such a case
+                assert outSize + len(out) <= expectedSize # Sanity Check
+            return len(out)
+
+        for data in chunks:
+            while data and not _inflateEnded(decompressor):
+                out = decompressor.decompress(data, self.STREAM_CHUNK_SIZE)
+                data = decompressor.unconsumed_tail
+                if out:
+                    outSize += account(out)
+                    yield out
+
+        # Drain output that is still buffered inside the decompressor
+        while not _inflateEnded(decompressor):
+            out = decompressor.decompress(b'', self.STREAM_CHUNK_SIZE)
+            if not out:
+                break
+            outSize += account(out)
+            yield out
+
+        if not _inflateEnded(decompressor):
+            raise zlib.error('Error -5 while decompressing data: incomplete or truncated stream')
+
+        if expectedSize is not None:
+            assert outSize == expectedSize # Sanity Check
+
+
+    def _entryCost(self, entry, streamed):
+        # Number of buffer bytes needed to extract an entry
+        copyIn = self.fileView is None  # The file pointer path copies the input
+        if streamed:
+            return self.STREAM_CHUNK_SIZE * (2 if copyIn else 1)
+
+        cost = entry.cmprsdDataSize if copyIn else 0
+        if entry.cmprsFlag == 1:
+            cost += entry.uncmprsdDataSize
+        return cost
+
+
+    def _openEntry(self, entry, streamed):
+        # Returns the payload of a CArchive entry, either as one buffer or as a DataStream
+        if not streamed:
+            data = self._readData(entry.position, entry.cmprsdDataSize)
+            if entry.cmprsFlag == 1:
+                data = zlib.decompress(data)
+                # Malware may tamper with the uncompressed size
+                # Comment out the assertion in such a case
+                assert len(data) == entry.uncmprsdDataSize # Sanity Check
+            return data
+
+        chunks = self._iterData(entry.position, entry.cmprsdDataSize, self.STREAM_CHUNK_SIZE)
+        if entry.cmprsFlag == 1:
+            chunks = self._decompressChunks(chunks, entry.uncmprsdDataSize)
+        return DataStream(chunks)
+
+
     def checkFile(self):
         print('[+] Processing {0}'.format(self.filePath))
 
@@ -141,34 +574,48 @@ class PyInstArchive:
             print('[!] Error : File is too short or truncated')
             return False
 
-        while True:
-            startPos = endPos - searchChunkSize if endPos >= searchChunkSize else 0
-            chunkSize = endPos - startPos
+        with self.tracer.stage('cookie_search') as stage:
+            # Look where the executable headers say the archive ends first
+            self.cookiePos = self._locateCookie()
+            stage['method'] = 'headers'
+            if self.cookiePos != -1:
+                endPos = 0
+            else:
+                stage['method'] = 'search'
 
-            if chunkSize < len(self.MAGIC):
-                break
+            if self.cookiePos == -1 and self.fileMap is not None:
+                # The mapped file is searched in one go, without copying chunks
+                self.cookiePos = self.fileMap.rfind(self.MAGIC)
+                endPos = 0
 
-            self.fPtr.seek(startPos, os.SEEK_SET)
-            data = self.fPtr.read(chunkSize)
+            while endPos > 0:
+                startPos = endPos - searchChunkSize if endPos >= searchChunkSize else 0
+                chunkSize = endPos - startPos
 
-            offs = data.rfind(self.MAGIC)
+                if chunkSize < len(self.MAGIC):
+                    break
 
-            if offs != -1:
-                self.cookiePos = startPos + offs
-                break
+                self.fPtr.seek(startPos, os.SEEK_SET)
+                data = self.fPtr.read(chunkSize)
 
-            endPos = startPos + len(self.MAGIC) - 1
+                offs = data.rfind(self.MAGIC)
 
-            if startPos == 0:
-                break
+                if offs != -1:
+                    self.cookiePos = startPos + offs
+                    break
+
+                endPos = startPos + len(self.MAGIC) - 1
+
+                if startPos == 0:
+                    break
+
+            stage['bytes_in'] = self.fileSize - max(self.cookiePos, 0) if stage['method'] == 'search' else self.COOKIE_WINDOW
 
         if self.cookiePos == -1:
             print('[!] Error : Missing cookie, unsupported pyinstaller version or not a pyinstaller archive')
             return False
 
-        self.fPtr.seek(self.cookiePos + self.PYINST20_COOKIE_SIZE, os.SEEK_SET)
-
-        if b'python' in self.fPtr.read(64).lower():
+        if b'python' in _toBytes(self._readData(self.cookiePos + self.PYINST20_COOKIE_SIZE, 64)).lower():
             print('[+] Pyinstaller version: 2.1+')
             self.pyinstVer = 21     # pyinstaller 2.1+
         else:
@@ -178,21 +625,112 @@ class PyInstArchive:
         return True
 
 
+    def _locateCookie(self):
+        # Finds the cookie in the few bytes before the offsets where the executable headers
+        # say the archive ends (the end of the file is always tried). Returns -1 if none fits.
+        archiveEnds = []
+        try:
+            head = _toBytes(self._readData(0, 64))
+            if head[:2] == b'MZ':
+                archiveEnds = self._peArchiveEnds()
+            elif head[:4] == b'\x7fELF':
+                archiveEnds = self._elfArchiveEnds(head)
+            elif head[:4] in (b'\xce\xfa\xed\xfe', b'\xcf\xfa\xed\xfe'):
+                archiveEnds = self._machoArchiveEnds(head)
+        except (struct.error, ValueError, IndexError):
+            pass  # Malformed headers, the end of the file or the full search will do
+
+        for endPos in archiveEnds + [self.fileSize]:
+            if endPos <= 0 or endPos > self.fileSize:
+                continue
+            startPos = max(endPos - self.COOKIE_WINDOW, 0)
+            offs = _toBytes(self._readData(startPos, endPos - startPos)).rfind(self.MAGIC)
+            if offs == -1:
+                continue
+            cookiePos = startPos + offs
+            if cookiePos + self.PYINST20_COOKIE_SIZE > endPos:
+                continue
+            # The package the cookie describes has to fit in front of it
+            (lengthofPackage, ) = struct.unpack('!I', self._readData(cookiePos + 8, 4))
+            if lengthofPackage <= endPos:
+                return cookiePos
+        return -1
+
+
+    def _peArchiveEnds(self):
+        # A signed PE has its certificate table right after the archive
+        (peOffset, ) = struct.unpack('<I', self._readData(0x3c, 4))
+        if _toBytes(self._readData(peOffset, 4)) != b'PE\0\0':
+            return []
+        optionalHeader = peOffset + 24
+        (magic, ) = struct.unpack('<H', self._readData(optionalHeader, 2))
+        dirsOffset = {0x10b: 96, 0x20b: 112}.get(magic)  # PE32, PE32+
+        if dirsOffset is None:
+            return []
+        (numDirs, ) = struct.unpack('<I', self._readData(optionalHeader + dirsOffset - 4, 4))
+        if numDirs <= 4:
+            return []
+        # The security directory holds a file offset, not an RVA
+        (certOffset, certSize) = struct.unpack('<II', self._readData(optionalHeader + dirsOffset + 4 * 8, 8))
+        return [certOffset] if certOffset and certSize else []
+
+
+    def _elfArchiveEnds(self, head):
+        # Recent pyinstaller versions embed the archive in a section named pydata
+        is64 = head[4:5] == b'\x02'
+        endian = '<' if head[5:6] == b'\x01' else '>'
+        if is64:
+            (shoff, ) = struct.unpack(endian + 'Q', head[0x28:0x30])
+            (shentsize, shnum, shstrndx) = struct.unpack(endian + 'HHH', head[0x3a:0x40])
+            sectionFormat = endian + 'IIQQQQ'   # name, type, flags, addr, offset, size
+        else:
+            (shoff, ) = struct.unpack(endian + 'I', head[0x20:0x24])
+            (shentsize, shnum, shstrndx) = struct.unpack(endian + 'HHH', head[0x2e:0x34])
+            sectionFormat = endian + 'IIIIII'
+        if shoff == 0 or shstrndx >= shnum or shoff + shnum * shentsize > self.fileSize:
+            return []
+
+        sectionSize = struct.calcsize(sectionFormat)
+        table = _toBytes(self._readData(shoff, shnum * shentsize))
+        sections = [struct.unpack(sectionFormat, table[i * shentsize:i * shentsize + sectionSize]) for i in range(shnum)]
+        strtab = sections[shstrndx]
+        names = _toBytes(self._readData(strtab[4], strtab[5]))
+        for section in sections:
+            nameEnd = names.find(b'\0', section[0])
+            if names[section[0]:nameEnd] == b'pydata':
+                return [section[4] + section[5]]
+        return []
+
+
+    def _machoArchiveEnds(self, head):
+        # A signed Mach-O has its code signature right after the archive
+        is64 = head[:4] == b'\xcf\xfa\xed\xfe'
+        (ncmds, sizeofcmds) = struct.unpack('<II', head[16:24])
+        commandsPos = 32 if is64 else 28
+        commands = _toBytes(self._readData(commandsPos, min(sizeofcmds, self.fileSize - commandsPos)))
+        pos = 0
+        for i in range(ncmds):
+            (cmd, cmdsize) = struct.unpack('<II', commands[pos:pos + 8])
+            if cmd == 0x1d:  # LC_CODE_SIGNATURE
+                (dataoff, ) = struct.unpack('<I', commands[pos + 8:pos + 12])
+                return [dataoff]
+            if cmdsize < 8:
+                break
+            pos += cmdsize
+        return []
+
+
     def getCArchiveInfo(self):
         try:
             if self.pyinstVer == 20:
-                self.fPtr.seek(self.cookiePos, os.SEEK_SET)
-
                 # Read CArchive cookie
                 (magic, lengthofPackage, toc, tocLen, pyver) = \
-                struct.unpack('!8siiii', self.fPtr.read(self.PYINST20_COOKIE_SIZE))
+                struct.unpack('!8siiii', self._readData(self.cookiePos, self.PYINST20_COOKIE_SIZE))
 
             elif self.pyinstVer == 21:
-                self.fPtr.seek(self.cookiePos, os.SEEK_SET)
-
                 # Read CArchive cookie
                 (magic, lengthofPackage, toc, tocLen, pyver, pylibname) = \
-                struct.unpack('!8sIIii64s', self.fPtr.read(self.PYINST21_COOKIE_SIZE))
+                struct.unpack('!8sIIii64s', self._readData(self.cookiePos, self.PYINST21_COOKIE_SIZE))
 
         except:
             print('[!] Error : The file is not a pyinstaller archive')
@@ -215,253 +753,770 @@ class PyInstArchive:
 
 
     def parseTOC(self):
-        # Go to the table of contents
-        self.fPtr.seek(self.tableOfContentsPos, os.SEEK_SET)
+        with self.tracer.stage('toc_parse') as stage:
+            self.tocList = []
+            parsedLen = 0
+            headerSize = struct.calcsize('!iIIIBc')
+
+            # Read the whole table of contents at once and parse the entries from memory
+            toc = _toBytes(self._readData(self.tableOfContentsPos, self.tableOfContentsSize))
+            while parsedLen + headerSize <= len(toc):
+                (entrySize, entryPos, cmprsdDataSize, uncmprsdDataSize, cmprsFlag, typeCmprsData) = \
+                    struct.unpack_from('!iIIIBc', toc, parsedLen)
+                if entrySize < headerSize or parsedLen + entrySize > len(toc):
+                    print('[!] Error: Corrupt TOC entry at offset {0}, ignoring the rest of the TOC'.format(parsedLen))
+                    break
+                name = toc[parsedLen + headerSize:parsedLen + entrySize]
 
-        self.tocList = []
-        parsedLen = 0
+                try:
+                    name = name.decode("utf-8").rstrip("\0")
+                except UnicodeDecodeError:
+                    newName = str(uniquename())
+                    print('[!] Warning: File name {0} contains invalid bytes. Using random name {1}'.format(name, newName))
+                    name = newName
+            
+                # Prevent writing outside the extraction directory
+                if name.startswith("/"):
+                    name = name.lstrip("/")
+
+                if len(name) == 0:
+                    name = str(uniquename())
+                    print('[!] Warning: Found an unamed file in CArchive. Using random name {0}'.format(name))
+
+                self.tocList.append( \
+                                    CTOCEntry(                      \
+                                        self.overlayPos + entryPos, \
+                                        cmprsdDataSize,             \
+                                        uncmprsdDataSize,           \
+                                        cmprsFlag,                  \
+                                        typeCmprsData,              \
+                                        name                        \
+                                    ))
+
+                parsedLen += entrySize
+            print('[+] Found {0} files in CArchive'.format(len(self.tocList)))
+            stage['bytes_in'] = self.tableOfContentsSize
+            stage['entries'] = len(self.tocList)
+
+
+    def listContents(self, pattern=None):
+        """
+        Lists the CArchive entries and the members of its PYZ archives without extracting anything.
+        Returns (name, type, compressed size, uncompressed size) tuples; PYZ members are named
+        <pyz name>/<module>, typed 'pkg' or 'mod' and have no known uncompressed size (None).
+        pattern is a regular expression searched for in the names.
+        """
+        regex = re.compile(pattern) if pattern else None
+        rows = []
+        for entry in self.tocList:
+            typeCode = entry.typeCmprsData.decode('latin-1')
+            rows.append((entry.name, typeCode, entry.cmprsdDataSize, entry.uncmprsdDataSize))
+            if typeCode not in ('z', 'Z'):
+                continue
+            try:
+                (pyzPycMagic, toc) = self._readPyzToc(io.BytesIO(self._openEntry(entry, False)))
+            except Exception:
+                print('[!] Error: Could not read the table of contents of {0}'.format(entry.name))
+                continue
+            for (key, (ispkg, pos, length)) in toc:
+                rows.append(('{0}/{1}'.format(entry.name, self._decodeName(key)), 'pkg' if ispkg == 1 else 'mod', length, None))
+        return [row for row in rows if regex is None or regex.search(row[0])]
+
+
+    def memberDigests(self):
+        """
+        Content hashes of the archive without extracting anything: maps the output name (relative to
+        the extraction directory) of every CArchive entry and PYZ member to the SHA-1 of its data as
+        stored in the archive. PYZ archives are represented by their members, nested archives and
+        zip files by one hash of the whole container.
+        """
+        digests = {}
+        for entry in self.tocList:
+            if entry.typeCmprsData == b'd' or entry.typeCmprsData == b'o':
+                continue
+            outName = entry.name if entry.typeCmprsData in (b'a', b'b', b'x', b'z', b'Z') else entry.name + '.pyc'
+
+            if entry.typeCmprsData in (b'z', b'Z') and _toBytes(self._peekEntry(entry, 4)) == b'PYZ\0':
+                try:
+                    data = self._openEntry(entry, False)
+                    (pyzPycMagic, toc) = self._readPyzToc(io.BytesIO(data))
+                except Exception:
+                    print('[!] Error: Could not read the table of contents of {0}'.format(entry.name))
+                else:
+                    for (key, (ispkg, pos, length)) in toc:
+                        filePath = self._pyzMemberPath(entry.name + '_extracted', key, ispkg)
+                        digests[filePath] = hashlib.sha1(data[pos:pos + length]).hexdigest()
+                    continue
 
-        # Parse table of contents
-        while parsedLen < self.tableOfContentsSize:
-            (entrySize, ) = struct.unpack('!i', self.fPtr.read(4))
-            nameLen = struct.calcsize('!iIIIBc')
+            digest = hashlib.sha1(entry.typeCmprsData)
+            for chunk in self._iterData(entry.position, entry.cmprsdDataSize, self.STREAM_CHUNK_SIZE):
+                digest.update(chunk)
+            digests[self._safeName(outName)] = digest.hexdigest()
+        return digests
 
-            (entryPos, cmprsdDataSize, uncmprsdDataSize, cmprsFlag, typeCmprsData, name) = \
-            struct.unpack( \
-                '!IIIBc{0}s'.format(entrySize - nameLen), \
-                self.fPtr.read(entrySize - 4))
 
-            try:
-                name = name.decode("utf-8").rstrip("\0")
-            except UnicodeDecodeError:
-                newName = str(uniquename())
-                print('[!] Warning: File name {0} contains invalid bytes. Using random name {1}'.format(name, newName))
-                name = newName
-            
-            # Prevent writing outside the extraction directory
-            if name.startswith("/"):
-                name = name.lstrip("/")
+    def _isSelected(self, name):
+        return self.select is None or name in self.select or name in self.selectContainers
+
 
-            if len(name) == 0:
-                name = str(uniquename())
-                print('[!] Warning: Found an unamed file in CArchive. Using random name {0}'.format(name))
+    def _safeName(self, filepath):
+        # Output name of an archive member: native separators, no way out of the extraction directory.
+        # Drive letters and leading separators would make os.path.join drop the extraction directory
+        nm = re.sub(r'^[A-Za-z]:', '', filepath.replace('\\', os.path.sep).replace('/', os.path.sep))
+        return nm.lstrip(os.path.sep).replace('..', '__')
 
-            self.tocList.append( \
-                                CTOCEntry(                      \
-                                    self.overlayPos + entryPos, \
-                                    cmprsdDataSize,             \
-                                    uncmprsdDataSize,           \
-                                    cmprsFlag,                  \
-                                    typeCmprsData,              \
-                                    name                        \
-                                ))
 
-            parsedLen += entrySize
-        print('[+] Found {0} files in CArchive'.format(len(self.tocList)))
+    def _isInside(self, name):
+        # True if the output name resolves below the extraction directory, symbolic links included
+        root = os.path.realpath(self.extractionDir)
+        return os.path.realpath(self._outPath(name)).startswith(root + os.path.sep)
 
 
     def _writeRawData(self, filepath, data):
-        nm = filepath.replace('\\', os.path.sep).replace('/', os.path.sep).replace('..', '__')
-        nmDir = os.path.dirname(nm)
-        if nmDir != '' and not os.path.exists(nmDir): # Check if path exists, create if not
-            os.makedirs(nmDir)
+        nm = self._safeName(filepath)
+        self._makeDirs([os.path.dirname(nm)]) # Usually created up front already, then only a set lookup
 
-        with open(nm, 'wb') as f:
-            f.write(data)
+        with open(self._outPath(nm), 'wb') as f:
+            self._writeData(f, data)
+        self.outputFiles.append(nm)
+        return nm
 
 
-    def extractFiles(self):
+    def _outPath(self, name):
+        # Output paths are kept relative to the extraction directory, the working directory is never changed
+        return os.path.join(self.extractionDir, name)
+
+
+    def _publish(self, name):
+        # Hands a complete output file to the consumer, e.g. a decompiler waiting for pyc files
+        if self.fileCallback is not None and name is not None:
+            self.fileCallback(name)
+
+
+    def extractionDirFor(self, outputDir=None):
+        return os.path.join(outputDir or os.getcwd(), os.path.basename(self.filePath) + '_extracted')
+
+
+    def extractFiles(self, outputDir=None):
+        # Files are extracted to <outputDir>/<file name>_extracted, outputDir defaults to the working directory
         print('[+] Beginning extraction...please standby')
-        extractionDir = os.path.join(os.getcwd(), os.path.basename(self.filePath) + '_extracted')
+        self.extractionDir = self.extractionDirFor(outputDir)
 
-        if not os.path.exists(extractionDir):
-            os.mkdir(extractionDir)
+        if not os.path.exists(self.extractionDir):
+            os.mkdir(self.extractionDir)
+        self.madeDirs = set()
 
-        os.chdir(extractionDir)
+        with self.tracer.stage('carchive_extract') as stage:
+            bytesWritten = self.bytesWritten
+            written = self._extractCArchive()
+            stage['entries'] = len(self.tocList)
+            stage['bytes_in'] = sum(entry.cmprsdDataSize for entry in self.tocList)
+            stage['bytes_out'] = self.bytesWritten - bytesWritten
 
-        for entry in self.tocList:
-            self.fPtr.seek(entry.position, os.SEEK_SET)
-            data = self.fPtr.read(entry.cmprsdDataSize)
+        pyzEntries = [entry for entry in written if entry.typeCmprsData in (b'z', b'Z') and self._isPyz(entry.name)]
+        nested = self._findNested(written) if self.nestedDepth > 0 else []
 
-            if entry.cmprsFlag == 1:
-                try:
-                    data = zlib.decompress(data)
-                except zlib.error:
-                    print('[!] Error : Failed to decompress {0}'.format(entry.name))
-                    continue
-                # Malware may tamper with the uncompressed size
-                # Comment out the assertion in such a case
-                assert len(data) == entry.uncmprsdDataSize # Sanity Check
+        # Nested archives are extracted alongside the PYZ archives of this one, on their own threads.
+        # Their extraction tasks take the same worker slots and memory budget as ours.
+        pool, futures = None, []
+        if nested and self.jobs > 1:
+            pool = ThreadPoolExecutor(max_workers=min(len(nested), self.jobs), thread_name_prefix='nested_extract')
+            futures = [pool.submit(self._extractNested, item) for item in nested]
 
+        try:
+            # PYZ members are extracted once all CArchive entries are on disk
+            for entry in pyzEntries:
+                with self.tracer.stage('pyz_extract', pyz=entry.name) as stage:
+                    bytesWritten = self.bytesWritten
+                    self._extractPyz(entry.name)
+                    stage['entries'] = len(self.pyzMembers.get(entry.name, []))
+                    stage['bytes_in'] = entry.uncmprsdDataSize
+                    stage['bytes_out'] = self.bytesWritten - bytesWritten
+
+            if pool is None:
+                for item in nested:
+                    self._extractNested(item)
+        finally:
+            if pool is not None:
+                for future in futures:
+                    future.result()
+                pool.shutdown()
+
+
+    def _extractCArchive(self):
+        # Extracts the CArchive entries, returns the entries that were written
+        entryMagics = self._resolvePycMagics()
+
+        # Entries are extracted concurrently. Those writing to the same file are kept
+        # in one task so the last one still wins, like in a sequential extraction.
+        groups = {}
+        for entry, magic in zip(self.tocList, entryMagics):
             if entry.typeCmprsData == b'd' or entry.typeCmprsData == b'o':
-                # d -> ARCHIVE_ITEM_DEPENDENCY
-                # o -> ARCHIVE_ITEM_RUNTIME_OPTION
-                # These are runtime options, not files
                 continue
+            outName = entry.name if entry.typeCmprsData in (b'a', b'b', b'x', b'z', b'Z') else entry.name + '.pyc'
+            nm = self._safeName(outName)
+            if self._isSelected(nm):
+                groups.setdefault(nm, []).append((entry, magic))
+
+        # Only the sanitized names of the entries that are written get a directory
+        self._makeDirs([os.path.dirname(nm) for nm in groups])
+
+        extracted = self._runTasks(self._extractGroup, list(groups.values()), 'carchive_extract')
+
+        written = []
+        for group, done in zip(groups.values(), extracted):
+            if done:
+                written.extend(entry for entry, magic in group)
+        return written
+
+
+    def _isPyz(self, name):
+        # 'Z' entries are either PYZ archives or plain zip files
+        with open(self._outPath(name), 'rb') as f:
+            return f.read(4) == b'PYZ\0'
+
+
+    def _findNested(self, written):
+        # Returns (name, kind) of the written entries that are containers themselves:
+        # nested CArchives (PKG), executables with an archive of their own and zip files (base_library.zip)
+        nested = []
+        for entry in written:
+            if entry.typeCmprsData == b'a':
+                nested.append((entry.name, 'carchive'))
+
+            elif entry.typeCmprsData in (b'b', b'x', b'Z'):
+                path = self._outPath(entry.name)
+                if entry.typeCmprsData == b'Z' or entry.name.lower().endswith('.zip'):
+                    if not self._isPyz(entry.name) and zipfile.is_zipfile(path):
+                        nested.append((entry.name, 'zip'))
+
+                elif entry.uncmprsdDataSize > self.PYINST20_COOKIE_SIZE:
+                    # Only the headers and the end of the file are read, never the whole binary
+                    probe = PyInstArchive(path, useMmap=False)
+                    if probe.open():
+                        try:
+                            if probe._locateCookie() != -1:
+                                nested.append((entry.name, 'carchive'))
+                        finally:
+                            probe.close()
+        return nested
+
+
+    def _extractNested(self, item):
+        # Extracts a nested container into <name>_extracted next to it and adds its files to ours
+        (name, kind) = item
+        path = self._outPath(name)
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.STREAM_CHUNK_SIZE), b''):
+                digest.update(chunk)
+
+        # Identical containers (the same PKG in several executables) are extracted only once
+        with self.nestedLock:
+            first = self.nestedSeen.setdefault(digest.hexdigest(), path)
+        if first != path:
+            print('[+] Nested archive {0} is identical to {1}, skipping it'.format(name, os.path.basename(first)))
+            self.nestedArchives.append((name, 'duplicate'))
+            # A note where its files would have been, relative paths stay valid when the tree is moved
+            noteName = os.path.join(self._safeName(name) + '_extracted', self.DUPLICATE_NOTE)
+            noteDir = os.path.dirname(self._outPath(noteName))
+            note = 'Identical to {0}, its files were only extracted to {1}\n'.format(
+                os.path.relpath(first, noteDir), os.path.relpath(first + '_extracted', noteDir))
+            self._publish(self._writeRawData(noteName, note.replace(os.path.sep, '/').encode('utf-8')))
+            return
+
+        print('[+] Extracting nested {0}: {1}'.format('zip file' if kind == 'zip' else 'archive', name))
+        self.nestedArchives.append((name, kind))
+        with self.tracer.stage('nested_extract', nested=name, kind=kind) as stage:
+            bytesWritten = self.bytesWritten
+            if kind == 'zip':
+                self._extractZip(name)
+            else:
+                self._extractNestedCArchive(name)
+            stage['bytes_in'] = os.path.getsize(path)
+            stage['bytes_out'] = self.bytesWritten - bytesWritten
+
+
+    def _extractNestedCArchive(self, name):
+        child = PyInstArchive(self._outPath(name), self.useMmap, jobs=self.jobs, workerSlots=self.workerSlots,
+                              tracer=self.tracer, nestedDepth=self.nestedDepth - 1)
+        child.memBudget = self.memBudget
+        child.nestedSeen, child.nestedLock = self.nestedSeen, self.nestedLock
+        if self.fileCallback is not None:
+            prefix = os.path.relpath(child.extractionDirFor(os.path.dirname(self._outPath(name))), self.extractionDir)
+            child.fileCallback = lambda nm: self._publish(os.path.join(prefix, nm))
+        if not child.open():
+            return
 
-            basePath = os.path.dirname(entry.name)
-            if basePath != '':
-                # Check if path exists, create if not
-                if not os.path.exists(basePath):
-                    os.makedirs(basePath)
+        try:
+            if not child.checkFile() or not child.getCArchiveInfo():
+                return
+            if (child.pymaj, child.pymin) != (self.pymaj, self.pymin):
+                print('[!] Warning: Nested archive {0} was built with Python {1}.{2}, not {3}.{4}'.format(
+                    name, child.pymaj, child.pymin, self.pymaj, self.pymin))
+            with self.statsLock:
+                self.nestedVersions[name] = (child.pymaj, child.pymin)
+            child.parseTOC()
+            child.extractFiles(os.path.dirname(self._outPath(name)))
+        finally:
+            child.close()
+
+        # Everything the nested archive wrote becomes part of our own output
+        prefix = os.path.relpath(child.extractionDir, self.extractionDir)
+        for pyzName, members in child.pyzMembers.items():
+            for member in members:
+                member.path = os.path.join(prefix, member.path)
+            self.pyzMembers[os.path.join(prefix, pyzName)] = members
+        with self.statsLock:
+            self.outputFiles.extend(os.path.join(prefix, nm) for nm in child.outputFiles)
+            self.entryPoints.extend(os.path.join(prefix, nm) for nm in child.entryPoints)
+            self.nestedArchives.extend((os.path.join(prefix, nm), kind) for (nm, kind) in child.nestedArchives)
+            self.failedEntries.extend(os.path.join(prefix, nm) for nm in child.failedEntries)
+            self.nestedVersions.update((os.path.join(prefix, nm), version) for (nm, version) in child.nestedVersions.items())
+            self.bytesWritten += child.bytesWritten
+
+
+    def _extractZip(self, name):
+        dirName = name + '_extracted'
+        with zipfile.ZipFile(self._outPath(name)) as zf:
+            # Zip member names are not to be trusted: sanitized before they are joined, as an absolute
+            # name would replace dirName, and only written if they still resolve below the extraction directory
+            members = []
+            for info in zf.infolist():
+                nm = os.path.join(dirName, self._safeName(info.filename))
+                if info.filename.endswith('/'):
+                    continue
+                if not self._isInside(nm):
+                    print('[!] Warning: Skipping {0} from {1}, it leaves the extraction directory'.format(info.filename, name))
+                    continue
+                members.append((info, nm))
+            self._makeDirs([os.path.dirname(nm) for (info, nm) in members])
+            for (info, nm) in members:
+                with self.memBudget.reserve(info.file_size):
+                    try:
+                        data = zf.read(info)
+                    except (zipfile.BadZipfile, zlib.error, NotImplementedError, RuntimeError):
+                        print('[!] Error: Could not extract {0} from {1}'.format(info.filename, name))
+                        self.failedEntries.append(nm)
+                        continue
+                    self._publish(self._writeRawData(nm, data))
+
+
+    def _resolvePycMagics(self):
+        # Works out the pyc magic every entry would see if the TOC was extracted
+        # in order, so that the entries themselves can be written in any order
+        entryMagics = []
+        for entry in self.tocList:
+            entryMagics.append(self.pycMagic)
 
             if entry.typeCmprsData == b's':
-                # s -> ARCHIVE_ITEM_PYSOURCE
-                # Entry point are expected to be python scripts
                 print('[+] Possible entry point: {0}.pyc'.format(entry.name))
+                self.entryPoints.append(self._safeName(entry.name + '.pyc'))
+
+            elif entry.typeCmprsData == b'M' or entry.typeCmprsData == b'm':
+                head = self._peekEntry(entry, 4)
+                if head[2:4] == b'\r\n' and self.pycMagic == b'\0' * 4:
+                    self.pycMagic = _toBytes(head[0:4])
+
+            elif entry.typeCmprsData == b'z' or entry.typeCmprsData == b'Z':
+                head = self._peekEntry(entry, 8)
+                if head[0:4] != b'PYZ\0':
+                    continue
 
+                pyzPycMagic = _toBytes(head[4:8])
                 if self.pycMagic == b'\0' * 4:
-                    # if we don't have the pyc header yet, fix them in a later pass
-                    self.barePycList.append(entry.name + '.pyc')
-                self._writePyc(entry.name + '.pyc', data)
+                    self.pycMagic = pyzPycMagic
 
-            elif entry.typeCmprsData == b'M' or entry.typeCmprsData == b'm':
-                # M -> ARCHIVE_ITEM_PYPACKAGE
-                # m -> ARCHIVE_ITEM_PYMODULE
-                # packages and modules are pyc files with their header intact
-
-                # From PyInstaller 5.3 and above pyc headers are no longer stored
-                # https://github.com/pyinstaller/pyinstaller/commit/a97fdf
-                if data[2:4] == b'\r\n':
-                    # < pyinstaller 5.3
-                    if self.pycMagic == b'\0' * 4: 
-                        self.pycMagic = data[0:4]
-                    self._writeRawData(entry.name + '.pyc', data)
+                elif self.pycMagic != pyzPycMagic:
+                    self.pycMagic = pyzPycMagic
+                    print('[!] Warning: pyc magic of files inside PYZ archive are different from those in CArchive')
 
-                else:
-                    # >= pyinstaller 5.3
-                    if self.pycMagic == b'\0' * 4:
-                        # if we don't have the pyc header yet, fix them in a later pass
-                        self.barePycList.append(entry.name + '.pyc')
+        return entryMagics
+
+
+    def _peekEntry(self, entry, size):
+        # First bytes of an entry's payload, only decompressing as much as needed
+        data = self._readData(entry.position, entry.cmprsdDataSize if entry.cmprsFlag == 1 else size)
+        if entry.cmprsFlag == 1:
+            try:
+                data = zlib.decompressobj().decompress(data, size)
+            except zlib.error:
+                return b''
+        return data
+
+
+    def _makeDirs(self, dirs):
+        # Directories are created up front and only once each, extraction tasks only write files
+        with self.dirsLock:
+            for dirName in sorted(set(dirs) - self.madeDirs):
+                if dirName == '' or dirName in self.madeDirs:
+                    continue
+                try:
+                    os.makedirs(self._outPath(dirName))
+                except OSError:
+                    if not os.path.isdir(self._outPath(dirName)):
+                        raise
+                # makedirs also created the parents
+                while dirName != '' and dirName not in self.madeDirs:
+                    self.madeDirs.add(dirName)
+                    dirName = os.path.dirname(dirName)
+
+
+    def _runTasks(self, func, items, name):
+        # Calls func for every item, on a thread pool if jobs > 1. Results keep the input order.
+        # The pool threads are named after the stage (name) they work for.
+        if self.workerSlots is not None:
+            taskFunc = func
+            def func(item):
+                with self.workerSlots:
+                    return taskFunc(item)
+
+        if self.jobs <= 1:
+            return [func(item) for item in items]
+
+        results = []
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix=name) as pool:
+            pending = deque()
+            for item in items:
+                if len(pending) >= self.jobs * self.MAX_PENDING_PER_JOB:
+                    results.append(pending.popleft().result())
+                pending.append(pool.submit(func, item))
+
+            while pending:
+                results.append(pending.popleft().result())
+        return results
+
+
+    def _extractGroup(self, group):
+        # The file of a group is published once its last entry is written
+        done, written = False, None
+        for entry, magic in group:
+            (done, written) = self._extractTocEntry(entry, magic)
+        self._publish(written)
+        return done
+
+
+    def _extractTocEntry(self, entry, magic):
+        # Returns whether the entry was extracted and the name of its output file if that is complete.
+        # Large entries are streamed in chunks straight into their output file
+        streamed = self._entryCost(entry, False) > min(self.STREAM_THRESHOLD, self.memBudget.limit)
+
+        with self.memBudget.reserve(self._entryCost(entry, streamed)):
+            try:
+                data = self._openEntry(entry, streamed)
+            except zlib.error:
+                print('[!] Error : Failed to decompress {0}'.format(entry.name))
+                self.failedEntries.append(entry.name)
+                return (False, None)
 
-                    self._writePyc(entry.name + '.pyc', data)
+            try:
+                written = self._extractEntry(entry, data, magic)
+            except zlib.error:
+                # Streamed entries can fail after their output file was created
+                print('[!] Error : Failed to decompress {0}'.format(entry.name))
+                self.failedEntries.append(entry.name)
+                self._removePartial(entry)
+                return (False, None)
+            finally:
+                del data
+
+        return (True, written)
+
+
+    def _extractEntry(self, entry, data, magic):
+        # Returns the name of the written file
+        head = data.head if isinstance(data, DataStream) else data
+
+        if entry.typeCmprsData == b's':
+            # s -> ARCHIVE_ITEM_PYSOURCE
+            # Entry point are expected to be python scripts
+            # Without a pyc magic before them in the TOC, they get the one found after them
+            return self._writePyc(self._safeName(entry.name + '.pyc'), data, magic if magic != b'\0' * 4 else None)
+
+        elif entry.typeCmprsData == b'M' or entry.typeCmprsData == b'm':
+            # M -> ARCHIVE_ITEM_PYPACKAGE
+            # m -> ARCHIVE_ITEM_PYMODULE
+            # packages and modules are pyc files with their header intact
+
+            # From PyInstaller 5.3 and above pyc headers are no longer stored
+            # https://github.com/pyinstaller/pyinstaller/commit/a97fdf
+            if head[2:4] == b'\r\n':
+                # < pyinstaller 5.3
+                return self._writeRawData(entry.name + '.pyc', data)
 
             else:
-                self._writeRawData(entry.name, data)
+                # >= pyinstaller 5.3
+                return self._writePyc(self._safeName(entry.name + '.pyc'), data, magic if magic != b'\0' * 4 else None)
 
-                if entry.typeCmprsData == b'z' or entry.typeCmprsData == b'Z':
-                    self._extractPyz(entry.name)
+        else:
+            return self._writeRawData(entry.name, data)
+
+
+    def _removePartial(self, entry):
+        # Entries are written under their sanitized name only
+        for path in (entry.name, entry.name + '.pyc'):
+            nm = self._safeName(path)
+            if os.path.isfile(self._outPath(nm)):
+                os.remove(self._outPath(nm))
+
+
+    def _writeData(self, f, data, head=b''):
+        # head (a pyc header) goes out with the first chunk, small files take a single write
+        size = 0
+        if isinstance(data, DataStream):
+            for chunk in data:
+                size += len(chunk)
+                if head:
+                    chunk, head = head + _toBytes(chunk), b''
+                f.write(chunk)
+        else:
+            size = len(data)
+            if head and size <= self.STREAM_CHUNK_SIZE:
+                f.write(head + _toBytes(data))
+            else:
+                if head:
+                    f.write(head)
+                f.write(data)
 
-        # Fix bare pyc's if any
-        self._fixBarePycs()
+        with self.statsLock:
+            self.bytesWritten += size
 
 
-    def _fixBarePycs(self):
-        for pycFile in self.barePycList:
-            with open(pycFile, 'r+b') as pycFile:
-                # Overwrite the first four bytes
-                pycFile.write(self.pycMagic)
+    def _pycHeader(self, magic):
+        header = magic
+        if self.pymaj >= 3 and self.pymin >= 7:                # PEP 552 -- Deterministic pycs
+            header += b'\0' * 4        # Bitfield
+            header += b'\0' * 8        # (Timestamp + size) || hash
 
+        else:
+            header += b'\0' * 4      # Timestamp
+            if self.pymaj >= 3 and self.pymin >= 3:
+                header += b'\0' * 4  # Size parameter added in Python 3.3
+        return header
 
-    def _writePyc(self, filename, data):
-        with open(filename, 'wb') as pycFile:
-            pycFile.write(self.pycMagic)            # pyc magic
 
-            if self.pymaj >= 3 and self.pymin >= 7:                # PEP 552 -- Deterministic pycs
-                pycFile.write(b'\0' * 4)        # Bitfield
-                pycFile.write(b'\0' * 8)        # (Timestamp + size) || hash 
+    def _writePyc(self, filename, data, magic=None):
+        # magic None: the pyc magic of the archive, which _resolvePycMagics knows before anything is written
+        with open(self._outPath(filename), 'wb') as pycFile:
+            self._writeData(pycFile, data, self._pycHeader(self.pycMagic if magic is None else magic))
+        self.outputFiles.append(filename)
+        return filename
 
-            else:
-                pycFile.write(b'\0' * 4)      # Timestamp
-                if self.pymaj >= 3 and self.pymin >= 3:
-                    pycFile.write(b'\0' * 4)  # Size parameter added in Python 3.3
 
-            pycFile.write(data)
+    def _readPyzToc(self, f):
+        # Reads the header and the table of contents of the PYZ archive in file object f.
+        # Returns the pyc magic of its members and the TOC as a list of (name, (ispkg, position, length)).
+        pyzMagic = f.read(4)
+        assert pyzMagic == b'PYZ\0' # Sanity Check
 
+        pyzPycMagic = f.read(4) # Python magic value
 
-    def _extractPyz(self, name):
-        dirName =  name + '_extracted'
-        # Create a directory for the contents of the pyz
-        if not os.path.exists(dirName):
-            os.mkdir(dirName)
+        (tocPosition, ) = struct.unpack('!i', f.read(4))
+        f.seek(tocPosition, os.SEEK_SET)
 
-        with open(name, 'rb') as f:
-            pyzMagic = f.read(4)
-            assert pyzMagic == b'PYZ\0' # Sanity Check
+        if self.pymaj == sys.version_info.major and self.pymin == sys.version_info.minor:
+            toc = marshal.load(f)
+        else:
+            # The builtin marshal only reads its own Python version
+            toc = loadMarshal(f.read(), (self.pymaj, self.pymin))
 
-            pyzPycMagic = f.read(4) # Python magic value
+        # From pyinstaller 3.1+ toc is a list of tuples, duplicate names keep the last entry like a dict would
+        if type(toc) == list:
+            toc = dict(toc)
+        return pyzPycMagic, list(toc.items())
 
-            if self.pycMagic == b'\0' * 4:
-                self.pycMagic = pyzPycMagic
 
-            elif self.pycMagic != pyzPycMagic:
-                self.pycMagic = pyzPycMagic
-                print('[!] Warning: pyc magic of files inside PYZ archive are different from those in CArchive')
+    def _decodeName(self, key):
+        try:
+            # for Python > 3.3 some keys are bytes object some are str object
+            return key.decode('utf-8')
+        except:
+            return key
 
-            # Skip PYZ extraction if not running under the same python version
-            if self.pymaj != sys.version_info.major or self.pymin != sys.version_info.minor:
-                print('[!] Warning: This script is running in a different Python version than the one used to build the executable.')
-                print('[!] Please run this script in Python {0}.{1} to prevent extraction errors during unmarshalling'.format(self.pymaj, self.pymin))
-                print('[!] Skipping pyz extraction')
-                return
 
-            (tocPosition, ) = struct.unpack('!i', f.read(4))
-            f.seek(tocPosition, os.SEEK_SET)
+    def _pyzMemberPath(self, dirName, key, ispkg):
+        fileName = self._decodeName(key)
 
+        # Prevent writing outside dirName
+        fileName = fileName.replace('..', '__').replace('.', os.path.sep)
+
+        if ispkg == 1:
+            return os.path.join(dirName, fileName, '__init__.pyc')
+
+        else:
+            return os.path.join(dirName, fileName + '.pyc')
+
+
+    def _extractPyz(self, name):
+        dirName =  name + '_extracted'
+        # Create a directory for the contents of the pyz
+        self._makeDirs([dirName])
+
+        with open(self._outPath(name), 'rb') as f:
             try:
-                toc = marshal.load(f)
+                # The CArchive pyc magic was already updated from the PYZ header in _resolvePycMagics
+                (pyzPycMagic, toc) = self._readPyzToc(f)
+            except AssertionError:
+                raise
             except:
                 print('[!] Unmarshalling FAILED. Cannot extract {0}. Extracting remaining files.'.format(name))
+                self.failedEntries.append(name)
                 return
 
             print('[+] Found {0} files in PYZ archive'.format(len(toc)))
 
-            # From pyinstaller 3.1+ toc is a list of tuples
-            if type(toc) == list:
-                toc = dict(toc)
-
-            for key in toc.keys():
-                (ispkg, pos, length) = toc[key]
-                f.seek(pos, os.SEEK_SET)
-                fileName = key
-
-                try:
-                    # for Python > 3.3 some keys are bytes object some are str object
-                    fileName = fileName.decode('utf-8')
-                except:
-                    pass
-
-                # Prevent writing outside dirName
-                fileName = fileName.replace('..', '__').replace('.', os.path.sep)
+            # Members mapping to the same file keep only the last one, like a sequential extraction would
+            members = {}
+            for (key, (ispkg, pos, length)) in toc:
+                filePath = self._pyzMemberPath(dirName, key, ispkg)
+                if not self._isSelected(filePath):
+                    continue
 
-                if ispkg == 1:
-                    filePath = os.path.join(dirName, fileName, '__init__.pyc')
+                members.pop(filePath, None)
+                members[filePath] = (pos, length)
+                self.pyzMembers.setdefault(name, []).append(PYZTOCEntry(key, ispkg, pos, length, filePath))
 
-                else:
-                    filePath = os.path.join(dirName, fileName + '.pyc')
-
-                fileDir = os.path.dirname(filePath)
-                if not os.path.exists(fileDir):
-                    os.makedirs(fileDir)
+            self._makeDirs([os.path.dirname(filePath) for filePath in members])
 
+            pyzMap, pyzView = None, None
+            if self.useMmap:
                 try:
-                    data = f.read(length)
-                    data = zlib.decompress(data)
-                except:
-                    print('[!] Error: Failed to decompress {0}, probably encrypted. Extracting as is.'.format(filePath))
-                    open(filePath + '.encrypted', 'wb').write(data)
-                else:
-                    self._writePyc(filePath, data)
+                    pyzMap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    pyzView = memoryview(pyzMap)
+                except (ValueError, OSError, TypeError):
+                    # Same fallback as in open()
+                    if pyzMap is not None:
+                        pyzMap.close()
+                    pyzMap = None
+            pyzLock = threading.Lock()
+
+            def extractMember(item):
+                (filePath, (pos, length)) = item
+                with self.memBudget.reserve(length + self.STREAM_CHUNK_SIZE):
+                    if pyzView is not None:
+                        data = pyzView[pos:pos + length]
+                    else:
+                        with pyzLock:
+                            f.seek(pos, os.SEEK_SET)
+                            data = f.read(length)
+                    try:
+                        self._writePyc(filePath, DataStream(self._decompressChunks([data])), pyzPycMagic)
+                    except:
+                        if os.path.exists(self._outPath(filePath)):
+                            os.remove(self._outPath(filePath))
+                        print('[!] Error: Failed to decompress {0}, probably encrypted. Extracting as is.'.format(filePath))
+                        open(self._outPath(filePath + '.encrypted'), 'wb').write(data)
+                        self.outputFiles.append(filePath + '.encrypted')
+                        self.failedEntries.append(filePath)
+                        filePath += '.encrypted'
+                self._publish(filePath)
+
+            try:
+                self._runTasks(extractMember, list(members.items()), 'pyz_extract')
+            finally:
+                if pyzMap is not None:
+                    pyzView.release()
+                    pyzMap.close()
+
+
+def extract(path, outputDir=None, jobs=1, useMmap=True, maxMemory=PyInstArchive.DEFAULT_MAX_MEMORY, workerSlots=None, tracer=None,
+            nestedDepth=PyInstArchive.MAX_NESTED_DEPTH, fileCallback=None, startCallback=None, select=None):
+    """
+    Extracts the pyinstaller archive at path into <outputDir>/<file name>_extracted.
+    Every extraction task holds one of workerSlots (e.g. a threading.Semaphore), if given.
+    The tracer (see NullTracer) is told about the time and bytes of each stage.
+    Nested archives (PKG entries, bundled executables, zip files) are extracted into
+    <entry>_extracted inside the same directory, up to nestedDepth levels deep (0 = none).
+    To consume files while the extraction is still running, startCallback is called with the
+    extraction directory and the Python version ('3.11') before the first file is written and
+    fileCallback, from the extraction threads, with the path (relative to the extraction
+    directory) of every file once it is complete. pyc files are only passed on once their header
+    is final.
+    select, a set of output names as returned by archiveDigests, limits the extraction to those
+    members (nested containers among them are extracted completely).
+    Returns an ExtractionResult, or None if the file could not be extracted.
+    """
+    arch = PyInstArchive(path, useMmap, maxMemory, jobs, workerSlots, tracer, nestedDepth, fileCallback, select)
+    if not arch.open():
+        return None
+
+    try:
+        if not arch.checkFile() or not arch.getCArchiveInfo():
+            return None
+        arch.parseTOC()
+        if startCallback is not None:
+            startCallback(arch.extractionDirFor(outputDir), '{0}.{1}'.format(arch.pymaj, arch.pymin))
+        arch.extractFiles(outputDir)
+        return ExtractionResult(arch)
+    finally:
+        arch.close()
+
+
+def listArchive(path, pattern=None, useMmap=True):
+    """
+    Lists the CArchive entries and PYZ members of the archive at path (see PyInstArchive.listContents),
+    optionally only those whose name matches the regular expression pattern. Returns None if the file
+    is not a pyinstaller archive.
+    """
+    arch = PyInstArchive(path, useMmap)
+    if not arch.open():
+        return None
+
+    try:
+        if not arch.checkFile() or not arch.getCArchiveInfo():
+            return None
+        arch.parseTOC()
+        return arch.listContents(pattern)
+    finally:
+        arch.close()
+
+
+def archiveDigests(path, useMmap=True):
+    """
+    Returns the content hashes of the CArchive entries and PYZ members of the archive at path (see
+    PyInstArchive.memberDigests), or None if the file is not a pyinstaller archive.
+    """
+    arch = PyInstArchive(path, useMmap)
+    if not arch.open():
+        return None
+
+    try:
+        if not arch.checkFile() or not arch.getCArchiveInfo():
+            return None
+        arch.parseTOC()
+        return arch.memberDigests()
+    finally:
+        arch.close()
+
+
+def printListing(rows):
+    print('{0:>4} {1:>12} {2:>12}  {3}'.format('type', 'compressed', 'size', 'name'))
+    for (name, typeCode, cmprsdDataSize, uncmprsdDataSize) in rows:
+        print('{0:>4} {1:>12} {2:>12}  {3}'.format(typeCode, cmprsdDataSize, '-' if uncmprsdDataSize is None else uncmprsdDataSize, name))
 
 
 def main():
-    if len(sys.argv) < 2:
-        print('[+] Usage: pyinstxtractor.py <filename>')
-
-    else:
-        arch = PyInstArchive(sys.argv[1])
-        if arch.open():
-            if arch.checkFile():
-                if arch.getCArchiveInfo():
-                    arch.parseTOC()
-                    arch.extractFiles()
-                    arch.close()
-                    print('[+] Successfully extracted pyinstaller archive: {0}'.format(sys.argv[1]))
-                    print('')
-                    print('You can now use a python decompiler on the pyc files within the extracted directory')
-                    return
-
-            arch.close()
+    args = sys.argv[1:]
+    pattern = None
+    maxMemory = PyInstArchive.DEFAULT_MAX_MEMORY
+    if len(args) >= 2 and args[0] == '--max-memory':
+        # MB of decompression buffers held at the same time, larger entries are streamed
+        maxMemory = int(args[1]) * 1024 * 1024 if args[1].isdigit() and int(args[1]) > 0 else None
+        args = args[2:]
+    if len(args) == 3 and args[0] == '--grep':
+        pattern = args[1]
+    if len(args) < 1 or maxMemory is None or (args[0] in ('--list', '--grep') and len(args) != (2 if args[0] == '--list' else 3)):
+        print('[+] Usage: pyinstxtractor.py [--max-memory <MB>] [--list | --grep <regex>] <filename>')
+
+    elif args[0] in ('--list', '--grep'):
+        rows = listArchive(args[-1], pattern)
+        if rows is not None:
+            printListing(rows)
+
+    elif extract(args[0], maxMemory=maxMemory) is not None:
+        print('[+] Successfully extracted pyinstaller archive: {0}'.format(args[0]))
+        print('')
+        print('You can now use a python decompiler on the pyc files within the extracted directory')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,167 @@
+"""
+Release-diff mode (main.py --diff OLD.exe NEW.exe): processes a new build of a program by only
+extracting and decompiling what changed since the previous one.
+
+Both executables are compared by their tables of contents: every CArchive entry and PYZ member
+is hashed as it is stored in the archive (pyinstxtractor.archiveDigests), nothing is
+decompressed or written. The output folder of the new release starts as a copy of the output of
+the previous one; added and changed modules are extracted and decompiled into it, removed ones
+are deleted and everything else is kept. A unified diff of the sources between both outputs is
+written next to the new one:
+
+    output/<name>_source.diff
+
+Nested archives and zip files such as base_library.zip are compared as a whole, when they
+changed their modules go through the manifest like in a resumed run. To only see what changed:
+
+    python release_diff.py old.exe new.exe
+"""
+
+import os
+import sys
+import time
+import difflib
+import argparse
+import contextlib
+import io
+
+import pyinstxtractor
+from manifest import Manifest
+
+
+class ReleaseDiff:
+    """Differences between the archives of two releases, by output name (see pyinstxtractor.archiveDigests)."""
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        self.added = sorted(set(new) - set(old))
+        self.removed = sorted(set(old) - set(new))
+        self.changed = sorted(name for name in set(new) & set(old) if new[name] != old[name])
+        self.unchanged = len(new) - len(self.added) - len(self.changed)
+
+    def owner(self, module):
+        """
+        Returns the member of the new archive that module (a path relative to the extracted tree,
+        with /) comes from: the module itself or the nested container it was extracted from.
+        None if the new archive has no such member.
+        """
+        name = module.replace("/", os.path.sep)
+        while name not in self.new:
+            (name, container, _) = name.rpartition("_extracted" + os.path.sep)
+            if not container:
+                return None
+        return name
+
+    def plan(self, records):
+        """
+        Splits the work for the new release. records are the manifest records (module -> record)
+        of the output it starts from. Returns (select, unchanged): the output names of the members
+        to extract (added and changed ones, modules the manifest does not know yet or only has a
+        bytecode listing of) and the modules and bundled sources (relative paths with /) that are
+        kept as they are.
+        """
+        select = set(self.added) | set(self.changed)
+        for name in self.new:
+            record = records.get(name.replace(os.path.sep, "/"))
+            if name.endswith(".pyc") and (record is None or record.get("status") == "listing"):
+                # e.g. after an interrupted run on the previous release, bytecode listings are retried
+                select.add(name)
+
+        kept = set(self.new) - select
+        unchanged = {module for module in records if self.owner(module) in kept}
+        unchanged.update(name.replace(os.path.sep, "/") for name in self.new
+                         if name.endswith(".py") and name not in select)
+        return select, unchanged
+
+    def summary(self):
+        return {"added": len(self.added), "changed": len(self.changed), "removed": len(self.removed),
+                "unchanged": self.unchanged}
+
+
+def compare_releases(old_exe, new_exe):
+    """Compares the archives of two executables. Returns a ReleaseDiff, or None if one is not a PyInstaller archive."""
+    digests = []
+    for exe_path in (old_exe, new_exe):
+        with contextlib.redirect_stdout(io.StringIO()):
+            digests.append(pyinstxtractor.archiveDigests(exe_path))
+        if digests[-1] is None:
+            print(f"[ERROR] Not a PyInstaller archive: {exe_path}")
+            return None
+    return ReleaseDiff(*digests)
+
+
+def _read_lines(folder, name):
+    if name is None:
+        return None
+    try:
+        with open(os.path.join(folder, name), encoding="utf-8", errors="replace") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+    return lines
+
+
+def write_source_diff(diff, old_folder, new_folder, path):
+    """
+    Writes a unified diff of the sources in old_folder and new_folder (the outputs of both releases)
+    to path: every module whose bytecode differs according to the manifests, the bundled sources and,
+    as one line each, other files of the archive that were added, changed or removed.
+    Returns the number of files in the diff.
+    """
+    old_records = Manifest(old_folder).load().modules
+    new_records = Manifest(new_folder).load().modules
+    outputs = []
+    for module in sorted(set(old_records) | set(new_records)):
+        old, new = old_records.get(module, {}), new_records.get(module, {})
+        if old.get("input_hash") != new.get("input_hash"):
+            outputs.append((old.get("output"), new.get("output")))
+
+    binaries = []
+    for name in diff.added + diff.changed + diff.removed:
+        output = name.replace(os.path.sep, "/")
+        if name.endswith(".py"):
+            outputs.append((output if name in diff.old else None, output if name in diff.new else None))
+        elif not name.endswith(".pyc"):
+            binaries.append((output, name in diff.old, name in diff.new))
+
+    files = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for (old_output, new_output) in outputs:
+            old_lines = _read_lines(old_folder, old_output)
+            new_lines = _read_lines(new_folder, new_output)
+            lines = list(difflib.unified_diff(old_lines or [], new_lines or [],
+                                              f"a/{old_output}" if old_lines is not None else "/dev/null",
+                                              f"b/{new_output}" if new_lines is not None else "/dev/null"))
+            if lines:
+                f.writelines(lines)
+                files += 1
+        for (name, in_old, in_new) in sorted(binaries):
+            f.write(f"Binary files {'a/' + name if in_old else '/dev/null'} and "
+                    f"{'b/' + name if in_new else '/dev/null'} differ\n")
+            files += 1
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lists the archive members that differ between two releases "
+                                                 "of a PyInstaller executable, without extracting anything.")
+    parser.add_argument("old", help="executable of the previous release")
+    parser.add_argument("new", help="executable of the new release")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    diff = compare_releases(args.old, args.new)
+    if diff is None:
+        sys.exit(1)
+    for (status, names) in (("A", diff.added), ("M", diff.changed), ("D", diff.removed)):
+        for name in names:
+            print(f"{status} {name.replace(os.path.sep, '/')}")
+    print(f"[INFO] {len(diff.added)} added, {len(diff.changed)} changed, {len(diff.removed)} removed, "
+          f"{diff.unchanged} unchanged in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
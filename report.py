@@ -0,0 +1,149 @@
+"""
+Timing instrumentation for a PyAutoDump run.
+
+A RunReport collects the wall time, bytes in/out and memory of every pipeline
+stage (cookie search, TOC parse, CArchive and PYZ extraction, decompilation,
+move, cleanup) plus the timing and outcome of every module,
+and writes them as a JSON report. It can be passed to pyinstxtractor as its
+tracer. A listener sees every stage and module record as soon as it is done,
+a profiler (profiler.RunProfiler) adds its measurements to every stage.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+REPORT_FILE = "run_report.json"
+SLOWEST_MODULES = 20
+
+
+def _windows_memory_counters():
+    """Returns the PROCESS_MEMORY_COUNTERS of this process on Windows, otherwise None."""
+    if os.name == "nt":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters
+    return None
+
+
+def peak_rss():
+    """Returns the peak resident set size of this process so far in bytes, or None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KB
+    counters = _windows_memory_counters()
+    return counters.PeakWorkingSetSize if counters is not None else None
+
+
+def current_rss():
+    """Returns the current resident set size of this process in bytes, or None if unknown (e.g. macOS)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    counters = _windows_memory_counters()
+    return counters.WorkingSetSize if counters is not None else None
+
+
+class RunReport:
+    """Stage and module timings of one run."""
+
+    def __init__(self, listener=None, **info):
+        """listener, if given, is called with ("stage" or "module", record) for every finished record."""
+        self.info = info
+        self.listener = listener
+        self.profiler = None
+        self.started = time.perf_counter()
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.stages = []
+        self.modules = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """
+        Times the enclosed block. The yielded dict takes extra fields such as bytes_in/bytes_out.
+        Memory of the stage: peak_rss_growth is how far the process peak RSS rose while it ran
+        (0 if it stayed below an earlier peak), rss_delta the change of the current RSS and
+        process_peak_rss the peak of the whole process up to its end. Stages that overlap
+        (extraction and decompilation) share their growth.
+        """
+        record = dict(fields)
+        started = time.perf_counter()
+        peak_before, rss_before = peak_rss(), current_rss()
+        if self.profiler is not None:
+            self.profiler.enter(name)
+        try:
+            yield record
+        finally:
+            if self.profiler is not None:
+                record.update(self.profiler.exit(name))
+            record = dict(stage=name, start=round(started - self.started, 4),
+                          seconds=round(time.perf_counter() - started, 4), **record)
+            peak, rss = peak_rss(), current_rss()
+            record["process_peak_rss"] = peak
+            record["peak_rss_growth"] = peak - peak_before if peak is not None else None
+            record["rss_delta"] = rss - rss_before if rss is not None and rss_before is not None else None
+            with self.lock:
+                self.stages.append(record)
+            if self.listener is not None:
+                self.listener("stage", record)
+
+    def module(self, name, **fields):
+        """Records the outcome of one module (status, seconds, bytes_in, bytes_out, error, ...)."""
+        with self.lock:
+            self.modules[name] = fields
+        if self.listener is not None:
+            self.listener("module", dict(module=name, **fields))
+
+    def to_dict(self):
+        with self.lock:
+            stages = sorted(self.stages, key=lambda stage: stage["start"])
+            modules = dict(sorted(self.modules.items()))
+
+        totals = {}
+        for stage in stages:
+            totals[stage["stage"]] = round(totals.get(stage["stage"], 0) + stage["seconds"], 4)
+        statuses = {}
+        for record in modules.values():
+            statuses[record.get("status")] = statuses.get(record.get("status"), 0) + 1
+        slowest = sorted(modules, key=lambda name: modules[name].get("seconds") or 0, reverse=True)
+
+        return {
+            "info": self.info,
+            "started_at": self.started_at,
+            "seconds": round(time.perf_counter() - self.started, 4),
+            "peak_rss": peak_rss(),
+            "stage_totals": totals,
+            "module_statuses": statuses,
+            "slowest_modules": slowest[:SLOWEST_MODULES],
+            "stages": stages,
+            "modules": modules,
+        }
+
+    def write(self, path):
+        """Writes the report as JSON to path."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
@@ -0,0 +1,347 @@
+"""
+Decompilation service: a long-running process with a local HTTP API that accepts
+executables and streams back progress and results.
+
+Every run of main.py pays for the interpreter start, loading the known module
+index and opening the cache. The service pays for that once and keeps it for all
+jobs; main.py also starts a pool of warm decompyle3 workers for it (see
+decompile_worker.py). Start it with `python main.py --serve [HOST:PORT | unix:PATH]`.
+
+The API has no authentication. It only listens on loopback addresses unless remote
+clients are allowed explicitly (--allow-remote), and ?path= only accepts files below
+the input directory it was given (--serve-inputs).
+
+    POST /jobs?name=app.exe           the request body is the executable
+    POST /jobs?path=/srv/app.exe      an executable below the input directory, read by the service itself
+        Streams the progress as JSON lines until the job is done:
+        {"event": "queued"}, {"event": "started"}, {"event": "stage"}, {"event": "module"}, ...,
+        {"event": "done", "summary": {...}}. With wait=0 only the "queued" event is sent.
+    GET /jobs/<id>                    state of a job, with its summary once it is done
+    GET /jobs/<id>/events             the progress of a job from its start, until it is done
+    GET /jobs/<id>/output             the output archive (--output-format zip or tar)
+    GET /status                       queued and running jobs, workers, cache
+
+    curl --data-binary @app.exe "http://127.0.0.1:8765/jobs?name=app.exe"
+    curl -X POST --unix-socket /run/pyautodump.sock "http://localhost/jobs?path=/srv/app.exe"
+"""
+
+import os
+import json
+import stat
+import signal
+import ipaddress
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+import socketserver
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+FINISHED_JOBS_KEPT = 1000  # Older finished jobs are forgotten, their output stays on disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class Job:
+    """One executable submitted to the service, with the progress events it produced so far."""
+
+    def __init__(self, job_id, name, path, upload):
+        self.id = job_id
+        self.name = name
+        self.path = path
+        self.upload = upload  # path is a spooled upload, deleted when the job is done
+        self.state = "queued"
+        self.summary = None
+        self.submitted = time.time()
+        self.events = []
+        self.changed = threading.Condition()
+
+    def emit(self, event, **fields):
+        with self.changed:
+            self.events.append(dict(event=event, job=self.id, **fields))
+            self.changed.notify_all()
+
+    def progress(self, kind, record):
+        """RunReport listener: every finished stage and module becomes an event."""
+        self.emit(kind, **record)
+
+    def finish(self, summary):
+        with self.changed:
+            self.state, self.summary = "done", summary
+            self.events.append({"event": "done", "job": self.id, "summary": summary})
+            self.changed.notify_all()
+
+    def follow(self):
+        """Yields all events of the job, waiting for new ones until it is done."""
+        position = 0
+        while True:
+            with self.changed:
+                while position == len(self.events) and self.state != "done":
+                    self.changed.wait()
+                events = self.events[position:]
+                position = len(self.events)
+                done = self.state == "done"
+            yield from events
+            if done:
+                return
+
+    def to_dict(self):
+        return {"job": self.id, "name": self.name, "state": self.state, "submitted": self.submitted,
+                "summary": self.summary}
+
+
+class DecompileService:
+    """
+    Runs submitted executables through process(exe_path, output_subfolder, progress) on up to
+    archive_jobs threads. Every job gets its own folder below output_dir.
+    status() returns extra counters for GET /status (workers, cache).
+    Jobs for files the service reads itself are only accepted below input_dir, None = uploads only.
+    """
+
+    def __init__(self, process, output_dir, archive_jobs, status=None, input_dir=None):
+        self.process = process
+        self.output_dir = output_dir
+        self.input_dir = os.path.realpath(input_dir) if input_dir else None
+        self.extra_status = status
+        self.executor = ThreadPoolExecutor(max_workers=archive_jobs, thread_name_prefix="job")
+        self.spool_dir = tempfile.mkdtemp(prefix="pyautodump_uploads_")
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def submit(self, name, path=None, body=None, size=0):
+        """
+        Queues a job for the file at path, or for the size bytes read from body (an upload).
+        Raises PermissionError if path is not below input_dir.
+        """
+        if path is not None and not self.accepts(path):
+            raise PermissionError(f"not below the input directory of the service: {path}")
+        job_id = uuid.uuid4().hex[:12]
+        name = os.path.basename(name or (path or "upload.exe")) or "upload.exe"
+        upload = path is None
+        if upload:
+            path = os.path.join(self.spool_dir, f"{job_id}_{name}")
+            with open(path, "wb") as f:
+                while size > 0:
+                    chunk = body.read(min(size, UPLOAD_CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    size -= len(chunk)
+
+        job = Job(job_id, name, path, upload)
+        with self.lock:
+            self.jobs[job_id] = job
+            position = sum(1 for other in self.jobs.values() if other.state == "queued")
+        job.emit("queued", name=name, position=position)
+        self.executor.submit(self._run, job)
+        return job
+
+    def accepts(self, path):
+        """True if the service may read path itself: a file below input_dir, symbolic links resolved."""
+        return (self.input_dir is not None and os.path.isfile(path)
+                and os.path.realpath(path).startswith(self.input_dir + os.path.sep))
+
+    def _run(self, job):
+        job.state = "running"
+        job.emit("started")
+        base = os.path.basename(job.name).replace(".exe", "_source")
+        output_subfolder = os.path.join(self.output_dir, job.id, base if base.endswith("_source") else base + "_source")
+        try:
+            summary = self.process(job.path, output_subfolder, job.progress)
+        except Exception as e:
+            print(f"[ERROR] Job {job.id} ({job.name}): {e}")
+            summary = {"file": job.path, "status": "failed", "error": str(e)}
+        finally:
+            if job.upload and os.path.exists(job.path):
+                os.remove(job.path)
+        job.finish(summary)
+
+        with self.lock:
+            finished = [job_id for job_id, other in self.jobs.items() if other.state == "done"]
+            for job_id in finished[:-FINISHED_JOBS_KEPT]:
+                del self.jobs[job_id]
+
+    def job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def status(self):
+        with self.lock:
+            states = [job.state for job in self.jobs.values()]
+        status = {
+            "uptime": round(time.time() - self.started, 1),
+            "queued": states.count("queued"),
+            "running": states.count("running"),
+            "done": states.count("done"),
+        }
+        if self.extra_status is not None:
+            status.update(self.extra_status())
+        return status
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server_version = "pyautodump"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def address_string(self):
+        # Unix sockets have no client address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "local"
+
+    def _send_json(self, code, data):
+        body = json.dumps(data, indent=1).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, job):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for event in job.follow():
+                self.wfile.write(json.dumps(event).encode("utf-8") + b"\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client went away, the job goes on
+
+    def _send_output(self, job):
+        if job.state != "done":
+            return self._send_json(409, {"error": "the job is not done yet"})
+        output = job.summary.get("output")
+        if not output or not os.path.isfile(output):
+            return self._send_json(409, {"error": "the output is not an archive file (--output-format zip or tar)",
+                                         "output": output})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(os.path.getsize(output)))
+        self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(output)}"')
+        self.end_headers()
+        with open(output, "rb") as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def do_GET(self):
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if parts == ["status"]:
+            return self._send_json(200, self.service.status())
+        if parts[0] == "jobs" and len(parts) in (2, 3):
+            job = self.service.job(parts[1])
+            if job is None:
+                return self._send_json(404, {"error": f"unknown job: {parts[1]}"})
+            if len(parts) == 2:
+                return self._send_json(200, job.to_dict())
+            if parts[2] == "events":
+                return self._stream(job)
+            if parts[2] == "output":
+                return self._send_output(job)
+        self._send_json(404, {"error": f"not found: {self.path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") != "/jobs":
+            return self._send_json(404, {"error": f"not found: {self.path}"})
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        size = int(self.headers.get("Content-Length") or 0)
+        if "path" in query:
+            if not self.service.accepts(query["path"]):
+                # The same answer for missing and refused files, so it does not tell which files exist
+                return self._send_json(403, {"error": "?path= only accepts files below the input directory of the "
+                                                      "service (--serve-inputs)"})
+            job = self.service.submit(query.get("name"), path=os.path.realpath(query["path"]))
+        elif size > 0:
+            job = self.service.submit(query.get("name"), body=self.rfile, size=size)
+        else:
+            return self._send_json(400, {"error": "send the executable as the request body or pass ?path="})
+
+        if query.get("wait", "1") in ("0", "false", "no"):
+            return self._send_json(202, job.events[0])
+        self._stream(job)
+
+
+class HTTPService(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class UnixHTTPService(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def is_loopback(host):
+    """True if host ("" = the default 127.0.0.1) only accepts connections from this machine."""
+    if host in ("", "localhost"):
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def check_address(address, allow_remote=False):
+    """
+    Raises ValueError if the service must not listen on address: a TCP address other than a
+    loopback one without allow_remote, or a Unix socket path taken by something else than a socket.
+    """
+    if address.startswith("unix:"):
+        try:
+            mode = os.lstat(address[len("unix:"):]).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise ValueError(f"{address[len('unix:'):]} exists and is not a socket")
+        return
+    host = address.rpartition(":")[0]
+    if not allow_remote and not is_loopback(host):
+        raise ValueError(f"{host} is not a loopback address, the API has no authentication "
+                         f"(allow remote clients explicitly with --allow-remote)")
+
+
+def serve(address, service, allow_remote=False):
+    """
+    Serves the API of service on address ("HOST:PORT", "PORT" or "unix:PATH") until interrupted,
+    then waits for the running jobs. Raises ValueError for addresses check_address refuses.
+    """
+    try:
+        check_address(address, allow_remote)
+    except ValueError:
+        service.close()
+        raise
+    if address.startswith("unix:"):
+        socket_path = address[len("unix:"):]
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # A socket left over from a service that did not shut down cleanly
+        server = UnixHTTPService(socket_path, RequestHandler)
+    else:
+        socket_path = None
+        host, _, port = address.rpartition(":")
+        server = HTTPService((host or "127.0.0.1", int(port)), RequestHandler)
+    server.service = service
+    signal.signal(signal.SIGTERM, _interrupt)
+
+    print(f"[+] Service listening on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[INFO] Shutting down, waiting for running jobs...")
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)  # A second signal stops without waiting
+        server.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
@@ -0,0 +1,339 @@
+"""
+Full-text index of the recovered sources (SQLite FTS5).
+
+Searching thousands of output folders with grep takes minutes. With
+--symbol-index, main.py adds every module of a run to an SQLite database:
+its source text and the symbols read from its code objects, which are there
+even when the decompiler failed:
+
+    imports   modules it imports
+    defs      functions and methods (qualified names from Python 3.11 on)
+    classes   classes it defines
+    strings   string constants, e.g. URLs, paths, keys
+    source    the decompiled (or bundled) source
+
+The index is updated per archive (output folder or file): modules whose
+bytecode and decompiler did not change keep their entry, removed modules are
+dropped. Identical sources, such as a library bundled with many executables,
+are stored once. Known library modules (see known_modules.py) are not indexed.
+
+    python symbol_index.py search "evil.example.com"
+    python symbol_index.py search --column imports socket
+    python symbol_index.py search --fts 'imports:winreg AND strings:"CurrentVersion Run"'
+    python symbol_index.py info
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+
+from known_modules import load_code
+
+SYMBOL_INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output", "symbols.db")
+INDEX_VERSION = 1
+COLUMNS = ("imports", "defs", "classes", "strings", "source")
+MAX_STRING_LENGTH = 1000  # Longer constants (embedded data) are cut
+FLUSH_ROWS = 500          # Pending modules written in one transaction
+FLUSH_BYTES = 16 * 1024 * 1024
+BUSY_TIMEOUT = 120        # seconds to wait for another process writing the index
+
+CO_OPTIMIZED = 0x1  # Set for functions, not for class bodies and modules
+
+# (first Python version, IMPORT_NAME, EXTENDED_ARG) of the bytecode formats
+IMPORT_OPCODES = (((3, 13), 75, 71), ((3, 0), 108, 144), ((2, 0), 108, 145))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (archive TEXT PRIMARY KEY, file TEXT, python_version TEXT, indexed_at REAL);
+CREATE TABLE IF NOT EXISTS texts (id INTEGER PRIMARY KEY, key TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS modules (archive TEXT, module TEXT, output TEXT, key TEXT, text_id INTEGER,
+                                    PRIMARY KEY (archive, module));
+CREATE INDEX IF NOT EXISTS modules_text ON modules (text_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS symbols USING fts5(imports, defs, classes, strings, source);
+"""
+
+
+def _imported_modules(code, version):
+    """Returns the names of the modules a code object imports, read from its IMPORT_NAME instructions."""
+    (import_name, extended_arg) = next((ops[1:] for ops in IMPORT_OPCODES if version >= ops[0]), (None, None))
+    data = bytearray(code.co_code or b"")
+    names, extended, i = [], 0, 0
+    while i < len(data):
+        op = data[i]
+        if version >= (3, 6):
+            # Wordcode: every instruction is an opcode and a one byte argument
+            arg, i = data[i + 1] | extended if i + 1 < len(data) else 0, i + 2
+            extended = arg << 8 if op == extended_arg else 0
+        elif op >= 90:  # HAVE_ARGUMENT
+            arg, i = (data[i + 1] | data[i + 2] << 8 if i + 2 < len(data) else 0) | extended, i + 3
+            extended = arg << 16 if op == extended_arg else 0
+        else:
+            i += 1
+            continue
+        if op == import_name and arg < len(code.co_names):
+            names.append(_name(code.co_names[arg]))
+    return names
+
+
+def _name(value):
+    # Names of Python 2 code objects are byte strings
+    return value.decode("latin-1") if isinstance(value, bytes) else value
+
+
+def _text(value, version):
+    if isinstance(value, bytes):
+        # Byte strings of Python 2 are its str, in Python 3 only text-like ones are kept
+        try:
+            value = value.decode("latin-1" if version < (3, 0) else "ascii")
+        except UnicodeDecodeError:
+            return None
+    return value[:MAX_STRING_LENGTH] if isinstance(value, str) and value.strip() else None
+
+
+def code_symbols(code, python_version=None):
+    """Returns {"imports", "defs", "classes", "strings"} of a code object and the code objects it contains."""
+    version = tuple(int(part) for part in python_version.split(".")[:2]) if python_version else sys.version_info[:2]
+    symbols = {column: {} for column in COLUMNS[:-1]}  # dicts keep the first-seen order without duplicates
+
+    def walk(code):
+        for name in _imported_modules(code, version):
+            symbols["imports"][name] = None
+        for const in code.co_consts or ():
+            if hasattr(const, "co_code"):
+                name = _name(getattr(const, "co_qualname", None) or const.co_name)
+                if not _name(const.co_name).startswith("<"):  # <lambda>, <listcomp>, ...
+                    symbols["defs" if const.co_flags & CO_OPTIMIZED else "classes"][name] = None
+                walk(const)
+            elif isinstance(const, (tuple, frozenset)):
+                for item in const:
+                    text = _text(item, version)
+                    if text is not None:
+                        symbols["strings"][text] = None
+            else:
+                text = _text(const, version)
+                if text is not None:
+                    symbols["strings"][text] = None
+
+    walk(code)
+    return {column: list(values) for column, values in symbols.items()}
+
+
+def pyc_symbols(pyc_path, header_size, python_version=None):
+    """Returns the code_symbols of a .pyc, None if it holds no readable code object."""
+    code = load_code(pyc_path, header_size, python_version)
+    return code_symbols(code, python_version) if code is not None else None
+
+
+def connect(path):
+    """Opens (and creates) the index database."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")  # Searches do not wait for a run that is writing
+    db.execute("PRAGMA synchronous=NORMAL")
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, INDEX_VERSION):
+        db.close()
+        raise ValueError(f"{path} was written by another version of the symbol index, delete it to rebuild")
+    db.executescript(SCHEMA)
+    db.execute(f"PRAGMA user_version={INDEX_VERSION}")
+    return db
+
+
+class ArchiveIndexer:
+    """
+    Updates the index entries of one archive. add() may be called from several threads,
+    finish() writes what is left and drops the modules that were not added again.
+    """
+
+    def __init__(self, path, archive, file=None, python_version=None, header_size=16):
+        self.db = connect(path)
+        self.archive = archive
+        self.file = file
+        self.python_version = python_version
+        self.header_size = header_size
+        self.lock = threading.Lock()
+        self.indexed = {module: key for (module, key) in
+                        self.db.execute("SELECT module, key FROM modules WHERE archive = ?", (archive,))}
+        self.seen = set()
+        self.pending = []      # (module, output, key, symbols with the source or None) not written yet
+        self.pending_keys = set()
+        self.pending_bytes = 0
+        self.stats = {"modules": 0, "unchanged": 0, "new_sources": 0, "removed": 0}
+
+    def needs_source(self, key):
+        """True if no module with this key is in the index yet, add() then needs its source."""
+        with self.lock:
+            if key in self.pending_keys:
+                return False
+            return self.db.execute("SELECT 1 FROM texts WHERE key = ?", (key,)).fetchone() is None
+
+    def add(self, module, key, output=None, pyc_path=None, source=None):
+        """
+        Adds a module. key identifies its content (same key, same source and symbols): if it is
+        already indexed, pyc_path and source are not read. Otherwise the symbols come from the
+        .pyc at pyc_path and source (bytes) is its source, either may be None.
+        """
+        with self.lock:
+            self.seen.add(module)
+            self.stats["modules"] += 1
+            if self.indexed.get(module) == key:
+                self.stats["unchanged"] += 1
+                return
+        symbols = None
+        if (pyc_path is not None or source is not None) and self.needs_source(key):
+            symbols = pyc_symbols(pyc_path, self.header_size, self.python_version) if pyc_path else None
+            symbols = dict(symbols or {}, source=source.decode("utf-8", errors="replace") if source else "")
+        with self.lock:
+            self.pending.append((module, output, key, symbols))
+            if symbols is not None:
+                self.pending_keys.add(key)
+                self.pending_bytes += len(source or b"")
+            if len(self.pending) >= FLUSH_ROWS or self.pending_bytes >= FLUSH_BYTES:
+                self._flush()
+
+    def _flush(self):
+        # Short transactions, so several runs can write the index at the same time
+        if not self.pending:
+            return
+        db = self.db
+        replaced = []
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for (module, output, key, symbols) in self.pending:
+                row = db.execute("SELECT id FROM texts WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    if symbols is None:
+                        continue  # Its source was lost with a failed flush
+                    text_id = db.execute("INSERT INTO texts (key) VALUES (?)", (key,)).lastrowid
+                    db.execute("INSERT INTO symbols (rowid, imports, defs, classes, strings, source) "
+                               "VALUES (?, ?, ?, ?, ?, ?)",
+                               [text_id] + ["\n".join(symbols.get(column) or ()) for column in COLUMNS[:-1]]
+                               + [symbols["source"]])
+                    self.stats["new_sources"] += 1
+                else:
+                    text_id = row[0]
+                old = db.execute("SELECT text_id FROM modules WHERE archive = ? AND module = ?",
+                                 (self.archive, module)).fetchone()
+                if old is not None and old[0] != text_id:
+                    replaced.append(old[0])
+                db.execute("INSERT OR REPLACE INTO modules (archive, module, output, key, text_id) "
+                           "VALUES (?, ?, ?, ?, ?)", (self.archive, module, output, key, text_id))
+            self._drop_unused(replaced)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            self.pending, self.pending_keys, self.pending_bytes = [], set(), 0
+
+    def _drop_unused(self, text_ids):
+        for text_id in set(text_ids):
+            if self.db.execute("SELECT 1 FROM modules WHERE text_id = ? LIMIT 1", (text_id,)).fetchone() is None:
+                self.db.execute("DELETE FROM symbols WHERE rowid = ?", (text_id,))
+                self.db.execute("DELETE FROM texts WHERE id = ?", (text_id,))
+
+    def finish(self, prune=True):
+        """
+        Writes the pending modules, drops those of an earlier run that were not added (unless prune
+        is false, e.g. after an incomplete extraction) and closes the index.
+        """
+        with self.lock:
+            self._flush()
+            removed = set(self.indexed) - self.seen if prune else set()
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                text_ids = []
+                for module in removed:
+                    row = self.db.execute("SELECT text_id FROM modules WHERE archive = ? AND module = ?",
+                                          (self.archive, module)).fetchone()
+                    if row is not None:
+                        self.db.execute("DELETE FROM modules WHERE archive = ? AND module = ?", (self.archive, module))
+                        text_ids.append(row[0])
+                self._drop_unused(text_ids)
+                self.db.execute("INSERT OR REPLACE INTO archives (archive, file, python_version, indexed_at) "
+                                "VALUES (?, ?, ?, ?)", (self.archive, self.file, self.python_version, time.time()))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.stats["removed"] = len(removed)
+        self.close()
+        return self.stats
+
+    def close(self):
+        self.db.close()
+
+
+def phrase(text):
+    """Quotes text as an FTS5 phrase, so URLs and paths need no escaping."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def search(path, query, columns=None, limit=20, archive=None):
+    """
+    Searches the index with an FTS5 query (see phrase() for literal text), optionally only in some
+    columns and one archive. Returns the best matches as dicts.
+    """
+    if columns:
+        query = "{" + " ".join(columns) + "} : (" + query + ")"
+    sql = ("SELECT modules.archive, modules.module, modules.output, archives.file, "
+           "snippet(symbols, -1, '[', ']', '...', 12) FROM symbols "
+           "JOIN modules ON modules.text_id = symbols.rowid "
+           "LEFT JOIN archives ON archives.archive = modules.archive WHERE symbols MATCH ?")
+    params = [query]
+    if archive:
+        sql += " AND modules.archive = ?"
+        params.append(archive)
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(limit)
+    db = connect(path)
+    try:
+        return [{"archive": row[0], "module": row[1], "output": row[2], "file": row[3], "snippet": row[4]}
+                for row in db.execute(sql, params)]
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Searches the symbol index written by main.py --symbol-index.")
+    parser.add_argument("command", choices=("search", "info"))
+    parser.add_argument("query", nargs="?", help="text to search for (a phrase, see --fts)")
+    parser.add_argument("--index", default=SYMBOL_INDEX_FILE, help="index database (default: %(default)s)")
+    parser.add_argument("--column", action="append", choices=COLUMNS,
+                        help="only search this column (may be given more than once)")
+    parser.add_argument("--fts", action="store_true",
+                        help="the query is in FTS5 syntax (AND, OR, NOT, prefix*, column:term) instead of a phrase")
+    parser.add_argument("--archive", help="only search the output folder or file of this archive")
+    parser.add_argument("-n", "--limit", type=int, default=20, help="number of results (default: %(default)s)")
+    args = parser.parse_intermixed_args()
+    if not os.path.exists(args.index):
+        parser.error(f"no symbol index at {args.index}, run main.py with --symbol-index first")
+
+    if args.command == "info":
+        db = connect(args.index)
+        (archives,) = db.execute("SELECT COUNT(*) FROM archives").fetchone()
+        (modules,) = db.execute("SELECT COUNT(*) FROM modules").fetchone()
+        (texts,) = db.execute("SELECT COUNT(*) FROM texts").fetchone()
+        db.close()
+        print(f"[INFO] {archives} archives, {modules} modules, {texts} distinct sources, "
+              f"{os.path.getsize(args.index) / 1024 / 1024:.1f} MB")
+        return
+    if not args.query:
+        parser.error("search needs a query")
+
+    started = time.perf_counter()
+    try:
+        results = search(args.index, args.query if args.fts else phrase(args.query), args.column, args.limit,
+                         os.path.abspath(args.archive) if args.archive else None)
+    except sqlite3.OperationalError as e:
+        parser.error(f"bad query: {e}")
+    for result in results:
+        print(f"{os.path.join(result['archive'], result['output'] or result['module'])}")
+        print(f"    {' '.join(result['snippet'].split())}")
+    print(f"[INFO] {len(results)} results in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Shared fixtures: synthetic executables from benchmarks/synth_archive.py and main.py set up to
+decompile them with the stub decompiler of the benchmarks, without cache or known module index.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT_DIR, "benchmarks")
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import synth_archive
+
+
+@pytest.fixture
+def make_archive(tmp_path):
+    """Returns a function writing a synthetic executable (see synth_archive.generate) and returning its path."""
+    def make(name="app.exe", **params):
+        path = str(tmp_path / name)
+        synth_archive.generate(path, **dict(dict(members=40, binary_size=4096, data_files=3), **params))
+        return path
+    return make
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path):
+    """main.py configured for tests: the stub decompiler, no fallback tiers, output in tmp_path/output."""
+    import main
+
+    monkeypatch.setattr(main, "CUSTOM_DECOMPILER", os.path.join(BENCH_DIR, "stub_decompiler.py"))
+    monkeypatch.setattr(main, "FALLBACK_CHAIN", [])
+    monkeypatch.setattr(main, "OUTPUT_DIR", str(tmp_path / "output"))
+    monkeypatch.setattr(main, "OUTPUT_FORMAT", "dir")
+    monkeypatch.setattr(main, "SYMBOL_INDEX", None)
+    monkeypatch.setattr(main, "WORK_DIR", str(tmp_path))
+    return main
+
+
+def output_files(folder):
+    """Relative paths of the sources below folder, without manifest and run report."""
+    from manifest import MANIFEST_FILE
+    from report import REPORT_FILE
+
+    paths = set()
+    for root, dirs, files in os.walk(folder):
+        for name in files:
+            if name not in (MANIFEST_FILE, REPORT_FILE):
+                paths.add(os.path.relpath(os.path.join(root, name), folder))
+    return paths
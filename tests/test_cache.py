@@ -0,0 +1,26 @@
+import sys
+import threading
+
+from decompile_cache import DecompileCache
+
+
+def test_hit_and_miss_counts_are_exact_across_threads(tmp_path):
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads as often as possible
+    try:
+        cache = DecompileCache(str(tmp_path))
+        cache.put("ab" * 32, b"print('cached')\n")
+
+        def lookups():
+            for _ in range(500):
+                cache.get("ab" * 32)
+                cache.get("cd" * 32)
+
+        threads = [threading.Thread(target=lookups) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert (cache.hits, cache.misses) == (4000, 4000)
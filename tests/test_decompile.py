@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="the address space limit is only enforced on Linux")
+def test_memory_limit_applies_from_the_start(pipeline, monkeypatch, tmp_path):
+    # The limit is in place before the decompiler runs, not set on the running process
+    greedy = tmp_path / "greedy.py"
+    greedy.write_text("data = bytearray(512 * 1024 * 1024)\nprint('allocated')\n")
+    monkeypatch.setattr(pipeline, "DECOMPILE_MEMORY_LIMIT", 256)
+    (stdout, error) = pipeline.run_decompiler([sys.executable, str(greedy)])
+    assert stdout is None and "MemoryError" in error
+    monkeypatch.setattr(pipeline, "DECOMPILE_MEMORY_LIMIT", 0)
+    assert pipeline.run_decompiler([sys.executable, str(greedy)]) == (b"allocated\n", None)
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Tools/pycdc.exe is used on Windows")
+def test_windows_builds_stay_out_of_the_fallback_chain(pipeline, monkeypatch, tmp_path):
+    pycdc_exe = tmp_path / "pycdc.exe"
+    pycdc_exe.write_bytes(b"MZ")
+    monkeypatch.setattr(pipeline, "PYCDC_PATH", str(pycdc_exe))
+    monkeypatch.setattr(pipeline, "FALLBACK_CHAIN", ["pycdc", "disasm"])
+    monkeypatch.setenv("PATH", str(tmp_path / "empty"))
+    chain = pipeline.decompiler_chain("3.11")
+    assert [tier.name for tier in chain] == ["custom", "disasm"]
+
+
+def test_only_pyinstaller_bootstrap_counts_as_library(pipeline):
+    for name in ("pyimod01_archive.pyc", "pyiboot01_bootstrap.pyc", "pyi_rth_inspect.pyc",
+                 "PYZ-00.pyz_extracted/pyimod02_importers.pyc"):
+        assert pipeline.module_tier(name, set()) == 3
+    assert pipeline.module_tier("PYZ-00.pyz_extracted/pyimgur/__init__.pyc", set()) == 2
+    assert pipeline.module_tier("PYZ-00.pyz_extracted/pyi_helpers.pyc", set()) == 2
+    assert pipeline.module_tier("pyinvoice.pyc", set()) == 1
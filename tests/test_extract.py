@@ -0,0 +1,117 @@
+import io
+import os
+import random
+import zipfile
+
+import pytest
+
+import pyinstxtractor
+import synth_archive
+
+
+def extract(exe_path, out_dir, **options):
+    os.makedirs(str(out_dir), exist_ok=True)
+    result = pyinstxtractor.extract(exe_path, str(out_dir), **options)
+    assert result is not None
+    return result
+
+
+def tree(folder):
+    """Contents of every file below folder, by relative path."""
+    contents = {}
+    for root, _, files in os.walk(folder):
+        for name in files:
+            with open(os.path.join(root, name), "rb") as f:
+                contents[os.path.relpath(os.path.join(root, name), folder)] = f.read()
+    return contents
+
+
+ARCHIVES = [
+    dict(),
+    dict(layout="headered", stub="pe", signature_size=512),
+    dict(stub="elf", nested=1, base_library=5),
+]
+
+
+@pytest.mark.parametrize("params", ARCHIVES)
+def test_mmap_matches_file_reads(make_archive, tmp_path, params):
+    exe_path = make_archive(**params)
+    mapped = extract(exe_path, tmp_path / "mapped", useMmap=True)
+    read = extract(exe_path, tmp_path / "read", useMmap=False)
+    assert tree(mapped.extractionDir) == tree(read.extractionDir)
+
+
+@pytest.mark.parametrize("params", ARCHIVES)
+def test_parallel_extraction_matches_sequential(make_archive, tmp_path, params):
+    exe_path = make_archive(**params)
+    sequential = extract(exe_path, tmp_path / "sequential", jobs=1)
+    parallel = extract(exe_path, tmp_path / "parallel", jobs=4)
+    assert tree(parallel.extractionDir) == tree(sequential.extractionDir)
+    assert parallel.outputFiles == sequential.outputFiles
+
+
+def test_directories_only_for_written_entries(tmp_path):
+    # Dependency entries, unselected members and names leaving the extraction directory create nothing
+    version = synth_archive.CURRENT_VERSION
+    code = synth_archive.make_code("main", 256, random.Random(0))
+    entries = [
+        ("main", b"s", code, True),
+        ("../outside/evil.txt", b"x", b"evil", False),
+        ("unselected/data.txt", b"x", b"data", False),
+        ("deps/dependency", b"d", b"", False),
+    ]
+    exe_path = tmp_path / "app.exe"
+    exe_path.write_bytes(b"MZ" + b"\0" * 64 + synth_archive.build_carchive(entries, version))
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+
+    result = extract(str(exe_path), out_dir, select={"main.pyc", os.path.join("__", "outside", "evil.txt")})
+    dirs = {os.path.relpath(os.path.join(root, name), result.extractionDir)
+            for root, names, _ in os.walk(result.extractionDir) for name in names}
+    assert dirs == {"__", os.path.join("__", "outside")}
+    assert not (tmp_path / "outside").exists()
+    assert sorted(result.outputFiles) == sorted(["main.pyc", os.path.join("__", "outside", "evil.txt")])
+
+
+def test_zip_members_stay_in_the_extraction_directory(tmp_path):
+    # Absolute names and .. in a bundled zip file must not write outside of the extraction directory
+    target = tmp_path / "target"
+    zip_data = io.BytesIO()
+    with zipfile.ZipFile(zip_data, "w") as zf:
+        zf.writestr(str(target / "absolute.txt"), b"absolute")
+        zf.writestr("../../target/dotdot.txt", b"dotdot")
+        zf.writestr("lib/module.txt", b"module")
+    entries = [("base_library.zip", b"x", zip_data.getvalue(), False)]
+    exe_path = tmp_path / "app.exe"
+    exe_path.write_bytes(b"MZ" + b"\0" * 64 + synth_archive.build_carchive(entries, synth_archive.CURRENT_VERSION))
+
+    result = extract(str(exe_path), tmp_path / "out")
+    assert not target.exists()
+    written = set(tree(result.extractionDir))
+    assert os.path.join("base_library.zip_extracted", "lib", "module.txt") in written
+    assert len(written) == 4
+    for name in written:
+        assert os.path.realpath(os.path.join(result.extractionDir, name)).startswith(result.extractionDir + os.sep)
+
+
+def test_nested_archives_of_another_python_and_duplicates(tmp_path):
+    # Both PKG entries hold the same archive, built with another Python than the outer one
+    rng = random.Random(0)
+    inner = synth_archive.build_carchive([("inner", b"s", synth_archive.make_code("inner", 256, rng), True),
+                                          ("data.txt", b"x", b"data", True)], (3, 8))
+    entries = [
+        ("main", b"s", synth_archive.make_code("main", 256, rng), True),
+        ("a.pkg", b"a", inner, False),
+        ("b.pkg", b"a", inner, True),
+    ]
+    exe_path = tmp_path / "app.exe"
+    exe_path.write_bytes(b"MZ" + b"\0" * 64 + synth_archive.build_carchive(entries, (3, 11)))
+
+    result = extract(str(exe_path), tmp_path / "out")
+    assert result.nestedVersions == {"a.pkg": (3, 8)}
+    assert ("b.pkg", "duplicate") in result.nestedArchives
+    note = os.path.join("b.pkg_extracted", pyinstxtractor.PyInstArchive.DUPLICATE_NOTE)
+    assert note in result.outputFiles
+    with open(os.path.join(result.extractionDir, note), encoding="utf-8") as f:
+        assert f.read() == "Identical to ../a.pkg, its files were only extracted to ../a.pkg_extracted\n"
+    assert os.path.join("a.pkg_extracted", "inner.pyc") in result.outputFiles
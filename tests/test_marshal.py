@@ -0,0 +1,53 @@
+import marshal
+import random
+import types
+
+import pytest
+
+import pyinstxtractor
+import synth_archive
+
+VALUES = [
+    None, True, False, Ellipsis, StopIteration,
+    0, 1, -1, 2 ** 31 - 1, -2 ** 31, 2 ** 31, 2 ** 64 + 3, -10 ** 40,
+    0.0, -1.5, 1e300, 3 + 4j,
+    "", "ascii", "Grüße ☃ \U0001f600", "x" * 300,
+    b"", b"\0\xff" * 200,
+    (), (1, "a", None), [1, [2, [3]]], {"a": 1, 2: (3, 4)}, {1, 2, "x"}, frozenset({b"y", 3.5}),
+]
+
+
+def assert_same(read, expected):
+    if isinstance(expected, types.CodeType):
+        assert isinstance(read, pyinstxtractor.CodeObject)
+        for field in pyinstxtractor.CodeObject.FIELDS:
+            if hasattr(expected, field):
+                assert_same(getattr(read, field), getattr(expected, field))
+    elif isinstance(expected, (tuple, list)):
+        assert type(read) is type(expected) and len(read) == len(expected)
+        for (item, expected_item) in zip(read, expected):
+            assert_same(item, expected_item)
+    else:
+        assert type(read) is type(expected) and read == expected
+
+
+@pytest.mark.parametrize("version", range(marshal.version + 1))
+def test_values_match_builtin_marshal(version):
+    for value in VALUES:
+        data = marshal.dumps(value, version)
+        assert_same(pyinstxtractor.loadMarshal(data), marshal.loads(data))
+
+
+def test_shared_references():
+    shared = ("shared", 1.5)
+    data = marshal.dumps([shared, shared, {"k": shared}])
+    read = pyinstxtractor.loadMarshal(data)
+    assert read == marshal.loads(data)
+    assert read[0] is read[1] is read[2]["k"]
+
+
+def test_code_objects_match_builtin_marshal():
+    rng = random.Random(0)
+    for (index, size) in enumerate((64, 1024, 8192)):
+        data = synth_archive.make_code(f"module{index}", size, rng)
+        assert_same(pyinstxtractor.loadMarshal(data), marshal.loads(data))
@@ -0,0 +1,53 @@
+import os
+import random
+
+import synth_archive
+from conftest import output_files
+
+
+def make_release(path, version):
+    # Release 2 changes two modules and the data file, drops one module and adds another
+    rng = random.Random(0)
+    members = []
+    for index in range(30):
+        name = f"pkg.mod{index}"
+        code = synth_archive.make_code(name, 512, rng)
+        if version == 2 and index in (3, 17):
+            code = synth_archive.make_code(name + "_v2", 512, random.Random(index))
+        if version == 1 or index != 8:
+            members.append((name, False, code))
+    members.append(("pkg", True, synth_archive.make_code("pkg", 64, rng)))
+    if version == 2:
+        members.append(("pkg.added", False, synth_archive.make_code("pkg.added", 256, rng)))
+
+    python_version = synth_archive.CURRENT_VERSION
+    entries = [
+        ("main", b"s", synth_archive.make_code("main", 256, random.Random(version)), True),
+        ("data/readme.txt", b"x", b"release %d\n" % version * 50, True),
+        ("PYZ-00.pyz", b"z", synth_archive.build_pyz(members, synth_archive.pyc_magic(python_version)), False),
+    ]
+    with open(path, "wb") as f:
+        f.write(b"MZ" + b"\0" * 64 + synth_archive.build_carchive(entries, python_version))
+    return path
+
+
+def contents(folder):
+    result = {}
+    for name in output_files(folder):
+        with open(os.path.join(folder, name), "rb") as f:
+            result[name] = f.read()
+    return result
+
+
+def test_diff_output_matches_full_run(pipeline, tmp_path):
+    old_exe = make_release(str(tmp_path / "app_1.exe"), 1)
+    new_exe = make_release(str(tmp_path / "app_2.exe"), 2)
+    summary = pipeline.run_diff(old_exe, new_exe, 2, None)
+    assert summary["status"] == "ok"
+    assert summary["changes"] == {"added": 1, "changed": 4, "removed": 1, "unchanged": 28}
+
+    full_folder = str(tmp_path / "full")
+    work_dir = str(tmp_path / "full_work")
+    os.makedirs(work_dir)
+    assert pipeline.process_archive(new_exe, full_folder, 2, None, work_dir=work_dir)["status"] == "ok"
+    assert contents(summary["output"]) == contents(full_folder)
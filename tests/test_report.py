@@ -0,0 +1,21 @@
+import sys
+
+import pytest
+
+from report import RunReport, peak_rss
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="the current RSS is read from /proc")
+def test_stage_memory_belongs_to_the_stage():
+    # A later stage that allocates nothing must not repeat the peak of an earlier one
+    report = RunReport()
+    with report.stage("allocate"):
+        data = bytearray(peak_rss() + 64 * 1024 * 1024)  # Above the peak of the tests before
+        data[::4096] = b"x" * len(data[::4096])
+        del data
+    with report.stage("idle"):
+        pass
+    (allocate, idle) = report.stages
+    assert allocate["peak_rss_growth"] >= 48 * 1024 * 1024
+    assert idle["peak_rss_growth"] == 0 and abs(idle["rss_delta"]) < 16 * 1024 * 1024
+    assert idle["process_peak_rss"] >= allocate["process_peak_rss"]
@@ -0,0 +1,137 @@
+import os
+import json
+import struct
+
+import pytest
+
+import pyinstxtractor
+from manifest import Manifest
+from conftest import output_files
+
+
+def run(main, exe_path, folder, resume=True):
+    work_dir = os.path.join(os.path.dirname(folder), "work")
+    os.makedirs(work_dir, exist_ok=True)
+    return main.process_archive(exe_path, folder, jobs=2, work_dir=work_dir, resume=resume)
+
+
+def module_statuses(summary):
+    with open(summary["report"], encoding="utf-8") as f:
+        return json.load(f)["module_statuses"]
+
+
+def toc_entry(exe_path, name):
+    arch = pyinstxtractor.PyInstArchive(exe_path)
+    arch.open()
+    try:
+        arch.checkFile()
+        arch.getCArchiveInfo()
+        arch.parseTOC()
+        return next(entry for entry in arch.tocList if entry.name == name)
+    finally:
+        arch.close()
+
+
+def patch(path, position, data):
+    with open(path, "r+b") as f:
+        f.seek(position)
+        f.write(data)
+
+
+def test_second_run_only_redoes_missing_modules(pipeline, make_archive, tmp_path):
+    exe_path = make_archive()
+    folder = str(tmp_path / "output" / "app_source")
+    first = run(pipeline, exe_path, folder)
+    files = output_files(folder)
+    with open(os.path.join(folder, "main.py"), "rb") as f:
+        source = f.read()
+
+    second = run(pipeline, exe_path, folder)
+    assert module_statuses(second) == {"skipped": first["succeeded"]}
+    assert output_files(folder) == files
+
+    os.remove(os.path.join(folder, "main.py"))
+    third = run(pipeline, exe_path, folder)
+    assert module_statuses(third) == {"skipped": first["succeeded"] - 1, "ok": 1}
+    with open(os.path.join(folder, "main.py"), "rb") as f:
+        assert f.read() == source
+
+
+def test_failed_extraction_keeps_earlier_results(pipeline, make_archive, tmp_path):
+    # A wrong uncompressed size stops the extraction before the PYZ members are written
+    exe_path = make_archive()
+    folder = str(tmp_path / "output" / "app_source")
+    assert run(pipeline, exe_path, folder)["status"] == "ok"
+    files, modules = output_files(folder), Manifest(folder).load().modules
+
+    entry = toc_entry(exe_path, "data/file0.txt")
+    with open(exe_path, "rb") as f:
+        toc = f.read()
+    name_pos = toc.index(b"data/file0.txt\0")
+    patch(exe_path, name_pos - struct.calcsize("!iIIIBc") + 12, struct.pack("!I", entry.uncmprsdDataSize + 1))
+
+    with pytest.raises(AssertionError):
+        run(pipeline, exe_path, folder)
+    assert output_files(folder) == files
+    assert Manifest(folder).load().modules == modules
+
+
+def test_skipped_entry_keeps_its_earlier_result(pipeline, make_archive, tmp_path):
+    # A corrupt entry is skipped by the extractor, the rest of the archive is still extracted
+    exe_path = make_archive()
+    folder = str(tmp_path / "output" / "app_source")
+    run(pipeline, exe_path, folder)
+    files = output_files(folder)
+
+    patch(exe_path, toc_entry(exe_path, "main").position + 2, b"\xff" * 16)
+    summary = run(pipeline, exe_path, folder)
+    assert summary["status"] == "ok"
+    assert "main.py" in files and output_files(folder) == files
+    assert "main.pyc" in Manifest(folder).load().modules
+
+
+def test_other_fallback_chain_keeps_results(pipeline, make_archive, tmp_path, monkeypatch):
+    # Results are keyed on the tier that produced them, not on the whole chain
+    exe_path = make_archive()
+    folder = str(tmp_path / "output" / "app_source")
+    first = run(pipeline, exe_path, folder)
+    monkeypatch.setattr(pipeline, "FALLBACK_CHAIN", ["pycdc", "disasm"])
+    second = run(pipeline, exe_path, folder)
+    assert second["status"] == "ok"
+    assert module_statuses(second) == {"skipped": first["succeeded"]}
+
+
+def test_bytecode_listings_are_retried(pipeline, make_archive, tmp_path, monkeypatch):
+    # Listings of the disasm tier are no decompilation: the run fails and the next one tries again
+    exe_path = make_archive()
+    folder = str(tmp_path / "output" / "app_source")
+    broken = tmp_path / "broken_decompiler"
+    broken.write_text("#!/bin/sh\nexit 1\n")
+    broken.chmod(0o755)
+    stub = pipeline.CUSTOM_DECOMPILER
+    monkeypatch.setattr(pipeline, "CUSTOM_DECOMPILER", str(broken))
+    monkeypatch.setattr(pipeline, "FALLBACK_CHAIN", ["disasm"])
+    first = run(pipeline, exe_path, folder)
+    assert first["status"] == "failed"
+    assert first["succeeded"] == 0 and first["listings"] > 0
+    assert {record["status"] for record in Manifest(folder).load().modules.values()} == {"listing"}
+
+    monkeypatch.setattr(pipeline, "CUSTOM_DECOMPILER", stub)
+    monkeypatch.setattr(pipeline, "FALLBACK_CHAIN", [])
+    second = run(pipeline, exe_path, folder)
+    assert second["status"] == "ok"
+    assert second["succeeded"] == first["listings"] and second["listings"] == 0
+
+
+
+def test_without_resume_everything_is_decompiled_again(pipeline, make_archive, tmp_path):
+    # resume=False is honored by decompile_and_move itself, also for a folder that is not emptied
+    exe_path = make_archive()
+    folder = str(tmp_path / "output" / "app_source")
+    first = run(pipeline, exe_path, folder)
+    result = pyinstxtractor.extract(exe_path, str(tmp_path))
+    sink = pipeline.open_sink("dir", folder)
+    for (resume, status) in ((False, "ok"), (True, "skipped")):
+        report = pipeline.RunReport()
+        pipeline.decompile_and_move(result.extractionDir, sink, result.pythonVersion, 2, resume=resume, report=report)
+        assert report.to_dict()["module_statuses"] == {status: first["succeeded"]}
@@ -0,0 +1,73 @@
+import json
+import os
+import socket
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+import service
+
+
+@pytest.fixture
+def api(tmp_path):
+    """A service on a free loopback port whose jobs only return a summary, with tmp_path/inputs as input folder."""
+    inputs = tmp_path / "inputs"
+    inputs.mkdir()
+    decompile = service.DecompileService(lambda path, folder, progress: {"file": path, "status": "ok"},
+                                         str(tmp_path / "output"), 1, input_dir=str(inputs))
+    server = service.HTTPService(("127.0.0.1", 0), service.RequestHandler)
+    server.service = decompile
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", inputs
+    server.shutdown()
+    server.server_close()
+    decompile.close()
+
+
+def post(url, path):
+    request = urllib.request.Request(f"{url}/jobs?path={urllib.parse.quote(path)}", method="POST")
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, [json.loads(line) for line in response.read().splitlines()]
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_path_jobs_only_below_the_input_folder(api, tmp_path):
+    (url, inputs) = api
+    (inputs / "app.exe").write_bytes(b"MZ")
+    (tmp_path / "secret.txt").write_bytes(b"secret")
+    os.symlink(tmp_path / "secret.txt", inputs / "link.exe")
+
+    (status, events) = post(url, str(inputs / "app.exe"))
+    assert status == 200 and events[-1]["summary"]["status"] == "ok"
+    for path in (str(tmp_path / "secret.txt"), str(inputs / "link.exe"), str(inputs / ".." / "secret.txt"),
+                 str(inputs / "missing.exe")):
+        assert post(url, path)[0] == 403
+
+
+def test_remote_addresses_need_an_opt_in():
+    for address in ("8765", "127.0.0.1:8765", "localhost:8765", "::1:8765"):
+        service.check_address(address)
+    for address in ("0.0.0.0:8765", "192.168.1.10:8765", "example.com:8765"):
+        with pytest.raises(ValueError):
+            service.check_address(address)
+        service.check_address(address, allow_remote=True)
+
+
+def test_unix_path_is_only_replaced_if_it_is_a_socket(tmp_path):
+    regular = tmp_path / "important.txt"
+    regular.write_bytes(b"keep me")
+    with pytest.raises(ValueError):
+        service.check_address(f"unix:{regular}")
+    assert regular.read_bytes() == b"keep me"
+
+    stale = tmp_path / "stale.sock"
+    sock = socket.socket(socket.AF_UNIX)
+    sock.bind(str(stale))
+    sock.close()
+    service.check_address(f"unix:{stale}")